@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import environ
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -89,9 +90,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file-backed test database, so concurrency tests get real SQLite
+        # locking (the in-memory default fails fast with "table is locked")
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Cache
+# The product lookup cache keeps its catalog version stamp here, so it must be
+# shared by every worker process. The file backend does that on a single host;
+# point CACHE_LOCATION at shared storage or switch to Redis/Memcached otherwise.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'arsafa_cache')),
     }
 }
 
+# Rendered invoice and POS receipt PDFs, keyed by document id and updated_at
+PDF_CACHE_DIR = env('PDF_CACHE_DIR', default=os.path.join(BASE_DIR, 'pdf_cache'))
+
 
 # Password validation
 
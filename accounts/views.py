@@ -3,12 +3,12 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from inventory.models import Product
-from invoices.models import Invoice, POS
+from invoices.models import Invoice
 from sales.models import Sale
+from sales.services import credit_balance as sales_credit_balance, sales_totals
 from customers.models import Customer
 from lending.models import Lending
 from django.utils import timezone
-from django.db.models import Sum, F
 from datetime import timedelta
 
 def custom_login(request):
@@ -27,19 +27,19 @@ def custom_login(request):
 
 @login_required
 def admin_dashboard(request):
-    today = timezone.now().date()
+    today = timezone.localdate()
     # Total sales today (paid POS)
-    total_sales_today = POS.objects.filter(status='paid', date__date=today).aggregate(total=Sum('total'))['total'] or 0
-    # Low stock items using product-specific thresholds
-    low_stock_items = Product.objects.filter(quantity__lt=F('low_stock_threshold')).count()
-    # Low stock products for alert using product-specific thresholds
-    low_stock_products = Product.objects.filter(quantity__lt=F('low_stock_threshold'))
+    total_sales_today = sales_totals(today, today)['paid_total']
+    # Low stock items (status is kept against each product's threshold)
+    low_stock_items = Product.objects.filter(status='low').count()
+    # Low stock products for alert
+    low_stock_products = Product.objects.filter(status='low')
     # Nearly expiring products (expiry within 7 days)
     nearly_expire_products = Product.objects.filter(expiry_date__isnull=False, expiry_date__lte=today + timedelta(days=7), expiry_date__gte=today)
     # Pending invoices
     pending_invoices = Invoice.objects.filter(status='unpaid').count()
     # Credit balance (unpaid POS)
-    credit_balance = POS.objects.filter(status='unpaid').aggregate(total=Sum('total'))['total'] or 0
+    credit_balance = sales_credit_balance()
     # Recent activities (last 5)
     recent_activities = []
     # New invoice
@@ -0,0 +1,99 @@
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+from customers.models import Customer
+from invoices.models import POS, POSLedgerEntry
+from invoices.services import pending_pos_events
+
+
+class Command(BaseCommand):
+    help = 'Recompute customer total purchases and outstanding balances from POS bills and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drift, do not write the corrected balances',
+        )
+
+    def handle(self, *args, **options):
+        pending = pending_pos_events().count()
+        if pending and not options['dry_run']:
+            self.stdout.write(self.style.ERROR(
+                f'{pending} POS event(s) are still pending. Run process_pos_outbox first.'
+            ))
+            return
+
+        # One grouped query over all POS bills
+        ledgers = {
+            row['customer']: row
+            for row in POS.objects.filter(customer__isnull=False).values('customer').annotate(
+                total_purchases=Sum('total'),
+                outstanding_balance=Sum('total', filter=Q(status='unpaid')),
+            )
+        }
+
+        drifted = []
+        for customer in Customer.objects.only('id', 'name', 'phone', 'total_purchases', 'outstanding_balance'):
+            ledger = ledgers.get(customer.pk, {})
+            total_purchases = ledger.get('total_purchases') or 0
+            outstanding_balance = ledger.get('outstanding_balance') or 0
+            if (customer.total_purchases != total_purchases or
+                    customer.outstanding_balance != outstanding_balance):
+                self.stdout.write(
+                    f'✗ {customer.name} ({customer.phone}): '
+                    f'purchases ৳{customer.total_purchases} -> ৳{total_purchases}, '
+                    f'outstanding ৳{customer.outstanding_balance} -> ৳{outstanding_balance}'
+                )
+                customer.total_purchases = total_purchases
+                customer.outstanding_balance = outstanding_balance
+                drifted.append(customer)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('✅ All customer ledgers are correct!'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drifted)} customer ledger(s) drifted. Run without --dry-run to fix.'))
+            return
+
+        with transaction.atomic():
+            Customer.objects.bulk_update(drifted, ['total_purchases', 'outstanding_balance'], batch_size=500)
+            self.rebuild_ledger_entries()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(drifted)} customer ledger(s).'))
+
+    def rebuild_ledger_entries(self):
+        """
+        Point every POS ledger entry at its bill's current customer and totals.
+
+        Only the customer ledger columns are rewritten, in place. The day,
+        hour, discount and lines of an entry record what the sales rollups
+        counted and are left to ``rebuild_sales_rollups``; entries of bills
+        whose customer was deleted are kept, with no customer. A linked bill
+        that has no entry yet gets one the rollups have not counted.
+        """
+        bills = POS.objects.order_by('id').values_list('id', 'customer_id', 'total', 'status').iterator(chunk_size=2000)
+        while True:
+            batch = list(islice(bills, 2000))
+            if not batch:
+                break
+            entries = POSLedgerEntry.objects.in_bulk([pos_id for pos_id, *_ in batch])
+            changed, created = [], []
+            for pos_id, customer_id, total, status in batch:
+                outstanding = total if status == 'unpaid' else Decimal('0')
+                entry = entries.get(pos_id)
+                if entry is None:
+                    if customer_id is not None:
+                        created.append(POSLedgerEntry(
+                            pos_id=pos_id, customer_id=customer_id, purchases=total, outstanding=outstanding,
+                        ))
+                elif (entry.customer_id, entry.purchases, entry.outstanding) != (customer_id, total, outstanding):
+                    entry.customer_id = customer_id
+                    entry.purchases = total
+                    entry.outstanding = outstanding
+                    changed.append(entry)
+            POSLedgerEntry.objects.bulk_update(changed, ['customer', 'purchases', 'outstanding'])
+            POSLedgerEntry.objects.bulk_create(created)
@@ -21,11 +21,7 @@ class Customer(models.Model):
 
     def get_total_pos_sales(self):
         """Calculate total sales from all POS bills for this customer"""
-        from invoices.models import POS
-        pos_sales = POS.objects.filter(
-            customer_name=self.name,
-            contact_number=self.phone
-        ).aggregate(total=models.Sum('total'))['total'] or 0
+        pos_sales = self.pos_bills.aggregate(total=models.Sum('total'))['total'] or 0
         return pos_sales
 
     def update_total_purchases(self):
@@ -5,7 +5,7 @@ from django.db.models import Sum, Count, Q
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import IntegrityError
-from invoices.models import POS, Invoice
+from invoices.models import Invoice
 from sales.models import Sale
 from lending.models import Lending
 
@@ -24,40 +24,15 @@ def customer_dashboard(request):
             Q(phone__icontains=search_query)
         )
     
-    total_customers = customers.count()
-    
-    # Calculate total sales and outstanding balance for all customers
-    total_sales = 0
-    outstanding_balance = 0
-    
-    # Update customer data based on POS bills
-    for customer in customers:
-        # Get all POS bills for this customer
-        all_pos_bills = POS.objects.filter(
-            customer_name=customer.name, 
-            contact_number=customer.phone
-        )
-        
-        # Get paid POS bills
-        paid_pos_bills = all_pos_bills.filter(status='paid')
-        
-        # Get unpaid POS bills
-        unpaid_pos_bills = all_pos_bills.filter(status='unpaid')
-        
-        # Calculate totals
-        total_purchases = all_pos_bills.aggregate(total=Sum('total'))['total'] or 0
-        customer_outstanding = unpaid_pos_bills.aggregate(total=Sum('total'))['total'] or 0
-        
-        # Update customer data
-        if (customer.total_purchases != total_purchases or 
-            customer.outstanding_balance != customer_outstanding):
-            customer.total_purchases = total_purchases
-            customer.outstanding_balance = customer_outstanding
-            customer.save(update_fields=['total_purchases', 'outstanding_balance'])
-        
-        # Add to dashboard totals
-        total_sales += total_purchases
-        outstanding_balance += customer_outstanding
+    # Balances are kept up to date incrementally by the POS finalization service
+    totals = customers.aggregate(
+        total_customers=Count('id'),
+        total_sales=Sum('total_purchases'),
+        outstanding_balance=Sum('outstanding_balance'),
+    )
+    total_customers = totals['total_customers']
+    total_sales = totals['total_sales'] or 0
+    outstanding_balance = totals['outstanding_balance'] or 0
     
     context = {
         'total_customers': total_customers,
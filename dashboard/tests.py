@@ -1,3 +1,20 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from invoices.models import POSEvent, POSLedgerEntry
+from invoices.services import process_pos_outbox
+from invoices.tests import make_pos
+from sales.models import DailySalesRollup, HourlySalesRollup
+
+
+class DeleteAllDataTestCase(TestCase):
+    def test_deleted_bills_are_not_projected_afterwards(self):
+        make_pos(status='paid')
+
+        self.client.post(reverse('delete_all_data') + '?key=12345678')
+        self.assertFalse(POSEvent.objects.exists())
+        self.assertFalse(POSLedgerEntry.objects.exists())
+
+        self.assertEqual(process_pos_outbox(), 0)
+        self.assertFalse(DailySalesRollup.objects.exists())
+        self.assertFalse(HourlySalesRollup.objects.exists())
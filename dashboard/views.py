@@ -1,13 +1,13 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
-from django.db.models import Sum, F
 from datetime import timedelta
 from django.utils import timezone
-from sales.models import Sale, SaleItem
-from invoices.models import POS, POSItem, Invoice, InvoiceItem
+from sales.models import Sale, SaleItem, DailySalesRollup, HourlySalesRollup, ProductDailySales
+from sales.services import credit_balance as sales_credit_balance, sales_totals
+from invoices.models import POSItem, POSEvent, POSLedgerEntry, Invoice, InvoiceItem
 from lending.models import Lending
-from inventory.models import Product
+from inventory.models import Product, StockMovement, StockSnapshot
 from customers.models import Customer
 from employees.models import Employee
 
@@ -38,8 +38,17 @@ def delete_all_data(request):
                 # 2. Delete main records
                 Sale.objects.all().delete()
                 POS.objects.all().delete()
+                # post_delete queued a 'deleted' event per bill; projecting
+                # them would subtract the bills from the emptied rollups
+                POSEvent.objects.all().delete()
+                POSLedgerEntry.objects.all().delete()
+                DailySalesRollup.objects.all().delete()
+                HourlySalesRollup.objects.all().delete()
+                ProductDailySales.objects.all().delete()
                 Invoice.objects.all().delete()
                 Lending.objects.all().delete()
+                StockSnapshot.objects.all().delete()
+                StockMovement.objects.all().delete()
                 Product.objects.all().delete()
                 Customer.objects.all().delete()
                 Employee.objects.all().delete()
@@ -57,32 +66,23 @@ def delete_all_data(request):
 
 def admin_dashboard(request):
     # Get today's date
-    today = timezone.now().date()
+    today = timezone.localdate()
     
     # Calculate daily sales (only from POS models - including unpaid amounts)
     # Include both paid and unpaid POS amounts in daily sales
-    daily_sales_pos_paid = POS.objects.filter(
-        date__date=today,
-        status='paid'
-    ).aggregate(total=Sum('total'))['total'] or 0
-    
-    daily_sales_pos_unpaid = POS.objects.filter(
-        date__date=today,
-        status='unpaid'
-    ).aggregate(total=Sum('total'))['total'] or 0
+    # Both come from today's pre-aggregated rollup row
+    today_totals = sales_totals(today, today)
+    daily_sales_pos_paid = today_totals['paid_total']
+    daily_sales_pos_unpaid = today_totals['unpaid_total']
     
     # Total daily sales (only from POS transactions)
     total_daily_sales = daily_sales_pos_paid + daily_sales_pos_unpaid
     
-    # Count low stock items using product-specific thresholds
-    low_stock_items = Product.objects.filter(
-        quantity__lt=F('low_stock_threshold')
-    ).count()
+    # Count low stock items (status is kept against each product's threshold)
+    low_stock_items = Product.objects.filter(status='low').count()
     
-    # Get low stock products for alerts using product-specific thresholds
-    low_stock_products = Product.objects.filter(
-        quantity__lt=F('low_stock_threshold')
-    ).order_by('quantity')[:5]
+    # Get low stock products for alerts, read in index order
+    low_stock_products = Product.objects.filter(status='low').order_by('quantity')[:5]
     
     # Get nearly expiring products (expiring in next 7 days)
     seven_days_from_now = today + timedelta(days=7)
@@ -103,9 +103,7 @@ def admin_dashboard(request):
     pending_invoices = Invoice.objects.filter(status='unpaid').count()
     
     # Calculate credit balance (sum of unpaid POS transactions)
-    credit_balance = POS.objects.filter(status='unpaid').aggregate(
-        total=Sum('total')
-    )['total'] or 0
+    credit_balance = sales_credit_balance()
     
     
     # Prepare summary data
@@ -0,0 +1,115 @@
+"""
+Product lookup cache for ARSAFA ERP System
+
+Barcode scans and price lookups at the POS hit the same few hundred products
+over and over. Each worker process keeps a bounded LRU of lookup results keyed
+by barcode and product id. Any Product save or delete bumps a catalog version
+stamp kept in Django's cache, which all gunicorn workers share; a worker that
+sees a new stamp drops its whole LRU before answering.
+"""
+
+from collections import OrderedDict
+import threading
+import uuid
+
+from django.core.cache import cache
+
+from .models import Product
+
+CATALOG_VERSION_KEY = 'inventory:catalog_version'
+
+# Maximum number of lookups kept per worker process
+MAX_ENTRIES = 4096
+
+
+def catalog_version():
+    """Return the shared catalog version stamp, creating it if missing."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every worker's lookup cache."""
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class ProductLookupCache:
+    """Bounded LRU of product lookups, valid for a single catalog version."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """
+        Return the cached value for ``key``, calling ``load()`` on a miss.
+
+        Misses are cached too (as None), so repeatedly scanning an unknown
+        barcode does not reach the database either.
+        """
+        version = catalog_version()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = load()
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+product_lookups = ProductLookupCache()
+
+
+def _product_payload(product):
+    if product is None:
+        return None
+    return {
+        'product_id': product.id,
+        'name': product.name,
+        'price': str(product.unit_price),
+    }
+
+
+def load_product_by_barcode(barcode):
+    """Uncached barcode lookup."""
+    return _product_payload(
+        Product.objects.filter(barcode=barcode).only('id', 'name', 'unit_price').first()
+    )
+
+
+def load_product(product_id):
+    """Uncached product id lookup."""
+    return _product_payload(
+        Product.objects.filter(pk=product_id).only('id', 'name', 'unit_price').first()
+    )
+
+
+def lookup_product_by_barcode(barcode):
+    """Return ``{'product_id', 'name', 'price'}`` for a barcode, or None."""
+    return product_lookups.get(('barcode', barcode), lambda: load_product_by_barcode(barcode))
+
+
+def lookup_product(product_id):
+    """Return ``{'product_id', 'name', 'price'}`` for a product id, or None."""
+    return product_lookups.get(('id', product_id), lambda: load_product(product_id))
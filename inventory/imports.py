@@ -0,0 +1,294 @@
+"""
+Bulk product import for ARSAFA ERP System
+
+Products are read from a CSV or XLSX file one row at a time, validated in
+plain Python with the same rules as ``ProductForm`` and written in chunks
+with ``bulk_create``. Rows with a barcode are upserted on it
+(``update_conflicts=True``); rows without one are always inserted. Invalid
+rows are skipped and reported with their row number.
+
+``bulk_create`` does not send model signals, so each chunk does their work
+itself: it computes the low/fair status, stamps a catalog revision, records
+the quantity change in the stock ledger and refreshes the search index. The
+lookup caches are invalidated once, after the last chunk commits.
+"""
+
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .cache import bump_catalog_version
+from .ledger import record_movements
+from .models import Product
+from .search import index_products
+from .services import allocate_catalog_revision
+
+IMPORT_CHUNK_SIZE = 1000
+
+REQUIRED_COLUMNS = ['name', 'category', 'quantity', 'unit_price']
+OPTIONAL_COLUMNS = [
+    'buying_price', 'expiry_date', 'input_date', 'barcode', 'tag', 'batch', 'low_stock_threshold',
+]
+IMPORT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+
+class ProductImportError(ValueError):
+    """Raised when a file cannot be imported at all, e.g. missing columns."""
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    # (row number, message) for every skipped row
+    errors: list = field(default_factory=list)
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+
+def read_rows(file, filename):
+    """
+    Rows of an uploaded or opened file as ``(row number, {column: value})``.
+
+    The first row is the header; column names are matched case-insensitively
+    and unknown columns are ignored. Row numbers count the header as row 1,
+    as spreadsheets do.
+
+    Args:
+        file: Binary file object
+        filename: Name used to tell CSV from XLSX
+    """
+    if filename.lower().endswith('.xlsx'):
+        rows = _xlsx_rows(file)
+    elif filename.lower().endswith('.csv'):
+        rows = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    else:
+        raise ProductImportError('Upload a .csv or .xlsx file.')
+
+    header = next(rows, None)
+    if header is None:
+        raise ProductImportError('The file is empty.')
+    columns = [str(name or '').strip().lower().replace(' ', '_') for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ProductImportError(f'Missing column(s): {", ".join(missing)}.')
+    positions = [(index, name) for index, name in enumerate(columns) if name in IMPORT_COLUMNS]
+
+    def parsed():
+        for number, row in enumerate(rows, start=2):
+            if not any(value not in (None, '') for value in row):
+                continue
+            yield number, {name: row[index] if index < len(row) else None for index, name in positions}
+
+    return [name for _, name in positions], parsed()
+
+
+def _xlsx_rows(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ProductImportError('Reading .xlsx files needs openpyxl; upload a .csv file instead.')
+    workbook = load_workbook(file, read_only=True, data_only=True)
+
+    def rows():
+        # A read-only workbook keeps its archive open until closed
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    return rows()
+
+
+_CATEGORIES = {code: code for code, _ in Product.CATEGORY_CHOICES}
+_CATEGORIES.update({label.lower(): code for code, label in Product.CATEGORY_CHOICES})
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _whole_number(value, name, errors):
+    text = _text(value)
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        number = None
+    if number is None or number != number.to_integral_value() or number < 0:
+        errors.append(f'{name} must be a whole number of 0 or more.')
+        return None
+    return int(number)
+
+
+def _price(value, name, errors):
+    try:
+        price = Decimal(_text(value))
+    except InvalidOperation:
+        price = None
+    if price is None or not price.is_finite() or price < 0:
+        errors.append(f'{name} must be a price of 0 or more.')
+        return None
+    price = price.quantize(Decimal('0.01'))
+    if price >= Decimal('100000000'):
+        errors.append(f'{name} must be less than 100000000.')
+        return None
+    return price
+
+
+def _date(value, name, errors):
+    # openpyxl reads date cells as datetimes
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(_text(value))
+    except ValueError:
+        errors.append(f'{name} must be a date (YYYY-MM-DD).')
+        return None
+
+
+def clean_row(values, today):
+    """
+    Validate one row.
+
+    Returns:
+        ``(fields, errors)``: the model field values, and a list of messages
+        that is empty when the row is valid
+    """
+    errors = []
+    fields = {}
+
+    name = _text(values['name'])
+    if not name:
+        errors.append('Name is required.')
+    elif len(name) > 100:
+        errors.append('Name must be at most 100 characters.')
+    fields['name'] = name
+
+    category = _CATEGORIES.get(_text(values['category']).lower())
+    if category is None:
+        errors.append(f'Unknown category "{_text(values["category"])}".')
+    fields['category'] = category
+
+    fields['quantity'] = _whole_number(values['quantity'], 'Quantity', errors)
+    fields['unit_price'] = _price(values['unit_price'], 'Unit price', errors)
+
+    if 'buying_price' in values:
+        fields['buying_price'] = (
+            _price(values['buying_price'], 'Buying price', errors) if _text(values['buying_price']) else None
+        )
+    for column, label in (('expiry_date', 'Expiry date'), ('input_date', 'Input date')):
+        if column in values:
+            fields[column] = _date(values[column], label, errors) if _text(values[column]) else None
+    if fields.get('expiry_date') and fields['expiry_date'] < today:
+        errors.append('Expiry date cannot be earlier than today.')
+
+    for column, label, max_length in (('barcode', 'Barcode', 64), ('tag', 'Tag', 50), ('batch', 'Batch', 50)):
+        if column in values:
+            text = _text(values[column])
+            if len(text) > max_length:
+                errors.append(f'{label} must be at most {max_length} characters.')
+            fields[column] = text or None
+
+    if 'low_stock_threshold' in values and _text(values['low_stock_threshold']):
+        fields['low_stock_threshold'] = _whole_number(values['low_stock_threshold'], 'Low stock threshold', errors)
+
+    return fields, errors
+
+
+def import_products(columns, rows, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Validate and upsert products.
+
+    Args:
+        columns: Imported column names, as returned by ``read_rows``
+        rows: Iterable of ``(row number, {column: value})``
+        dry_run: Only validate, write nothing
+        chunk_size: Valid rows written per transaction
+
+    Returns:
+        An ``ImportResult``
+    """
+    today = date.today()
+    result = ImportResult()
+    # Columns an upsert overwrites on an existing product; columns missing
+    # from the file keep their stored values
+    update_fields = [name for name in columns if name != 'barcode'] + ['status', 'revision']
+    seen_barcodes = {}
+    chunk = []
+    for number, values in rows:
+        fields, errors = clean_row(values, today)
+        barcode = fields.get('barcode')
+        if barcode and not errors:
+            if barcode in seen_barcodes:
+                errors.append(f'Barcode {barcode} is already used on row {seen_barcodes[barcode]}.')
+            else:
+                seen_barcodes[barcode] = number
+        if errors:
+            result.errors.append((number, ' '.join(errors)))
+            continue
+        product = Product(**fields)
+        # A blank threshold keeps an existing product's stored value
+        product._threshold_given = 'low_stock_threshold' in fields
+        chunk.append(product)
+        if len(chunk) == chunk_size:
+            _write_chunk(chunk, update_fields, result, dry_run)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, update_fields, result, dry_run)
+    if result.imported and not dry_run:
+        transaction.on_commit(bump_catalog_version)
+    return result
+
+
+def _write_chunk(products, update_fields, result, dry_run):
+    with_barcode = [product for product in products if product.barcode]
+    without_barcode = [product for product in products if not product.barcode]
+    barcodes = [product.barcode for product in with_barcode]
+
+    with transaction.atomic():
+        existing = {
+            barcode: (quantity, threshold)
+            for barcode, quantity, threshold in Product.objects.select_for_update()
+            .filter(barcode__in=barcodes).values_list('barcode', 'quantity', 'low_stock_threshold')
+        }
+        result.created += len(products) - len(existing)
+        result.updated += len(existing)
+        if dry_run:
+            return
+
+        for product in products:
+            if product.barcode in existing and not product._threshold_given:
+                product.low_stock_threshold = existing[product.barcode][1]
+            # What Product.save() would have computed
+            product.status = 'low' if product.quantity < product.low_stock_threshold else 'fair'
+
+        revision = allocate_catalog_revision()
+        for product in products:
+            product.revision = revision
+        if with_barcode:
+            Product.objects.bulk_create(
+                with_barcode, update_conflicts=True, unique_fields=['barcode'], update_fields=update_fields,
+            )
+            # bulk_create does not return the ids of upserted rows
+            ids = dict(Product.objects.filter(barcode__in=barcodes).values_list('barcode', 'pk'))
+            for product in with_barcode:
+                product.pk = ids[product.barcode]
+        if without_barcode:
+            Product.objects.bulk_create(without_barcode)
+
+        record_movements({
+            product.pk: product.quantity - existing.get(product.barcode, (0,))[0]
+            for product in products
+        }, 'import')
+        index_products(
+            Product.objects.filter(pk__in=[product.pk for product in products])
+            .only('id', 'name', 'tag', 'batch', 'barcode', 'category')
+        )
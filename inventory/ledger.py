@@ -0,0 +1,148 @@
+"""
+Stock movement ledger for ARSAFA ERP System
+
+Every change to ``Product.quantity`` is recorded as a ``StockMovement`` in
+the transaction that makes it: sales and their reversals from the stock
+reservation services, opening stock and manual edits from the product
+signals. ``snapshot_stock`` writes each product's closing quantity for every
+finished day, so ``stock_on_hand`` answers "what was on hand at T" from the
+last snapshot before T plus the movements since, instead of replaying the
+whole ledger.
+
+``ledger_drift`` compares every product's quantity with the sum of its
+movements in one grouped query.
+"""
+
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockSnapshot
+
+
+def record_movements(deltas, reason, reference=''):
+    """
+    Append one movement per product.
+
+    Args:
+        deltas: Mapping of product id to the change in units
+        reason: One of ``StockMovement.REASON_CHOICES``
+        reference: Number of the document behind the change
+    """
+    movements = [
+        StockMovement(product_id=product_id, delta=delta, reason=reason, reference=reference)
+        for product_id, delta in deltas.items()
+        if delta
+    ]
+    StockMovement.objects.bulk_create(movements)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _movement_totals(start=None, end=None, product_ids=None):
+    """Summed deltas per product for movements in ``[start, end)``."""
+    movements = StockMovement.objects.all()
+    if start is not None:
+        movements = movements.filter(created_at__gte=start)
+    if end is not None:
+        movements = movements.filter(created_at__lt=end)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    return dict(
+        movements.order_by().values('product_id').annotate(total=Sum('delta'))
+        .values_list('product_id', 'total')
+    )
+
+
+def _snapshot(day, product_ids=None):
+    snapshots = StockSnapshot.objects.filter(day=day)
+    if product_ids is not None:
+        snapshots = snapshots.filter(product_id__in=product_ids)
+    return dict(snapshots.values_list('product_id', 'quantity'))
+
+
+def snapshot_stock(until=None):
+    """
+    Write the closing snapshot of every day up to ``until`` that has none yet.
+
+    Each day is the previous day's snapshot plus that day's movements, so
+    catching up costs one grouped query per day. Products with nothing on
+    hand get no row.
+
+    Args:
+        until: Last day to snapshot (default: yesterday, the last finished day)
+
+    Returns:
+        The days that were snapshotted, in order
+    """
+    until = until or timezone.localdate() - timedelta(days=1)
+    last = StockSnapshot.objects.aggregate(last=Max('day'))['last']
+    if last is None:
+        first = StockMovement.objects.aggregate(first=Min('created_at'))['first']
+        if first is None:
+            return []
+        day = timezone.localdate(first)
+        closing = {}
+    else:
+        day = last + timedelta(days=1)
+        closing = _snapshot(last)
+
+    days = []
+    while day <= until:
+        start = _day_start(day) if days or last is not None else None
+        for product_id, delta in _movement_totals(start, _day_start(day + timedelta(days=1))).items():
+            closing[product_id] = closing.get(product_id, 0) + delta
+        with transaction.atomic():
+            StockSnapshot.objects.bulk_create(
+                [
+                    StockSnapshot(product_id=product_id, day=day, quantity=quantity)
+                    for product_id, quantity in closing.items()
+                    if quantity
+                ],
+                ignore_conflicts=True,
+            )
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def stock_on_hand(at, product_ids=None):
+    """
+    Units on hand per product at the moment ``at``.
+
+    Reads the last snapshot taken before ``at``'s local day and adds the
+    movements recorded since, up to and including ``at``.
+
+    Args:
+        at: Aware datetime
+        product_ids: Optional products to restrict the answer to
+
+    Returns:
+        Dict of product id to quantity; products with nothing on hand are left out
+    """
+    day = StockSnapshot.objects.filter(day__lt=timezone.localdate(at)).aggregate(day=Max('day'))['day']
+    on_hand = _snapshot(day, product_ids) if day else {}
+    start = _day_start(day + timedelta(days=1)) if day else None
+    for product_id, delta in _movement_totals(start, at + timedelta(microseconds=1), product_ids).items():
+        on_hand[product_id] = on_hand.get(product_id, 0) + delta
+    return {product_id: quantity for product_id, quantity in on_hand.items() if quantity}
+
+
+def ledger_drift():
+    """
+    Products whose quantity differs from the sum of their movements.
+
+    Returns:
+        List of ``(product_id, name, quantity, ledger_quantity)`` tuples
+    """
+    return list(
+        Product.objects.annotate(ledger=Coalesce(Sum('stock_movements__delta'), 0))
+        .exclude(quantity=F('ledger'))
+        .order_by('pk')
+        .values_list('pk', 'name', 'quantity', 'ledger')
+    )
@@ -0,0 +1,51 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from inventory.cache import (
+    load_product_by_barcode,
+    lookup_product_by_barcode,
+    product_lookups,
+)
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Compare barcode lookup latency with and without the product lookup cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=5000,
+            help='Number of barcode lookups to time in each mode (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        barcodes = list(
+            Product.objects.exclude(barcode__isnull=True).exclude(barcode='')
+            .values_list('barcode', flat=True)[:1000]
+        )
+        if not barcodes:
+            self.stdout.write(self.style.ERROR('No products with barcodes found. Please create some products first.'))
+            return
+
+        lookups = options['lookups']
+        # A realistic scan mix: the same products come up again and again
+        scans = [random.choice(barcodes) for _ in range(lookups)]
+
+        started = time.perf_counter()
+        for barcode in scans:
+            load_product_by_barcode(barcode)
+        uncached = time.perf_counter() - started
+
+        product_lookups.clear()
+        started = time.perf_counter()
+        for barcode in scans:
+            lookup_product_by_barcode(barcode)
+        cached = time.perf_counter() - started
+
+        self.stdout.write(f'Lookups per mode: {lookups} over {len(barcodes)} barcodes')
+        self.stdout.write(f'Without cache: {uncached / lookups * 1e6:.1f} µs per lookup')
+        self.stdout.write(f'With cache:    {cached / lookups * 1e6:.1f} µs per lookup')
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {uncached / cached:.1f}x'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.ledger import ledger_drift, record_movements
+
+
+class Command(BaseCommand):
+    help = 'Verify that every product quantity equals the sum of its stock movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Record an adjustment movement for each drifted product so the ledger matches its quantity',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = ledger_drift()
+            for product_id, name, quantity, ledger in drifted:
+                self.stdout.write(f'✗ {name} (#{product_id}): quantity {quantity}, ledger {ledger}')
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS('✅ Every product quantity matches the stock ledger!'))
+                return
+            if not options['fix']:
+                self.stdout.write(self.style.WARNING(
+                    f'{len(drifted)} product(s) drifted. Run with --fix to record adjustments.'
+                ))
+                return
+            for product_id, _, quantity, ledger in drifted:
+                record_movements({product_id: quantity - ledger}, 'adjustment', 'ledger check')
+        self.stdout.write(self.style.SUCCESS(f'Recorded adjustments for {len(drifted)} product(s).'))
@@ -0,0 +1,51 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.imports import IMPORT_CHUNK_SIZE, ProductImportError, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import products from a CSV or XLSX file, updating existing products with the same barcode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only validate the file and report errors, do not write products',
+        )
+        parser.add_argument(
+            '--errors',
+            help='Path of a CSV file to write the skipped rows and their errors to',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help=f'Products written per transaction (default: {IMPORT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                columns, rows = read_rows(file, options['path'])
+                result = import_products(columns, rows, options['dry_run'], options['chunk_size'])
+        except (OSError, ProductImportError) as e:
+            raise CommandError(str(e))
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(['Row', 'Errors'])
+                writer.writerows(result.errors)
+        else:
+            for number, message in result.errors:
+                self.stdout.write(f'✗ Row {number}: {message}')
+
+        verb = 'Would import' if options['dry_run'] else 'Imported'
+        summary = f'{verb} {result.imported} product(s): {result.created} new, {result.updated} updated.'
+        if result.errors:
+            self.stdout.write(self.style.WARNING(f'{summary} {len(result.errors)} row(s) skipped.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
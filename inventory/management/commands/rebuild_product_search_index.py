@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.search import rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index from the product table'
+
+    def handle(self, *args, **options):
+        if not search_available():
+            self.stdout.write(self.style.WARNING(
+                'Full-text product search needs SQLite; searches fall back to matching names.'
+            ))
+            return
+        with transaction.atomic():
+            count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} product(s) for search.'))
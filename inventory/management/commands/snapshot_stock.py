@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from inventory.ledger import snapshot_stock
+
+
+class Command(BaseCommand):
+    help = 'Write the closing stock snapshot of every finished day that does not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--until',
+            type=date.fromisoformat,
+            help='Last day to snapshot (YYYY-MM-DD, default: yesterday)',
+        )
+
+    def handle(self, *args, **options):
+        days = snapshot_stock(options['until'])
+        if not days:
+            self.stdout.write(self.style.SUCCESS('✅ Stock snapshots are up to date.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshotted stock for {len(days)} day(s), {days[0]} to {days[-1]}.'
+        ))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+def seed_catalog_revision(apps, schema_editor):
+    """Start existing products at revision 1 so ``?since=0`` returns them."""
+    CatalogRevision = apps.get_model('inventory', 'CatalogRevision')
+    Product = apps.get_model('inventory', 'Product')
+    Product.objects.update(revision=1)
+    CatalogRevision.objects.create(pk=1, last_value=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductTombstone',
+            fields=[
+                ('product_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('revision', models.PositiveBigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='revision',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(seed_catalog_revision, migrations.RunPython.noop),
+    ]
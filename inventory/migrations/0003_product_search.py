@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:05
+
+from django.db import migrations
+
+
+def create_product_search(apps, schema_editor):
+    """Create the FTS5 product search table and index existing products."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('inventory', 'Product')
+    categories = dict(Product._meta.get_field('category').choices)
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS inventory_product_search USING fts5("
+        "name, tag, batch, barcode, category, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    rows = [
+        [pk, name, tag or '', batch or '', barcode or '', categories.get(category, category)]
+        for pk, name, tag, batch, barcode, category in Product.objects.values_list(
+            'pk', 'name', 'tag', 'batch', 'barcode', 'category'
+        ).iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO inventory_product_search (rowid, name, tag, batch, barcode, category) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_product_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS inventory_product_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_catalog_revision'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_search, drop_product_search),
+    ]
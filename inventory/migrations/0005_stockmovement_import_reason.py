@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('opening', 'Opening Stock'), ('sale', 'Sale'), ('return', 'Sale Reversed'), ('adjustment', 'Manual Adjustment'), ('import', 'Import')], max_length=20),
+        ),
+    ]
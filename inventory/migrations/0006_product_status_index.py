@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+STATUS = "CASE WHEN NEW.quantity < NEW.low_stock_threshold THEN 'low' ELSE 'fair' END"
+
+
+def create_status_triggers(apps, schema_editor):
+    """
+    Keep ``status`` correct on every write path, not only ``Product.save``.
+
+    Each trigger rewrites the row's status only when it is wrong, so it does
+    not fire itself again.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, event in (
+        ('inventory_product_status_insert', 'INSERT'),
+        ('inventory_product_status_update', 'UPDATE OF quantity, low_stock_threshold, status'),
+    ):
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON inventory_product "
+            f"WHEN NEW.status IS NOT {STATUS} "
+            f"BEGIN UPDATE inventory_product SET status = {STATUS} WHERE id = NEW.id; END"
+        )
+    # Correct rows written by queryset updates before the triggers existed
+    schema_editor.execute(
+        "UPDATE inventory_product SET status = "
+        "CASE WHEN quantity < low_stock_threshold THEN 'low' ELSE 'fair' END"
+    )
+
+
+def drop_status_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TRIGGER IF EXISTS inventory_product_status_insert')
+    schema_editor.execute('DROP TRIGGER IF EXISTS inventory_product_status_update')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stockmovement_import_reason'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'quantity'], name='product_status_qty_idx'),
+        ),
+        migrations.RunPython(create_status_triggers, drop_status_triggers),
+    ]
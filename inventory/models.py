@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 # Create your models here.
 
@@ -38,6 +39,16 @@ class Product(models.Model):
     tag = models.CharField(max_length=50, blank=True, null=True)
     batch = models.CharField(max_length=50, blank=True, null=True)
     low_stock_threshold = models.PositiveIntegerField(default=50, help_text='Set the quantity below which this product is considered low stock.')
+    # Catalog revision of the last change, used by POS terminals to delta-sync
+    revision = models.PositiveBigIntegerField(default=0, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Low-stock counts and lists are read from this index alone. On
+            # SQLite, triggers keep status in step with quantity and threshold
+            # on every write, including queryset updates and bulk inserts
+            models.Index(fields=['status', 'quantity'], name='product_status_qty_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # Automatically set status based on quantity and product-specific threshold
@@ -45,7 +56,96 @@ class Product(models.Model):
             self.status = 'low'
         else:
             self.status = 'fair'
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'status', 'revision'}
+        # The revision is allocated in pre_save; keep it in the same
+        # transaction so revisions become visible in allocation order
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} ({self.get_category_display()})"
+
+
+class CatalogRevision(models.Model):
+    """
+    Single-row counter behind ``Product.revision``
+
+    Every product edit takes the next value inside its own transaction; stock
+    changes take one in a short transaction right after they commit. The
+    counter row stays locked until that transaction commits, so revisions
+    become visible in increasing order and a terminal that has synced up to
+    revision N can never miss a later commit with a smaller number.
+    """
+    SINGLETON_ID = 1
+
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Catalog revision {self.last_value}"
+
+
+class ProductTombstone(models.Model):
+    """Marks a deleted product so delta syncs can drop it from terminals."""
+    product_id = models.BigIntegerField(primary_key=True)
+    revision = models.PositiveBigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Deleted product {self.product_id} at revision {self.revision}"
+
+
+class StockMovement(models.Model):
+    """
+    One change to a product's stock level
+
+    The ledger is append-only: every change to ``Product.quantity`` writes a
+    row here in the same transaction, so the deltas of a product always sum
+    to its quantity. ``check_stock_ledger`` verifies that.
+    """
+    REASON_CHOICES = [
+        ('opening', 'Opening Stock'),
+        ('sale', 'Sale'),
+        ('return', 'Sale Reversed'),
+        ('adjustment', 'Manual Adjustment'),
+        ('import', 'Import'),
+    ]
+
+    product = models.ForeignKey(Product, related_name='stock_movements', on_delete=models.CASCADE)
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # Number of the document behind the change, e.g. a POS number
+    reference = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stockmove_product_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.delta:+d} {self.product_id} ({self.reason})"
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's closing stock at the end of one local day
+
+    Written by ``snapshot_stock`` from the previous snapshot plus that day's
+    movements, so the stock on hand at any moment is a snapshot plus a short
+    scan of the movements after it.
+    """
+    product = models.ForeignKey(Product, related_name='stock_snapshots', on_delete=models.CASCADE)
+    day = models.DateField(db_index=True)
+    quantity = models.IntegerField()
+
+    class Meta:
+        ordering = ['day', 'product']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_stock_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.quantity}"
@@ -0,0 +1,147 @@
+"""
+Full-text product search for ARSAFA ERP System
+
+Products are indexed in an SQLite FTS5 table (``inventory_product_search``)
+over name, tag, batch, barcode and category label, keyed by product id. The
+product signals keep it in sync on save and delete; bulk writes that bypass
+signals call ``index_products`` themselves, and
+``rebuild_product_search_index`` rebuilds it from scratch.
+
+Each word typed is matched as a prefix and results are ranked with bm25,
+weighting a hit in the name or barcode above one in the category. The
+product list filters and orders on the index in SQL, so every match is
+counted and paged; the invoice product picker asks for the top few ids. On
+other database backends the index does not exist and search falls back to
+``name__icontains``.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, When
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+SEARCH_TABLE = 'inventory_product_search'
+SEARCH_COLUMNS = ['name', 'tag', 'batch', 'barcode', 'category']
+
+# bm25 weight per column, in SEARCH_COLUMNS order
+COLUMN_WEIGHTS = [10.0, 4.0, 2.0, 8.0, 1.0]
+
+BATCH_SIZE = 500
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def search_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(text):
+    """FTS5 query matching every word of ``text`` as a prefix, or '' if there are none."""
+    return ' '.join(f'"{word}"*' for word in _WORD.findall(text.lower()))
+
+
+def _document(product):
+    category = dict(Product.CATEGORY_CHOICES).get(product.category, product.category)
+    return [product.pk, product.name, product.tag or '', product.batch or '', product.barcode or '', category]
+
+
+def index_products(products):
+    """Add or refresh the index rows of the given products."""
+    if not search_available():
+        return
+    rows = [_document(product) for product in products]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [[row[0]] for row in batch])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(SEARCH_COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s)',
+                batch,
+            )
+
+
+def remove_products(product_ids):
+    """Drop the index rows of deleted products."""
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [[pk] for pk in product_ids])
+
+
+def rebuild_search_index():
+    """Rebuild the whole index from the product table; returns the number of products indexed."""
+    if not search_available():
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    batch = []
+    for product in Product.objects.only('id', *SEARCH_COLUMNS).iterator(chunk_size=BATCH_SIZE * 4):
+        batch.append(product)
+        if len(batch) == BATCH_SIZE:
+            index_products(batch)
+            count += len(batch)
+            batch = []
+    index_products(batch)
+    return count + len(batch)
+
+
+def _rank():
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    return f'bm25({SEARCH_TABLE}, {weights})'
+
+
+def search_products(text):
+    """
+    Filter and ordering for the products matching ``text``.
+
+    Returns:
+        ``(ids, rank)``: a subquery of every matching id for ``pk__in``, and
+        each product's bm25 rank for ``order_by`` (best match first), or None
+        when full-text search is unavailable
+    """
+    if not search_available():
+        return None
+    query = match_query(text)
+    if not query:
+        return [], F('pk')
+    ids = RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [query])
+    rank = RawSQL(
+        f'SELECT {_rank()} FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = "{Product._meta.db_table}"."id"',
+        [query],
+        output_field=FloatField(),
+    )
+    return ids, rank
+
+
+def search_product_ids(text, limit=None):
+    """
+    Ids of the products matching ``text``, best match first.
+
+    Returns None when full-text search is unavailable, so callers can fall
+    back to a plain name filter.
+    """
+    if not search_available():
+        return None
+    query = match_query(text)
+    if not query:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY {_rank()} LIMIT %s',
+            [query, -1 if limit is None else limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rank_order(ids):
+    """Expression ordering products as ``ids`` lists them, for ``order_by``."""
+    if not ids:
+        return F('pk').asc()
+    return Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)], default=len(ids))
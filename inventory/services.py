@@ -0,0 +1,159 @@
+"""
+Stock reservation for ARSAFA ERP System
+
+Stock levels are changed with single conditional UPDATE statements so that
+concurrent sales of the same product can never lose an update or oversell.
+The low/fair status is recomputed in the same statement. A whole cart can be
+reserved at once with ``reserve_stock_bulk``.
+
+Every stock change appends a movement to the stock ledger (see ``ledger``)
+in the same transaction. The changed products get a new catalog revision
+(see ``allocate_catalog_revision``) once that transaction commits, so POS
+terminals pick them up on their next delta sync without every sale queueing
+on the single revision counter row.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.lookups import LessThan
+
+from .ledger import record_movements
+from .models import CatalogRevision, Product
+
+
+class InsufficientStock(ValidationError):
+    """Raised when a product does not have enough stock for a reservation."""
+
+
+def _status_for(quantity):
+    """SQL expression for the status a product has at the given quantity."""
+    return Case(
+        When(LessThan(quantity, F('low_stock_threshold')), then=Value('low')),
+        default=Value('fair'),
+    )
+
+
+def allocate_catalog_revision():
+    """
+    Return the next catalog revision number.
+
+    The counter row is incremented with a single UPDATE, which holds its lock
+    until the caller's transaction ends. Call this inside the transaction that
+    changes the product so revisions commit in order.
+    """
+    with transaction.atomic():
+        counter = CatalogRevision.objects.filter(pk=CatalogRevision.SINGLETON_ID)
+        if not counter.update(last_value=F('last_value') + 1):
+            try:
+                with transaction.atomic():
+                    CatalogRevision.objects.create(pk=CatalogRevision.SINGLETON_ID, last_value=1)
+            except IntegrityError:
+                # Another request created the counter first
+                counter.update(last_value=F('last_value') + 1)
+        return counter.values_list('last_value', flat=True).get()
+
+
+def stamp_revisions_on_commit(product_ids):
+    """
+    Give the products a new catalog revision after the current transaction commits.
+
+    The stamp runs in its own short transaction, so the counter row is locked
+    only for two quick UPDATEs rather than for a whole sale. All products
+    queued on this connection share the first stamp that runs.
+    """
+    pending = getattr(connection, '_pending_revision_ids', None)
+    if pending is None:
+        pending = set()
+        connection._pending_revision_ids = pending
+    pending.update(product_ids)
+    transaction.on_commit(_stamp_pending_revisions)
+
+
+def _stamp_pending_revisions():
+    pending = getattr(connection, '_pending_revision_ids', None)
+    if not pending:
+        return
+    product_ids = list(pending)
+    pending.clear()
+    with transaction.atomic():
+        Product.objects.filter(pk__in=product_ids).update(revision=allocate_catalog_revision())
+
+
+def reserve_stock(product_id, quantity, reference=''):
+    """
+    Atomically take ``quantity`` units out of stock.
+
+    Runs ``UPDATE ... SET quantity = quantity - n WHERE quantity >= n``, so the
+    check and the decrement cannot be interleaved with another sale.
+
+    Args:
+        product_id: Product to take stock from
+        quantity: Units to reserve
+        reference: Number of the sale, recorded on the stock movement
+
+    Raises:
+        InsufficientStock: When fewer than ``quantity`` units are available
+    """
+    remaining = F('quantity') - quantity
+    with transaction.atomic():
+        updated = Product.objects.filter(pk=product_id, quantity__gte=quantity).update(
+            quantity=remaining,
+            status=_status_for(remaining),
+        )
+        if updated:
+            record_movements({product_id: -quantity}, 'sale', reference)
+            stamp_revisions_on_commit([product_id])
+    if not updated:
+        product = Product.objects.filter(pk=product_id).only('name', 'quantity').first()
+        if product is None:
+            raise InsufficientStock('Product no longer exists.')
+        if product.quantity > 0:
+            raise InsufficientStock(f'Insufficient stock for {product.name}. Only {product.quantity} units available.')
+        raise InsufficientStock(f'Stock unavailable for {product.name}.')
+
+
+def release_stock(product_id, quantity, reference=''):
+    """Atomically put ``quantity`` units back into stock."""
+    restored = F('quantity') + quantity
+    with transaction.atomic():
+        updated = Product.objects.filter(pk=product_id).update(
+            quantity=restored,
+            status=_status_for(restored),
+        )
+        if updated:
+            record_movements({product_id: quantity}, 'return', reference)
+            stamp_revisions_on_commit([product_id])
+
+
+def reserve_stock_bulk(quantities, reference=''):
+    """
+    Atomically take stock for several products in one UPDATE.
+
+    Every product is decremented with a single ``CASE`` statement guarded by
+    ``quantity >= n`` for each row. If any row is short, the rows that were
+    updated are left for the caller's transaction to roll back. Call this
+    inside ``transaction.atomic()``.
+
+    Args:
+        quantities: Mapping of product id to units to reserve
+        reference: Number of the sale, recorded on the stock movements
+
+    Raises:
+        InsufficientStock: When any product has fewer units than requested
+    """
+    if not quantities:
+        return
+    requested = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    remaining = F('quantity') - requested
+    updated = Product.objects.filter(pk__in=quantities, quantity__gte=requested).update(
+        quantity=remaining,
+        status=_status_for(remaining),
+    )
+    if updated != len(quantities):
+        raise InsufficientStock('Stock changed for one or more products. Please review the cart and try again.')
+    record_movements({product_id: -quantity for product_id, quantity in quantities.items()}, 'sale', reference)
+    stamp_revisions_on_commit(quantities)
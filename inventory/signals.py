@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, ProductTombstone
+from .cache import bump_catalog_version
+from .services import allocate_catalog_revision
+from .search import SEARCH_COLUMNS, index_products, remove_products
+from .ledger import record_movements
+
+
+@receiver(pre_save, sender=Product)
+def stamp_product_revision(sender, instance, **kwargs):
+    """Give every saved product a new catalog revision for delta syncs."""
+    instance.revision = allocate_catalog_revision()
+
+
+@receiver(post_delete, sender=Product)
+def record_product_tombstone(sender, instance, **kwargs):
+    """Leave a tombstone so terminals drop the product on their next sync."""
+    ProductTombstone.objects.update_or_create(
+        product_id=instance.pk,
+        defaults={'revision': allocate_catalog_revision()},
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_lookups(sender, instance, **kwargs):
+    """
+    Any product change invalidates the barcode/price lookup caches.
+
+    The bump waits for the commit so no worker can re-cache the old row
+    under the new version.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def index_product_search(sender, instance, update_fields=None, **kwargs):
+    """Refresh the product's full-text search row when a searched field changes."""
+    if update_fields is not None and not set(update_fields) & set(SEARCH_COLUMNS):
+        return
+    index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_search(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(pre_save, sender=Product)
+def remember_stock_level(sender, instance, update_fields=None, **kwargs):
+    """
+    Read the stored quantity of an edited product, locking its row, so the
+    movement recorded after the save is the real change.
+    """
+    instance._stock_before = None
+    if instance._state.adding or (update_fields is not None and 'quantity' not in update_fields):
+        return
+    instance._stock_before = (
+        Product.objects.select_for_update().filter(pk=instance.pk)
+        .values_list('quantity', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def record_stock_change(sender, instance, created, **kwargs):
+    """Add opening stock and manual quantity edits to the stock ledger."""
+    if created:
+        record_movements({instance.pk: instance.quantity}, 'opening')
+    elif instance._stock_before is not None:
+        record_movements({instance.pk: instance.quantity - instance._stock_before}, 'adjustment')
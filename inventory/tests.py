@@ -1,3 +1,517 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import ProductLookupCache, lookup_product_by_barcode, product_lookups
+from .imports import ProductImportError, import_products, read_rows
+from .ledger import ledger_drift, snapshot_stock, stock_on_hand
+from .models import CatalogRevision, Product, StockMovement, StockSnapshot
+from .search import SEARCH_TABLE, index_products, match_query, search_product_ids
+from .services import InsufficientStock, reserve_stock, reserve_stock_bulk, release_stock
+from .views import PRODUCT_LIST_PAGE_SIZE
+
+
+class StockReservationTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Test Product",
+            category="snacks",
+            quantity=60,
+            unit_price=Decimal('10.00'),
+            low_stock_threshold=50
+        )
+
+    def test_reserve_recomputes_status(self):
+        reserve_stock(self.product.pk, 15)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 45)
+        self.assertEqual(self.product.status, 'low')
+
+        release_stock(self.product.pk, 5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 50)
+        self.assertEqual(self.product.status, 'fair')
+
+    def test_reserve_refuses_to_oversell(self):
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(self.product.pk, 61)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 60)
+
+
+class ProductLookupCacheTestCase(TestCase):
+    def setUp(self):
+        product_lookups.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Test Product",
+                category="snacks",
+                quantity=60,
+                unit_price=Decimal('10.00'),
+                barcode="123456"
+            )
+
+    def test_repeat_lookups_skip_the_database(self):
+        self.assertEqual(lookup_product_by_barcode("123456")['price'], '10.00')
+        self.assertIsNone(lookup_product_by_barcode("unknown"))
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup_product_by_barcode("123456")['name'], "Test Product")
+            self.assertIsNone(lookup_product_by_barcode("unknown"))
+
+    def test_product_save_invalidates_lookups(self):
+        lookup_product_by_barcode("123456")
+        self.product.unit_price = Decimal('12.50')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(lookup_product_by_barcode("123456")['price'], '12.50')
+
+    def test_lru_is_bounded(self):
+        lookups = ProductLookupCache(max_entries=2)
+        for key in ['a', 'b', 'a', 'c']:
+            lookups.get(key, lambda: key.upper())
+        self.assertEqual(len(lookups), 2)
+        # 'b' was least recently used and got evicted; 'a' is still cached
+        self.assertEqual(lookups.get('a', lambda: 'reloaded'), 'A')
+        self.assertEqual(lookups.get('b', lambda: 'reloaded'), 'reloaded')
+
+
+class CatalogSnapshotTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='cashier', password='secret')
+        self.client.force_login(user)
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                category="snacks",
+                quantity=100,
+                unit_price=Decimal('5.00'),
+                barcode=f"BC{i:04d}"
+            )
+            for i in range(20)
+        ]
+
+    def snapshot(self, **params):
+        return self.client.get(reverse('catalog_snapshot'), params)
+
+    def test_full_snapshot(self):
+        data = self.snapshot().json()
+        self.assertEqual(data['fields'], ['id', 'name', 'barcode', 'unit_price', 'quantity'])
+        self.assertEqual(len(data['products']), 20)
+        self.assertEqual(data['products'][0], [self.products[0].pk, 'Product 0', 'BC0000', '5.00', 100])
+
+    def test_delta_returns_changes_and_tombstones(self):
+        version = self.snapshot().json()['version']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock(self.products[3].pk, 4)
+        self.products[5].unit_price = Decimal('6.00')
+        self.products[5].save()
+        deleted_id = self.products[7].pk
+        self.products[7].delete()
+
+        data = self.snapshot(since=version).json()
+        self.assertGreater(data['version'], version)
+        self.assertEqual(
+            [(row[0], row[3], row[4]) for row in data['products']],
+            [(self.products[3].pk, '5.00', 96), (self.products[5].pk, '6.00', 100)],
+        )
+        self.assertEqual(data['deleted'], [deleted_id])
+
+        data = self.snapshot(since=data['version']).json()
+        self.assertEqual((data['products'], data['deleted']), ([], []))
+
+    def test_unchanged_catalog_answers_304(self):
+        etag = self.snapshot()['ETag']
+        response = self.client.get(reverse('catalog_snapshot'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_stock(self.products[0].pk, 1)
+        response = self.client.get(reverse('catalog_snapshot'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_sales_stamp_one_revision_after_commit(self):
+        counter = CatalogRevision.objects.get()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                reserve_stock_bulk({self.products[1].pk: 2, self.products[2].pk: 3})
+                release_stock(self.products[4].pk, 1)
+                # The counter row is not touched inside the sale
+                self.assertEqual(CatalogRevision.objects.get().last_value, counter.last_value)
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(CatalogRevision.objects.get().last_value, counter.last_value + 1)
+        self.assertEqual(
+            set(Product.objects.filter(revision=counter.last_value + 1).values_list('pk', flat=True)),
+            {self.products[1].pk, self.products[2].pk, self.products[4].pk},
+        )
+
+    def test_snapshot_is_gzipped(self):
+        response = self.client.get(reverse('catalog_snapshot'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['products']), 20)
+
+    def test_invalid_since_is_rejected(self):
+        self.assertEqual(self.snapshot(since='abc').status_code, 400)
+
+
+class ProductListTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='manager', password='secret')
+        self.client.force_login(user)
+        today = timezone.localdate()
+        Product.objects.bulk_create([
+            Product(
+                name=f"Product {i:03d}",
+                category="snacks",
+                quantity=i,
+                unit_price=Decimal('0.10'),
+                buying_price=Decimal('0.07'),
+                low_stock_threshold=10,
+                expiry_date=today + timedelta(days=i % 30),
+            )
+            for i in range(PRODUCT_LIST_PAGE_SIZE + 20)
+        ])
+
+    def test_summary_is_one_exact_aggregate(self):
+        response = self.client.get(reverse('product_list'))
+        context = response.context
+        count = PRODUCT_LIST_PAGE_SIZE + 20
+        self.assertEqual(context['total_product_count'], count)
+        self.assertEqual(context['low_stock_count'], 10)
+        self.assertEqual(context['nearly_expire_count'], sum(1 for i in range(count) if i % 30 <= 7))
+        units = sum(range(count))
+        self.assertEqual(context['total_price'], Decimal('0.10') * units)
+        self.assertEqual(context['total_cost'], Decimal('0.07') * units)
+
+    def test_list_is_paginated(self):
+        with self.assertNumQueries(4):
+            # Session, user, the summary aggregate and one page of products
+            response = self.client.get(reverse('product_list'), {'sort': 'quantity_desc'})
+        self.assertEqual(len(response.context['products']), PRODUCT_LIST_PAGE_SIZE)
+        self.assertEqual(response.context['products'][0].quantity, PRODUCT_LIST_PAGE_SIZE + 19)
+
+        response = self.client.get(reverse('product_list'), {'sort': 'quantity_desc', 'page': 2})
+        self.assertEqual([p.quantity for p in response.context['products']], list(range(19, -1, -1)))
+
+
+class ProductSearchTestCase(TestCase):
+    def setUp(self):
+        self.milk = Product.objects.create(
+            name="Fresh Milk", category="dairy_eggs", quantity=20, unit_price=Decimal('90.00'),
+            barcode="8901234000017", tag="organic",
+        )
+        self.chocolate = Product.objects.create(
+            name="Milk Chocolate", category="snacks", quantity=5, unit_price=Decimal('120.00'),
+            batch="B-2291",
+        )
+        self.juice = Product.objects.create(
+            name="Orange Juice", category="beverages", quantity=8, unit_price=Decimal('150.00'),
+            tag="milkless",
+        )
+
+    def test_match_query_escapes_words_as_prefixes(self):
+        self.assertEqual(match_query('Mil "choc'), '"mil"* "choc"*')
+        self.assertEqual(match_query('  -*  '), '')
+
+    def test_prefix_search_over_every_column(self):
+        self.assertEqual(set(search_product_ids('mil')), {self.milk.pk, self.chocolate.pk, self.juice.pk})
+        self.assertEqual(search_product_ids('89012'), [self.milk.pk])
+        self.assertEqual(search_product_ids('b 2291'), [self.chocolate.pk])
+        self.assertEqual(search_product_ids('dairy'), [self.milk.pk])
+        self.assertEqual(search_product_ids('milk choc'), [self.chocolate.pk])
+        self.assertEqual(search_product_ids('nothing'), [])
+
+    def test_name_matches_rank_above_tag_matches(self):
+        self.assertEqual(search_product_ids('milk')[-1], self.juice.pk)
+
+    def test_index_follows_save_and_delete(self):
+        self.juice.name = "Orange Squash"
+        self.juice.save()
+        self.assertEqual(search_product_ids('squash'), [self.juice.pk])
+        self.assertEqual(search_product_ids('juice'), [])
+
+        self.chocolate.delete()
+        self.assertEqual(set(search_product_ids('milk')), {self.milk.pk, self.juice.pk})
+
+    def test_rebuild_command_restores_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self.assertEqual(search_product_ids('milk'), [])
+        call_command('rebuild_product_search_index', stdout=open('/dev/null', 'w'))
+        self.assertEqual(set(search_product_ids('milk')), {self.milk.pk, self.chocolate.pk, self.juice.pk})
+
+    def test_product_list_orders_by_rank(self):
+        user = User.objects.create_user(username='manager', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('product_list'), {'search': 'milk'})
+        self.assertEqual(response.context['total_product_count'], 3)
+        self.assertEqual(response.context['products'][2].pk, self.juice.pk)
+
+        response = self.client.get(reverse('product_list'), {'search': 'milk', 'sort': 'price_desc'})
+        self.assertEqual([p.pk for p in response.context['products']], [self.juice.pk, self.chocolate.pk, self.milk.pk])
+
+    def test_product_list_counts_and_pages_every_match(self):
+        Product.objects.bulk_create([
+            Product(name=f"Milk Powder {i}", category="dairy_eggs", quantity=1, unit_price=Decimal('10.00'))
+            for i in range(600)
+        ])
+        index_products(Product.objects.all())
+        user = User.objects.create_user(username='manager', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('product_list'), {'search': 'milk', 'page': 13})
+        self.assertEqual(response.context['total_product_count'], 603)
+        self.assertEqual(len(response.context['products']), 3)
+        # Tag-only match ranks last
+        self.assertEqual(response.context['products'][2].pk, self.juice.pk)
+
+    def test_pos_autocomplete(self):
+        url = reverse('product_search')
+        user = User.objects.create_user(username='cashier', password='secret')
+        self.client.force_login(user)
+        results = self.client.get(url, {'q': '8901'}).json()['results']
+        self.assertEqual(results, [{
+            'product_id': self.milk.pk,
+            'name': 'Fresh Milk',
+            'price': '90.00',
+            'barcode': '8901234000017',
+            'quantity': 20,
+        }])
+        self.assertEqual(self.client.get(url, {'q': ''}).json(), {'results': []})
+
+
+class StockLedgerTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Rice", category="pantry_dry_goods", quantity=100, unit_price=Decimal('80.00'),
+        )
+
+    def movements(self):
+        return list(self.product.stock_movements.values_list('delta', 'reason', 'reference'))
+
+    def test_every_change_is_recorded(self):
+        reserve_stock(self.product.pk, 30, reference='POS-0001')
+        release_stock(self.product.pk, 5, reference='POS-0001')
+        self.product.refresh_from_db()
+        self.product.quantity = 90
+        self.product.save()
+        self.product.unit_price = Decimal('85.00')
+        self.product.save()
+
+        self.assertEqual(self.movements(), [
+            (100, 'opening', ''),
+            (-30, 'sale', 'POS-0001'),
+            (5, 'return', 'POS-0001'),
+            (15, 'adjustment', ''),
+        ])
+        self.assertEqual(ledger_drift(), [])
+
+    def test_failed_reservation_records_nothing(self):
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(self.product.pk, 500)
+        self.assertEqual(len(self.movements()), 1)
+
+    def test_edit_of_stale_instance_records_real_change(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        reserve_stock(self.product.pk, 40)
+        stale.quantity = 70
+        stale.save()
+        self.assertEqual(self.movements()[-1], (10, 'adjustment', ''))
+        self.assertEqual(ledger_drift(), [])
+
+    def test_drift_is_found_in_one_query_and_fixed(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=120)
+        with self.assertNumQueries(1):
+            drifted = ledger_drift()
+        self.assertEqual(drifted, [(self.product.pk, 'Rice', 120, 100)])
+
+        call_command('check_stock_ledger', '--fix', stdout=open('/dev/null', 'w'))
+        self.assertEqual(ledger_drift(), [])
+        self.assertEqual(self.movements()[-1], (20, 'adjustment', 'ledger check'))
+
+    def test_point_in_time_from_snapshot_and_movements(self):
+        now = timezone.now()
+        StockMovement.objects.filter(product=self.product).update(created_at=now - timedelta(days=3))
+        reserve_stock(self.product.pk, 10)
+        StockMovement.objects.filter(reason='sale').update(created_at=now - timedelta(days=2))
+        reserve_stock(self.product.pk, 25)
+
+        today = timezone.localdate()
+        days = snapshot_stock()
+        self.assertEqual(days[0], timezone.localdate(now - timedelta(days=3)))
+        self.assertEqual(days[-1], today - timedelta(days=1))
+        self.assertEqual(
+            StockSnapshot.objects.get(product=self.product, day=today - timedelta(days=1)).quantity, 90
+        )
+        self.assertEqual(snapshot_stock(), [])
+
+        with self.assertNumQueries(3):
+            self.assertEqual(stock_on_hand(timezone.now()), {self.product.pk: 65})
+        self.assertEqual(stock_on_hand(now - timedelta(days=2, seconds=1)), {self.product.pk: 100})
+        self.assertEqual(stock_on_hand(now - timedelta(days=4)), {})
+
+
+class ProductImportTestCase(TestCase):
+    def setUp(self):
+        self.existing = Product.objects.create(
+            name="Old Name", category="snacks", quantity=5, unit_price=Decimal('10.00'),
+            barcode="1111", tag="kept", low_stock_threshold=3,
+        )
+
+    def run_import(self, text, dry_run=False):
+        columns, rows = read_rows(io.BytesIO(text.encode('utf-8')), 'products.csv')
+        return import_products(columns, rows, dry_run=dry_run, chunk_size=2)
+
+    def test_upsert_by_barcode_with_error_report(self):
+        revision = Product.objects.get(pk=self.existing.pk).revision
+        result = self.run_import(
+            "Name,Category,Quantity,Unit Price,Barcode\n"
+            "Crisps,snacks,2,15.50,1111\n"
+            "Greek Yogurt,Dairy & Eggs,80,120,2222\n"
+            ",snacks,1,1,3333\n"
+            "Bread,bakery,-4,abc,\n"
+            "Loose Apples,produce,30,60.00,\n"
+            "Yogurt Again,dairy_eggs,1,1,2222\n"
+        )
+        self.assertEqual((result.created, result.updated), (2, 1))
+        self.assertEqual(result.errors, [
+            (4, 'Name is required.'),
+            (5, 'Quantity must be a whole number of 0 or more. Unit price must be a price of 0 or more.'),
+            (7, 'Barcode 2222 is already used on row 3.'),
+        ])
+
+        existing = Product.objects.get(pk=self.existing.pk)
+        self.assertEqual((existing.name, existing.quantity, existing.unit_price), ('Crisps', 2, Decimal('15.50')))
+        # Columns missing from the file keep their stored values
+        self.assertEqual((existing.tag, existing.low_stock_threshold, existing.status), ('kept', 3, 'low'))
+        self.assertGreater(existing.revision, revision)
+
+        yogurt = Product.objects.get(barcode='2222')
+        self.assertEqual((yogurt.category, yogurt.status), ('dairy_eggs', 'fair'))
+        self.assertTrue(Product.objects.filter(name='Loose Apples', barcode=None).exists())
+
+        self.assertEqual(ledger_drift(), [])
+        self.assertEqual(existing.stock_movements.last().delta, -3)
+        self.assertEqual(search_product_ids('greek'), [yogurt.pk])
+        self.assertEqual(search_product_ids('crisps'), [self.existing.pk])
+
+    def test_blank_threshold_keeps_stored_value(self):
+        self.run_import(
+            "name,category,quantity,unit_price,barcode,low_stock_threshold\n"
+            "Crisps,snacks,4,15.50,1111,\n"
+            "Tea,beverages,5,50,9999,\n"
+            "Coffee,beverages,5,50,8888,2\n"
+        )
+        existing = Product.objects.get(pk=self.existing.pk)
+        self.assertEqual((existing.low_stock_threshold, existing.status), (3, 'fair'))
+        self.assertEqual(Product.objects.get(barcode='9999').low_stock_threshold, 50)
+        self.assertEqual(Product.objects.get(barcode='8888').low_stock_threshold, 2)
+
+    def test_dry_run_writes_nothing(self):
+        result = self.run_import("name,category,quantity,unit_price,barcode\nTea,beverages,5,50,9999\n", dry_run=True)
+        self.assertEqual((result.created, result.updated, result.errors), (1, 0, []))
+        self.assertFalse(Product.objects.filter(barcode='9999').exists())
+
+    def test_missing_columns_are_rejected(self):
+        with self.assertRaisesMessage(ProductImportError, 'Missing column(s): quantity, unit_price.'):
+            self.run_import("name,category\nTea,beverages\n")
+
+    def test_upload_view(self):
+        user = User.objects.create_user(username='manager', password='secret')
+        self.client.force_login(user)
+        upload = SimpleUploadedFile('products.csv', b"name,category,quantity,unit_price\nTea,beverages,5,50\nBad,nope,1,1\n")
+        response = self.client.post(reverse('product_import'), {'file': upload})
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertEqual(response.context['errors'], [(3, 'Unknown category "nope".')])
+        self.assertTrue(Product.objects.filter(name='Tea').exists())
+
+        upload = SimpleUploadedFile('products.txt', b"name")
+        response = self.client.post(reverse('product_import'), {'file': upload})
+        self.assertEqual(response.context['error'], 'Upload a .csv or .xlsx file.')
+
+
+class LowStockStatusTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Sugar", category="pantry_dry_goods", quantity=20, unit_price=Decimal('90.00'),
+            low_stock_threshold=10,
+        )
+
+    def status(self):
+        return Product.objects.values_list('status', flat=True).get(pk=self.product.pk)
+
+    def test_queryset_updates_keep_status(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=F('quantity') - 15)
+        self.assertEqual(self.status(), 'low')
+        Product.objects.filter(pk=self.product.pk).update(low_stock_threshold=5)
+        self.assertEqual(self.status(), 'fair')
+        Product.objects.filter(pk=self.product.pk).update(status='low')
+        self.assertEqual(self.status(), 'fair')
+
+    def test_bulk_inserts_get_status(self):
+        Product.objects.bulk_create([
+            Product(name="Salt", category="pantry_dry_goods", quantity=1, unit_price=Decimal('20.00')),
+        ])
+        self.assertEqual(Product.objects.get(name="Salt").status, 'low')
+
+    def test_save_with_update_fields_writes_status(self):
+        self.product.quantity = 3
+        self.product.save(update_fields=['quantity'])
+        self.assertEqual(self.status(), 'low')
+
+    def test_low_stock_lookups_read_the_index(self):
+        plan = Product.objects.filter(status='low').order_by('quantity').values('quantity').explain()
+        self.assertIn('USING COVERING INDEX product_status_qty_idx', plan)
+
+
+class ConcurrentStockReservationTestCase(TransactionTestCase):
+    THREADS = 8
+    RESERVATIONS_PER_THREAD = 25
+
+    def test_concurrent_reservations_are_exact(self):
+        """Threads hammering one product never lose an update or oversell"""
+        initial = self.THREADS * self.RESERVATIONS_PER_THREAD - 10
+        product = Product.objects.create(
+            name="Hot Product",
+            category="snacks",
+            quantity=initial,
+            unit_price=Decimal('10.00')
+        )
+        reserved = []
+        refused = []
+        start = threading.Barrier(self.THREADS)
+
+        def worker():
+            start.wait()
+            try:
+                for _ in range(self.RESERVATIONS_PER_THREAD):
+                    try:
+                        reserve_stock(product.pk, 1)
+                        reserved.append(1)
+                    except InsufficientStock:
+                        refused.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(len(reserved), initial)
+        self.assertEqual(len(refused), 10)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(product.status, 'low')
@@ -4,7 +4,9 @@ from . import views
 urlpatterns = [
     path('', views.product_list, name='product_list'),
     path('create/', views.product_create, name='product_create'),
+    path('import/', views.product_import, name='product_import'),
     path('update/<int:pk>/', views.product_update, name='product_update'),
     path('delete/<int:pk>/', views.product_delete, name='product_delete'),
     path('detail/<int:pk>/', views.product_detail, name='product_detail'),
+    path('api/catalog/', views.catalog_snapshot, name='catalog_snapshot'),
 ] 
\ No newline at end of file
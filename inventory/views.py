@@ -1,59 +1,101 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
 from django.utils import timezone
-from .models import Product
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
+from .models import Product, CatalogRevision, ProductTombstone
 from .forms import ProductForm
+from .imports import IMPORT_COLUMNS, REQUIRED_COLUMNS, ProductImportError, import_products, read_rows
+from .search import search_products
 from datetime import timedelta, date
 from django.contrib.auth.decorators import login_required
-from django.db.models import F
+from django.core.paginator import Paginator
+from django.db.models import Count, DecimalField, F, Q, Sum
+from decimal import Decimal
+
+CATALOG_SNAPSHOT_FIELDS = ['id', 'name', 'barcode', 'unit_price', 'quantity']
 
 # Create your views here.
 
+PRODUCT_LIST_PAGE_SIZE = 50
+
+STOCK_MOVEMENTS_SHOWN = 20
+
+IMPORT_ERRORS_SHOWN = 200
+
+# Sort options offered by the product list; pk breaks ties so pages are stable
+PRODUCT_SORTS = {
+    'price_asc': ['unit_price', 'pk'],
+    'price_desc': ['-unit_price', '-pk'],
+    'name_asc': ['name', 'pk'],
+    'name_desc': ['-name', '-pk'],
+    'expiry_asc': ['expiry_date', 'pk'],
+    'expiry_desc': ['-expiry_date', '-pk'],
+    'category_asc': ['category', 'pk'],
+    'quantity_asc': ['quantity', 'pk'],
+    'quantity_desc': ['-quantity', '-pk'],
+    'status': ['status', 'pk'],
+}
+
+
+def _stock_summary(products, today, near_expiry_days=7):
+    """Counters and stock valuation for the product list in one aggregate query."""
+    value = DecimalField(max_digits=18, decimal_places=2)
+    summary = products.aggregate(
+        total_product_count=Count('pk'),
+        low_stock_count=Count('pk', filter=Q(status='low')),
+        nearly_expire_count=Count(
+            'pk', filter=Q(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=near_expiry_days))
+        ),
+        total_price=Sum(F('quantity') * F('unit_price'), output_field=value),
+        total_cost=Sum(F('quantity') * F('buying_price'), output_field=value),
+    )
+    summary['total_price'] = summary['total_price'] or Decimal('0.00')
+    summary['total_cost'] = summary['total_cost'] or Decimal('0.00')
+    return summary
+
+
 @login_required
 def product_list(request):
     search_query = request.GET.get('search', '')
     category_query = request.GET.get('category', '')
     sort_query = request.GET.get('sort', '')
     products = Product.objects.all()
+    rank = None
     if search_query:
-        products = products.filter(name__icontains=search_query)
+        search = search_products(search_query)
+        if search is None:
+            products = products.filter(name__icontains=search_query)
+        else:
+            matching_ids, rank = search
+            products = products.filter(pk__in=matching_ids)
     if category_query:
         products = products.filter(category=category_query)
-    # Sorting logic
-    if sort_query == 'price_asc':
-        products = products.order_by('unit_price')
-    elif sort_query == 'price_desc':
-        products = products.order_by('-unit_price')
-    elif sort_query == 'name_asc':
-        products = products.order_by('name')
-    elif sort_query == 'name_desc':
-        products = products.order_by('-name')
-    elif sort_query == 'expiry_asc':
-        products = products.order_by('expiry_date')
-    elif sort_query == 'expiry_desc':
-        products = products.order_by('-expiry_date')
-    elif sort_query == 'category_asc':
-        products = products.order_by('category')
-    near_expiry_days = 7
-    today = timezone.now().date()
-
-    # New inventory management box logic using product-specific thresholds
-    low_stock_count = products.filter(quantity__lt=F('low_stock_threshold')).count()
-    nearly_expire_count = products.filter(expiry_date__isnull=False, expiry_date__lte=today + timedelta(days=near_expiry_days), expiry_date__gte=today).count()
-    total_product_count = products.count()
-    total_price = sum([(p.quantity or 0) * float(p.unit_price or 0) for p in products])
+
+    summary = _stock_summary(products, timezone.localdate())
+
+    if sort_query in PRODUCT_SORTS:
+        ordering = PRODUCT_SORTS[sort_query]
+    elif rank is not None:
+        # Best search matches first
+        ordering = [rank, 'pk']
+    else:
+        ordering = ['pk']
+    paginator = Paginator(products.order_by(*ordering), PRODUCT_LIST_PAGE_SIZE)
+    # The aggregate already counted the filtered products
+    paginator.count = summary['total_product_count']
+    page = paginator.get_page(request.GET.get('page'))
 
     categories = Product.CATEGORY_CHOICES
 
     return render(request, 'inventory/product_list.html', {
-        'products': products,
+        'products': page.object_list,
+        'page_obj': page,
         'search_query': search_query,
         'category_query': category_query,
         'sort_query': sort_query,
         'categories': categories,
-        'low_stock_count': low_stock_count,
-        'nearly_expire_count': nearly_expire_count,
-        'total_product_count': total_product_count,
-        'total_price': total_price,
+        **summary,
     })
 
 @login_required
@@ -68,6 +110,28 @@ def product_create(request):
         form = ProductForm(initial={'input_date': date.today()})
     return render(request, 'inventory/product_form.html', {'form': form})
 
+@login_required
+def product_import(request):
+    context = {'columns': IMPORT_COLUMNS, 'required_columns': REQUIRED_COLUMNS}
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        dry_run = bool(request.POST.get('dry_run'))
+        try:
+            if upload is None:
+                raise ProductImportError('Choose a .csv or .xlsx file to import.')
+            columns, rows = read_rows(upload, upload.name)
+            result = import_products(columns, rows, dry_run=dry_run)
+        except ProductImportError as e:
+            context['error'] = str(e)
+        else:
+            context.update({
+                'result': result,
+                'dry_run': dry_run,
+                'errors': result.errors[:IMPORT_ERRORS_SHOWN],
+                'hidden_errors': max(len(result.errors) - IMPORT_ERRORS_SHOWN, 0),
+            })
+    return render(request, 'inventory/product_import.html', context)
+
 @login_required
 def product_update(request, pk):
     product = get_object_or_404(Product, pk=pk)
@@ -91,4 +155,72 @@ def product_delete(request, pk):
 @login_required
 def product_detail(request, pk):
     product = get_object_or_404(Product, pk=pk)
-    return render(request, 'inventory/product_detail.html', {'product': product})
+    movements = product.stock_movements.order_by('-created_at', '-id')[:STOCK_MOVEMENTS_SHOWN]
+    return render(request, 'inventory/product_detail.html', {'product': product, 'movements': movements})
+
+
+def _catalog_since(request):
+    """Parse ``?since=<revision>``; None for a full snapshot, -1 when invalid."""
+    since = request.GET.get('since')
+    if since in (None, ''):
+        return None
+    try:
+        since = int(since)
+    except ValueError:
+        return -1
+    return since if since >= 0 else -1
+
+
+def _current_catalog_revision():
+    return CatalogRevision.objects.values_list('last_value', flat=True).first() or 0
+
+
+def _catalog_etag(request):
+    since = _catalog_since(request)
+    if since == -1:
+        return None
+    etag = f'catalog-{_current_catalog_revision()}'
+    return etag if since is None else f'{etag}-since-{since}'
+
+
+@login_required
+@require_GET
+@gzip_page
+@condition(etag_func=_catalog_etag)
+def catalog_snapshot(request):
+    """
+    Compact product catalog for POS terminals to resolve barcodes locally
+
+    Without parameters returns every product as rows of
+    ``CATALOG_SNAPSHOT_FIELDS``. With ``?since=<version>`` returns only the
+    products changed after that version plus the ids of deleted products.
+    Terminals store the returned ``version`` and pass it on their next sync;
+    an unchanged catalog answers 304 from the ETag alone.
+    """
+    since = _catalog_since(request)
+    if since == -1:
+        return JsonResponse({'errors': {'since': ['Must be a non-negative catalog version.']}}, status=400)
+
+    # Read the version first: anything committed after this point has a
+    # higher revision and is picked up again on the next sync
+    version = _current_catalog_revision()
+    products = Product.objects.order_by('id')
+    deleted = []
+    if since is not None:
+        products = products.filter(revision__gt=since)
+        deleted = list(
+            ProductTombstone.objects.filter(revision__gt=since)
+            .order_by('product_id').values_list('product_id', flat=True)
+        )
+
+    return JsonResponse({
+        'version': version,
+        'since': since,
+        'fields': CATALOG_SNAPSHOT_FIELDS,
+        'products': [
+            [pk, name, barcode, str(unit_price), quantity]
+            for pk, name, barcode, unit_price, quantity
+            in products.values_list(*CATALOG_SNAPSHOT_FIELDS).iterator(chunk_size=2000)
+        ],
+        'deleted': deleted,
+    })
@@ -0,0 +1,196 @@
+"""
+CSV exports for ARSAFA ERP System
+
+POS bills, POS items, invoices and lending records can be exported as CSV,
+either streamed from a view or written by the ``export_csv`` command. Rows
+are read with ``values_list(...).iterator(chunk_size=...)`` and written one at
+a time, so memory use does not grow with the size of the export. Date range
+and status filters are applied in SQL.
+"""
+
+import csv
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from lending.models import Lending
+from .models import POS, Invoice, POSItem
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    """Raised for an unknown export or invalid filter values."""
+
+
+class CSVExport:
+    """
+    One exportable table: its header, the columns read for it and the fields
+    the date range and status filters apply to.
+    """
+
+    def __init__(self, model, columns, date_field, status_field, status_choices, date_is_datetime=False):
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.date_is_datetime = date_is_datetime
+        self.status_field = status_field
+        self.statuses = [value for value, _ in status_choices]
+
+    @property
+    def header(self):
+        return [header for _, header in self.columns]
+
+    def queryset(self, start=None, end=None, status=None):
+        """Rows of the export as tuples, filtered and ordered in SQL."""
+        if status is not None and status not in self.statuses:
+            raise ExportError(f'Status must be one of {", ".join(self.statuses)}.')
+        if start is not None and end is not None and start > end:
+            raise ExportError('Start must not be after end.')
+
+        rows = self.model.objects.all()
+        if self.date_is_datetime:
+            # Whole local days as an index-friendly range on the timestamp
+            if start is not None:
+                rows = rows.filter(**{f'{self.date_field}__gte': _day_start(start)})
+            if end is not None:
+                rows = rows.filter(**{f'{self.date_field}__lt': _day_start(end + timedelta(days=1))})
+        else:
+            if start is not None:
+                rows = rows.filter(**{f'{self.date_field}__gte': start})
+            if end is not None:
+                rows = rows.filter(**{f'{self.date_field}__lte': end})
+        if status is not None:
+            rows = rows.filter(**{self.status_field: status})
+        return rows.order_by('pk').values_list(*[column for column, _ in self.columns])
+
+    def rows(self, start=None, end=None, status=None):
+        """
+        Header followed by every row as a list of strings.
+
+        The filters are checked right away, so an ``ExportError`` is raised
+        before anything has been streamed.
+        """
+        return self._rows(self.queryset(start, end, status))
+
+    def _rows(self, queryset):
+        yield self.header
+        for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [_format(value) for value in row]
+
+
+EXPORTS = {
+    'pos': CSVExport(
+        POS,
+        [
+            ('pos_number', 'POS Number'),
+            ('date', 'Date'),
+            ('customer_name', 'Customer'),
+            ('contact_number', 'Contact Number'),
+            ('subtotal', 'Subtotal'),
+            ('discount', 'Discount'),
+            ('total', 'Total'),
+            ('status', 'Status'),
+        ],
+        date_field='date',
+        status_field='status',
+        status_choices=POS.STATUS_CHOICES,
+        date_is_datetime=True,
+    ),
+    'pos-items': CSVExport(
+        POSItem,
+        [
+            ('pos__pos_number', 'POS Number'),
+            ('pos__date', 'Date'),
+            ('product_id', 'Product ID'),
+            ('product__name', 'Product'),
+            ('product__category', 'Category'),
+            ('quantity', 'Quantity'),
+            ('unit_price', 'Unit Price'),
+            ('total', 'Total'),
+            ('unit_cost', 'Unit Cost'),
+        ],
+        date_field='pos__date',
+        status_field='pos__status',
+        status_choices=POS.STATUS_CHOICES,
+        date_is_datetime=True,
+    ),
+    'invoices': CSVExport(
+        Invoice,
+        [
+            ('invoice_number', 'Invoice Number'),
+            ('date', 'Date'),
+            ('due_date', 'Due Date'),
+            ('customer__name', 'Customer'),
+            ('customer__phone', 'Phone'),
+            ('amount', 'Amount'),
+            ('status', 'Status'),
+        ],
+        date_field='date',
+        status_field='status',
+        status_choices=Invoice.STATUS_CHOICES,
+    ),
+    'lending': CSVExport(
+        Lending,
+        [
+            ('id', 'ID'),
+            ('customer__name', 'Customer'),
+            ('customer__phone', 'Phone'),
+            ('amount', 'Amount'),
+            ('interest_rate', 'Interest Rate'),
+            ('start_date', 'Start Date'),
+            ('due_date', 'Due Date'),
+            ('status', 'Status'),
+        ],
+        date_field='start_date',
+        status_field='status',
+        status_choices=Lending.STATUS_CHOICES,
+    ),
+}
+
+
+def get_export(name):
+    try:
+        return EXPORTS[name]
+    except KeyError:
+        raise ExportError(f'Unknown export "{name}". Choose from {", ".join(EXPORTS)}.')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat(sep=' ', timespec='seconds')
+    return str(value)
+
+
+class Echo:
+    """File-like object whose ``write`` hands the line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """Yield each row encoded as a CSV line, for ``StreamingHttpResponse``."""
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_csv(file, rows):
+    """
+    Write a header and rows, as returned by ``CSVExport.rows``, to an open
+    text file. Returns the number of data rows written.
+    """
+    writer = csv.writer(file)
+    writer.writerow(next(rows))
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
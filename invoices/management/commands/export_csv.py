@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from invoices.exports import EXPORTS, ExportError, get_export, write_csv
+
+
+class Command(BaseCommand):
+    help = 'Export POS bills, POS items, invoices or lending records to CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(EXPORTS), help='What to export')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Only rows with this status')
+        parser.add_argument('--output', help='Path of the CSV file to write (default: standard output)')
+
+    def handle(self, *args, **options):
+        try:
+            rows = get_export(options['name']).rows(options['start'], options['end'], options['status'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+                count = write_csv(file, rows)
+            self.stdout.write(self.style.SUCCESS(f'Exported {count} row(s) to {options["output"]}'))
+        else:
+            write_csv(self.stdout, rows)
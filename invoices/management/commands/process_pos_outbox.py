@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from invoices.services import MAX_EVENT_ATTEMPTS, failed_pos_events, process_pos_outbox, retry_failed_pos_events
+
+
+class Command(BaseCommand):
+    help = 'Apply the Customer, Lending, Sale and Invoice projections for pending POS events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of events to process per transaction (default: 100)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll the outbox for new events',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between polls when the outbox is empty (default: 1)',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help=f'Retry events that failed {MAX_EVENT_ATTEMPTS} times and are otherwise skipped',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['retry_failed']:
+            self.stdout.write(f'Retrying {retry_failed_pos_events()} failed POS event(s)')
+        total = 0
+        while True:
+            processed = process_pos_outbox(batch_size=batch_size)
+            total += processed
+            if processed:
+                self.stdout.write(f'Processed {processed} POS event(s)')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+        failed = list(failed_pos_events().values_list('pos_id', 'last_error'))
+        if failed:
+            for pos_id, last_error in failed:
+                self.stdout.write(f'✗ POS {pos_id}: {last_error}')
+            self.stdout.write(self.style.WARNING(
+                f'{total} POS event(s) processed; {len(failed)} failed {MAX_EVENT_ATTEMPTS} times and were skipped. '
+                f'Fix them and run with --retry-failed.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Outbox drained: {total} POS event(s) processed.'))
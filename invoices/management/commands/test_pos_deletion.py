@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from invoices.models import POS, POSItem, Invoice, InvoiceItem
+from invoices.services import process_pos_outbox
 from customers.models import Customer
 from inventory.models import Product
 from sales.models import Sale, SaleItem
@@ -148,8 +149,10 @@ class Command(BaseCommand):
         self.stdout.write(f'  Related sale: {related_sale.id if related_sale else "None"}')
         self.stdout.write(f'  Related lending: {related_lending.id if related_lending else "None"}')
 
-        # Delete the POS
+        # Delete the POS and apply the queued projections
         pos.delete()
+        while process_pos_outbox():
+            pass
 
         # Check updated values
         customer = Customer.objects.filter(
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from invoices.models import POS, POSItem, Invoice, InvoiceItem
+from invoices.services import process_pos_outbox
 from customers.models import Customer
 from inventory.models import Product
 from decimal import Decimal
@@ -125,6 +126,10 @@ class Command(BaseCommand):
     def verify_integration(self):
         """Verify that POS transactions created corresponding invoices"""
         
+        # Apply any projections still queued in the outbox
+        while process_pos_outbox():
+            pass
+        
         pos_list = POS.objects.all()
         invoice_list = Invoice.objects.all()
         
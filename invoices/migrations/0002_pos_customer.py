@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_alter_customer_phone'),
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pos',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pos_bills', to='customers.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='pos',
+            index=models.Index(fields=['customer', 'status', 'date'], name='pos_customer_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def backfill_pos_customer(apps, schema_editor):
+    """Link existing POS bills to their customer by name and phone, in chunks."""
+    Customer = apps.get_model('customers', 'Customer')
+    POS = apps.get_model('invoices', 'POS')
+
+    customer_ids = {
+        (name, phone): pk
+        for pk, name, phone in Customer.objects.values_list('id', 'name', 'phone')
+    }
+
+    last_id = 0
+    while True:
+        batch = list(
+            POS.objects.filter(id__gt=last_id, customer__isnull=True)
+            .order_by('id')
+            .only('id', 'customer_name', 'contact_number')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        matched = []
+        for pos in batch:
+            pos.customer_id = customer_ids.get((pos.customer_name, pos.contact_number))
+            if pos.customer_id:
+                matched.append(pos)
+        with transaction.atomic():
+            POS.objects.bulk_update(matched, ['customer'])
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own so large tables are not locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('customers', '0002_alter_customer_phone'),
+        ('invoices', '0002_pos_customer'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_pos_customer, migrations.RunPython.noop),
+    ]
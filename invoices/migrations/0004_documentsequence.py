@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+def _highest_number(numbers, prefix):
+    highest = 0
+    for number in numbers:
+        head, _, tail = number.partition('-')
+        if head == prefix and tail.isdigit():
+            highest = max(highest, int(tail))
+    return highest
+
+
+def seed_document_sequences(apps, schema_editor):
+    """Start each sequence after the highest number already issued."""
+    DocumentSequence = apps.get_model('invoices', 'DocumentSequence')
+    POS = apps.get_model('invoices', 'POS')
+    Invoice = apps.get_model('invoices', 'Invoice')
+
+    pos_numbers = POS.objects.values_list('pos_number', flat=True).iterator(chunk_size=2000)
+    invoice_numbers = Invoice.objects.filter(invoice_number__startswith='INV-') \
+        .values_list('invoice_number', flat=True).iterator(chunk_size=2000)
+    DocumentSequence.objects.bulk_create([
+        DocumentSequence(prefix='POS', last_value=_highest_number(pos_numbers, 'POS')),
+        DocumentSequence(prefix='INV', last_value=_highest_number(invoice_numbers, 'INV')),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0003_backfill_pos_customer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, unique=True)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_document_sequences, migrations.RunPython.noop),
+    ]
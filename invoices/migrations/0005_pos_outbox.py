@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def seed_ledger_entries(apps, schema_editor):
+    """Record what every linked POS already contributes to its customer's ledger."""
+    POS = apps.get_model('invoices', 'POS')
+    POSLedgerEntry = apps.get_model('invoices', 'POSLedgerEntry')
+
+    last_id = 0
+    while True:
+        batch = list(
+            POS.objects.filter(id__gt=last_id, customer__isnull=False)
+            .order_by('id')
+            .values_list('id', 'customer_id', 'total', 'status')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        POSLedgerEntry.objects.bulk_create([
+            POSLedgerEntry(
+                pos_id=pos_id,
+                customer_id=customer_id,
+                purchases=total,
+                outstanding=total if status == 'unpaid' else 0,
+            )
+            for pos_id, customer_id, total, status in batch
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_alter_customer_phone'),
+        ('invoices', '0004_documentsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='POSLedgerEntry',
+            fields=[
+                ('pos_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('purchases', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_ledger_entries', to='customers.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='POSEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pos_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('saved', 'Saved'), ('deleted', 'Deleted')], max_length=10)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='posevent_pending_idx')],
+            },
+        ),
+        migrations.RunPython(seed_ledger_entries, migrations.RunPython.noop),
+    ]
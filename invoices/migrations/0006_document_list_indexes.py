@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0005_pos_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-date', '-id'], name='invoice_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pos',
+            index=models.Index(fields=['status', '-date', '-id'], name='pos_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:23
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0006_document_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pos',
+            index=models.Index(fields=['-date', '-id'], name='pos_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pos',
+            index=models.Index(django.db.models.functions.comparison.Collate('customer_name', 'NOCASE'), name='pos_customer_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pos',
+            index=models.Index(django.db.models.functions.comparison.Collate('pos_number', 'NOCASE'), name='pos_number_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, transaction
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 1000
+
+
+def backfill_entry_day(apps, schema_editor):
+    """Record the day and discount each ledger entry is counted under, in chunks."""
+    POS = apps.get_model('invoices', 'POS')
+    POSLedgerEntry = apps.get_model('invoices', 'POSLedgerEntry')
+
+    last_id = 0
+    while True:
+        batch = list(
+            POS.objects.filter(id__gt=last_id).order_by('id')
+            .annotate(day=TruncDate('date'))
+            .values_list('id', 'day', 'discount')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        with transaction.atomic():
+            POSLedgerEntry.objects.bulk_update(
+                [POSLedgerEntry(pos_id=pos_id, day=day, discount=discount) for pos_id, day, discount in batch],
+                ['day', 'discount'],
+            )
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own so large tables are not locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('invoices', '0008_posledgerentry_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_entry_day, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0009_backfill_posledgerentry_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='positem',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='posledgerentry',
+            name='lines',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from django.db import migrations, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+
+BATCH_SIZE = 1000
+
+
+def backfill_unit_cost(apps, schema_editor):
+    """Snapshot the product's current buying price on existing POS items, in chunks."""
+    POSItem = apps.get_model('invoices', 'POSItem')
+    Product = apps.get_model('inventory', 'Product')
+    buying_price = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('buying_price')[:1])
+
+    last_id = 0
+    while True:
+        ids = list(
+            POSItem.objects.filter(id__gt=last_id, unit_cost__isnull=True, product__isnull=False)
+            .order_by('id').values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        with transaction.atomic():
+            POSItem.objects.filter(id__in=ids).update(unit_cost=buying_price)
+
+
+def backfill_entry_lines(apps, schema_editor):
+    """Record the per-product lines each ledger entry is counted under, in chunks."""
+    POSItem = apps.get_model('invoices', 'POSItem')
+    POSLedgerEntry = apps.get_model('invoices', 'POSLedgerEntry')
+
+    last_id = 0
+    while True:
+        pos_ids = list(
+            POSLedgerEntry.objects.filter(pos_id__gt=last_id).order_by('pos_id')
+            .values_list('pos_id', flat=True)[:BATCH_SIZE]
+        )
+        if not pos_ids:
+            break
+        last_id = pos_ids[-1]
+        lines = defaultdict(dict)
+        rows = (
+            POSItem.objects.filter(pos_id__in=pos_ids, product__isnull=False)
+            .order_by().values('pos_id', 'product_id')
+            .annotate(units=Sum('quantity'), revenue=Sum('total'), cost=Sum(F('unit_cost') * F('quantity')))
+        )
+        for row in rows:
+            lines[row['pos_id']][str(row['product_id'])] = [
+                row['units'], str(row['revenue']), str(row['cost'] or '0.00'),
+            ]
+        with transaction.atomic():
+            POSLedgerEntry.objects.bulk_update(
+                [POSLedgerEntry(pos_id=pos_id, lines=lines[pos_id]) for pos_id in pos_ids],
+                ['lines'],
+            )
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own so large tables are not locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('invoices', '0010_positem_unit_cost'),
+        ('inventory', '0002_catalog_revision'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unit_cost, migrations.RunPython.noop),
+        migrations.RunPython(backfill_entry_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_backfill_positem_unit_cost'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='posevent',
+            index=models.Index(fields=['processed_at'], name='posevent_processed_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0012_posevent_processed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posledgerentry',
+            name='hour',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_alter_customer_phone'),
+        ('invoices', '0014_backfill_posledgerentry_hour'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='posledgerentry',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pos_ledger_entries', to='customers.customer'),
+        ),
+    ]
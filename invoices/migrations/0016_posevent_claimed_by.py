@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0015_posledgerentry_customer_set_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posevent',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -19,7 +19,8 @@ Version: 1.0
 """
 
 # Import required Django modules and external models
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Collate
 from customers.models import Customer
 from inventory.models import Product
 from django.utils import timezone
@@ -57,6 +58,17 @@ class POS(models.Model):
     customer_name = models.CharField(max_length=100)
     contact_number = models.CharField(max_length=20)
     email = models.EmailField(blank=True, null=True)
+
+    # Customer record resolved from the name/phone above when the POS is
+    # finalized. Joins to the customer should use this indexed key rather than
+    # matching on the free-text fields.
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='pos_bills',
+    )
     
     # Transaction timestamp with automatic default to current time
     # Useful for reporting and analytics by date/time periods
@@ -106,7 +118,10 @@ class POS(models.Model):
         # Calculate total amount based on subtotal and discount before saving
         # This ensures data consistency and prevents calculation errors
         self.total = self.subtotal - self.discount
-        super().save(*args, **kwargs)
+        # The post_save handler writes an outbox event; keep it in the same
+        # transaction as the POS row so neither can exist without the other
+        with transaction.atomic():
+            super().save(*args, **kwargs)
      
     def clean(self):
         """
@@ -140,24 +155,27 @@ class POS(models.Model):
 
     def get_related_lending(self):
         """Get the related lending record for this POS"""
-        if self.status == 'unpaid':
-            customer = Customer.objects.filter(
-                name=self.customer_name,
-                phone=self.contact_number
+        if self.status == 'unpaid' and self.customer_id:
+            from lending.models import Lending
+            return Lending.objects.filter(
+                customer_id=self.customer_id,
+                status='active',
+                notes__contains=f'POS {self.pos_number} unpaid.'
             ).first()
-            if customer:
-                from lending.models import Lending
-                return Lending.objects.filter(
-                    customer=customer,
-                    status='active',
-                    notes__contains=f'POS {self.pos_number} unpaid.'
-                ).first()
         return None
 
     class Meta:
         ordering = ['-date']
         verbose_name = 'POS'
         verbose_name_plural = 'POS'
+        indexes = [
+            models.Index(fields=['customer', 'status', 'date'], name='pos_customer_status_date_idx'),
+            models.Index(fields=['status', '-date', '-id'], name='pos_status_date_idx'),
+            models.Index(fields=['-date', '-id'], name='pos_date_idx'),
+            # NOCASE lets SQLite answer case-insensitive prefix (LIKE 'x%') searches from the index
+            models.Index(Collate('customer_name', 'NOCASE'), name='pos_customer_name_prefix_idx'),
+            models.Index(Collate('pos_number', 'NOCASE'), name='pos_number_prefix_idx'),
+        ]
 
 class POSItem(models.Model):
     pos = models.ForeignKey(POS, related_name='items', on_delete=models.CASCADE)
@@ -165,12 +183,16 @@ class POSItem(models.Model):
     quantity = models.PositiveIntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=10, decimal_places=2)
+    # Buying price at the time of sale, for cost and margin reporting
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     def __str__(self):
         return f"{self.product.name} - {self.pos.pos_number}"
 
     def save(self, *args, **kwargs):
         self.total = self.quantity * self.unit_price
+        if self.unit_cost is None and self.product_id:
+            self.unit_cost = self.product.buying_price
         super().save(*args, **kwargs)
 
 class Invoice(models.Model):
@@ -204,6 +226,9 @@ class Invoice(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='invoice_date_idx'),
+        ]
 
 class InvoiceItem(models.Model):
     invoice = models.ForeignKey(Invoice, related_name='items', on_delete=models.CASCADE)
@@ -217,4 +242,92 @@ class InvoiceItem(models.Model):
 
     def save(self, *args, **kwargs):
         self.amount = self.quantity * self.unit_price
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs) 
+
+class DocumentSequence(models.Model):
+    """
+    Counter backing gap-free document numbers (POS-001, INV-001, ...)
+
+    One row per prefix holds the last number handed out. Numbers are
+    allocated by incrementing the row inside the transaction that creates the
+    document, so concurrent requests never receive the same number and a
+    rolled back document gives its number back.
+    """
+    prefix = models.CharField(max_length=10, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix}-{self.last_value}"
+
+
+class POSEvent(models.Model):
+    """
+    Outbox row recording that a POS bill changed
+
+    Written in the same transaction as the POS itself. The
+    ``process_pos_outbox`` command later applies the Customer, Lending, Sale
+    and Invoice projections, so checkout only pays for the POS write.
+    """
+    KIND_CHOICES = [
+        ('saved', 'Saved'),
+        ('deleted', 'Deleted'),
+    ]
+
+    # Plain id rather than a foreign key: the event must outlive a deleted POS
+    pos_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Token of the outbox run that claimed the event, so concurrent runs never
+    # project the same event twice
+    claimed_by = models.CharField(max_length=32, null=True, blank=True)
+
+    def __str__(self):
+        return f"POS {self.pos_id} {self.kind}"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='posevent_pending_idx',
+            ),
+            # Change feed for readers that follow projected bills (sales cube)
+            models.Index(fields=['processed_at'], name='posevent_processed_idx'),
+        ]
+
+
+class POSLedgerEntry(models.Model):
+    """
+    What a POS bill currently contributes to its customer's ledger and to
+    the sales rollups
+
+    Only the POS projection writes these rows. Each projection shifts the
+    customer's balances and the rollups by the difference between the bill's
+    current values and this entry, which makes re-running a projection a
+    no-op.
+    """
+    # Plain id rather than a foreign key: the entry is needed after the POS
+    # is deleted to take the bill back off the ledger
+    pos_id = models.BigIntegerField(primary_key=True)
+    # SET_NULL: the entry holds the bill's rollup state and must outlive a
+    # deleted customer, or the next projection would count the bill twice
+    customer = models.ForeignKey(
+        Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='pos_ledger_entries',
+    )
+    purchases = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # The day and discount the bill was last counted under in DailySalesRollup
+    day = models.DateField(null=True, blank=True)
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # The local hour of ``day`` the bill was last counted under in HourlySalesRollup
+    hour = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Per product: [units, revenue, cost] counted in ProductDailySales
+    lines = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"POS {self.pos_id}: {self.purchases}"
@@ -0,0 +1,98 @@
+"""
+PDF rendering for invoices and POS receipts
+
+Documents are rendered with xhtml2pdf from print-only templates and the bytes
+are cached on disk under ``settings.PDF_CACHE_DIR``. The file name carries
+the document id, its ``updated_at`` timestamp and a digest of the customer
+and product rows it prints (product revisions, the invoice customer's name
+and phone), so saving the document or renaming what it shows produces a new
+key and a stale PDF is never served. Older versions of a document are
+removed when the new one is written.
+"""
+
+from io import BytesIO
+from pathlib import Path
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from xhtml2pdf import pisa
+
+from .models import Invoice
+
+TEMPLATES = {
+    'invoice': 'invoices/pdf/invoice.html',
+    'pos': 'invoices/pdf/pos_receipt.html',
+}
+
+
+class PDFRenderError(Exception):
+    """Raised when xhtml2pdf cannot render a document."""
+
+
+def pdf_filename(kind, document):
+    number = document.invoice_number if kind == 'invoice' else document.pos_number
+    return f'{number}.pdf'
+
+
+def _items(document):
+    return list(document.items.select_related('product'))
+
+
+def _cache_path(kind, document, items):
+    stamp = document.updated_at.strftime('%Y%m%d%H%M%S%f')
+    # Customers and products are not versioned with the document
+    # A deleted product leaves the line with no product
+    related = [(item.product_id, item.product.revision if item.product else None) for item in items]
+    if kind == 'invoice':
+        related.append((document.customer.name, document.customer.phone))
+    digest = hashlib.sha1(repr(related).encode()).hexdigest()[:12]
+    return Path(settings.PDF_CACHE_DIR) / kind / f'{document.pk}-{stamp}-{digest}.pdf'
+
+
+def render_pdf(kind, document, items=None):
+    """Render a document to PDF bytes without touching the cache."""
+    if items is None:
+        items = _items(document)
+    html = render_to_string(TEMPLATES[kind], {kind: document, 'items': items})
+    output = BytesIO()
+    result = pisa.CreatePDF(html, dest=output, encoding='utf-8')
+    if result.err:
+        raise PDFRenderError(f'Could not render {pdf_filename(kind, document)}')
+    return output.getvalue()
+
+
+def cached_pdf(kind, document):
+    """
+    Return the PDF bytes for an Invoice ('invoice') or POS ('pos').
+
+    Renders on the first request for a given version of the document and
+    what it prints, and serves the cached file afterwards. Writes go through a temporary file and an atomic
+    rename, so concurrent requests or export workers never see a partial PDF.
+    """
+    items = _items(document)
+    path = _cache_path(kind, document, items)
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    content = render_pdf(kind, document, items)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, path)
+
+    for stale in path.parent.glob(f'{document.pk}-*.pdf'):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return content
+
+
+def invoice_pdf(invoice_id):
+    """Cached PDF for an invoice id; used by the batch export workers."""
+    invoice = Invoice.objects.select_related('customer').get(pk=invoice_id)
+    return pdf_filename('invoice', invoice), cached_pdf('invoice', invoice)
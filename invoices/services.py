@@ -0,0 +1,663 @@
+"""
+POS finalization service for ARSAFA ERP System
+
+A saved POS bill is projected onto the Customer, Lending, Sale and Invoice
+modules. Saving or deleting a POS only writes a ``POSEvent`` to the outbox;
+``process_pos_outbox`` applies the projections later in batches.
+``finalize_pos`` performs the projection for one bill inside a single
+transaction using a fixed number of queries, no matter how many items are in
+the cart.
+
+Customer balances (``total_purchases`` and ``outstanding_balance``) form an
+incremental ledger: each projection shifts them by a delta rather than summing
+every bill the customer ever had. ``POSLedgerEntry`` records what each bill
+currently contributes. ``rebuild_customer_ledgers`` recomputes everything from
+scratch if it ever drifts. The daily sales rollups and per-product sales
+facts are maintained the same way from the same entry.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from decimal import Decimal
+import logging
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from customers.models import Customer
+from inventory.models import Product
+from inventory.services import reserve_stock_bulk
+from lending.models import Lending
+from sales.models import Sale, SaleItem
+from sales.services import apply_hourly_delta, apply_product_sales_deltas, apply_rollup_delta, pos_day, pos_hour
+from .models import POS, POSItem, POSEvent, POSLedgerEntry, DocumentSequence, Invoice, InvoiceItem
+
+logger = logging.getLogger(__name__)
+
+# Grace period granted to unpaid POS bills before the lending record is due
+LENDING_GRACE_DAYS = 30
+
+# Events that keep failing are left in the outbox for inspection after this
+MAX_EVENT_ATTEMPTS = 5
+
+# Minimum number of digits in a document number (POS-001)
+DOCUMENT_NUMBER_WIDTH = 3
+
+
+def allocate_document_numbers(prefix, count=1):
+    """
+    Allocate ``count`` consecutive document numbers for ``prefix``.
+
+    The sequence row is incremented by ``count`` in a single UPDATE, which
+    takes the row lock, so concurrent callers always get disjoint blocks.
+    Call this inside the transaction that saves the documents: if it rolls
+    back, so does the allocation and no numbers are skipped.
+
+    Args:
+        prefix: Document prefix such as 'POS' or 'INV'
+        count: Size of the block to allocate, e.g. for bulk imports
+
+    Returns:
+        A list of formatted numbers, e.g. ['POS-041', 'POS-042']
+    """
+    with transaction.atomic():
+        sequences = DocumentSequence.objects.filter(prefix=prefix)
+        if not sequences.update(last_value=F('last_value') + count):
+            try:
+                with transaction.atomic():
+                    DocumentSequence.objects.create(prefix=prefix, last_value=count)
+            except IntegrityError:
+                # Another request created the sequence first
+                sequences.update(last_value=F('last_value') + count)
+        last_value = sequences.values_list('last_value', flat=True).get()
+    return [
+        f'{prefix}-{str(number).zfill(DOCUMENT_NUMBER_WIDTH)}'
+        for number in range(last_value - count + 1, last_value + 1)
+    ]
+
+
+def next_document_number(prefix):
+    """Allocate a single document number for ``prefix``."""
+    return allocate_document_numbers(prefix)[0]
+
+
+def checkout_cart(pos, lines, discount=0, status='unpaid'):
+    """
+    Create a POS bill and all of its items from a complete cart.
+
+    Products for every line are fetched and stock-checked with one query,
+    then the POS is saved, the whole cart's stock is reserved with one UPDATE
+    and the items are bulk-created, all in a single transaction. Lines for
+    the same product are merged. Prices always come from the catalog.
+
+    Args:
+        pos: Unsaved POS with the customer fields set
+        lines: Iterable of dicts with a 'quantity' and either a 'product_id'
+            or a 'barcode'
+        discount: Discount on the subtotal
+        status: 'paid' or 'unpaid'
+
+    Returns:
+        A ``(pos, items)`` tuple
+
+    Raises:
+        ValidationError: When the cart is empty or invalid, or when any line
+            exceeds the available stock
+    """
+    errors = []
+    wanted = []
+    for index, line in enumerate(lines, start=1):
+        try:
+            quantity = int(line.get('quantity', 0))
+        except (AttributeError, TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            errors.append(f'Line {index}: quantity must be a positive whole number.')
+            continue
+        if line.get('product_id'):
+            wanted.append((index, 'id', str(line['product_id']), quantity))
+        elif line.get('barcode'):
+            wanted.append((index, 'barcode', str(line['barcode']), quantity))
+        else:
+            errors.append(f'Line {index}: a product_id or barcode is required.')
+    if not wanted and not errors:
+        errors.append('Cannot check out an empty cart. Please add at least one item.')
+
+    product_ids = [key for _, kind, key, _ in wanted if kind == 'id' and key.isdigit()]
+    barcodes = [key for _, kind, key, _ in wanted if kind == 'barcode']
+    products = {}
+    for product in Product.objects.filter(Q(pk__in=product_ids) | Q(barcode__in=barcodes)):
+        products[('id', str(product.pk))] = product
+        if product.barcode:
+            products[('barcode', product.barcode)] = product
+
+    # Merge lines for the same product, keeping the order they were scanned in
+    cart = {}
+    for index, kind, key, quantity in wanted:
+        product = products.get((kind, key))
+        if product is None:
+            errors.append(f'Line {index}: product {key} not found.')
+            continue
+        product_total = cart.get(product.pk, (product, 0))[1] + quantity
+        cart[product.pk] = (product, product_total)
+    for product, quantity in cart.values():
+        if quantity > product.quantity:
+            if product.quantity > 0:
+                errors.append(f'Insufficient stock for {product.name}. Only {product.quantity} units available.')
+            else:
+                errors.append(f'Stock unavailable for {product.name}.')
+
+    subtotal = sum((product.unit_price * quantity for product, quantity in cart.values()), Decimal('0'))
+    try:
+        discount = Decimal(str(discount or 0))
+    except ArithmeticError:
+        discount = None
+    if discount is None or discount < 0:
+        errors.append('Invalid discount amount.')
+    elif discount > subtotal:
+        errors.append('Discount cannot exceed subtotal.')
+    if status not in dict(POS.STATUS_CHOICES):
+        errors.append(f'Invalid status {status!r}.')
+    elif status == 'paid' and subtotal - (discount or 0) <= 0:
+        errors.append('Cannot mark as paid for a transaction with zero or negative total amount.')
+    if errors:
+        raise ValidationError(errors)
+
+    pos.subtotal = subtotal
+    pos.discount = discount
+    pos.status = status
+    items = [
+        POSItem(
+            product=product,
+            quantity=quantity,
+            unit_price=product.unit_price,
+            total=product.unit_price * quantity,
+            unit_cost=product.buying_price,
+        )
+        for product, quantity in cart.values()
+    ]
+    with transaction.atomic():
+        pos.pos_number = next_document_number('POS')
+        pos.save()
+        reserve_stock_bulk(
+            {product.pk: quantity for product, quantity in cart.values()}, reference=pos.pos_number,
+        )
+        for item in items:
+            item.pos = pos
+        POSItem.objects.bulk_create(items)
+    return pos, items
+
+
+def record_pos_event(pos, kind):
+    """
+    Write an outbox event for a POS change.
+
+    Called from the POS signal handlers, inside the transaction that saves or
+    deletes the POS.
+
+    Args:
+        pos: The POS instance that changed
+        kind: 'saved' or 'deleted'
+    """
+    payload = {}
+    if kind == 'deleted':
+        # The POS row is gone by the time the event is processed
+        payload = {'pos_number': pos.pos_number, 'customer_id': pos.customer_id}
+    POSEvent.objects.create(pos_id=pos.pk, kind=kind, payload=payload)
+
+
+def pending_pos_events():
+    """Events still to be projected, leaving out those that failed ``MAX_EVENT_ATTEMPTS`` times."""
+    return POSEvent.objects.filter(processed_at__isnull=True, attempts__lt=MAX_EVENT_ATTEMPTS)
+
+
+def failed_pos_events():
+    """Events that failed ``MAX_EVENT_ATTEMPTS`` times and are no longer retried."""
+    return POSEvent.objects.filter(processed_at__isnull=True, attempts__gte=MAX_EVENT_ATTEMPTS)
+
+
+def retry_failed_pos_events():
+    """Reset the attempts of failed events so the next run retries them; returns how many."""
+    return failed_pos_events().update(attempts=0)
+
+
+def process_pos_outbox(batch_size=100):
+    """
+    Apply the projections for the oldest pending POS events.
+
+    The batch is claimed with a conditional UPDATE before anything is read,
+    so a concurrent run waits on the claimed rows and then skips them. It is
+    processed in one transaction and the events are marked done in that same
+    transaction, so a crash or retry never applies an event twice. Several
+    saves of the same POS in a batch share one projection.
+    A POS whose projection fails is rolled back to its savepoint and retried
+    by later batches until it has failed ``MAX_EVENT_ATTEMPTS`` times; after
+    that it is skipped until ``retry_failed_pos_events`` resets it.
+
+    Args:
+        batch_size: Maximum number of events to take from the outbox
+
+    Returns:
+        The number of events taken from the outbox
+    """
+    claim = uuid.uuid4().hex
+    with transaction.atomic():
+        unclaimed = Q(processed_at__isnull=True, claimed_by__isnull=True)
+        pending = pending_pos_events().filter(claimed_by__isnull=True).order_by('id').values('id')[:batch_size]
+        # The claim is the first write, and its WHERE is checked again once a
+        # concurrent run's locks are released
+        if not POSEvent.objects.filter(unclaimed, pk__in=Subquery(pending)).update(claimed_by=claim):
+            return 0
+        events = list(POSEvent.objects.filter(claimed_by=claim).order_by('id'))
+
+        deleted = {event.pos_id: event for event in events if event.kind == 'deleted'}
+        saved_ids = {event.pos_id for event in events if event.kind == 'saved'} - set(deleted)
+        pos_bills = POS.objects.filter(pk__in=saved_ids).prefetch_related('items')
+
+        failed = {}
+        for pos in pos_bills:
+            try:
+                finalize_pos(pos, items=list(pos.items.all()))
+            except Exception as e:
+                logger.error(f"Error projecting POS {pos.pos_number}: {e}")
+                failed[pos.pk] = str(e)
+        for event in deleted.values():
+            try:
+                with transaction.atomic():
+                    _project_deleted_pos(event)
+            except Exception as e:
+                logger.error(f"Error projecting deletion of POS {event.pos_id}: {e}")
+                failed[event.pos_id] = str(e)
+
+        done = [event.pk for event in events if event.pos_id not in failed]
+        POSEvent.objects.filter(pk__in=done).update(processed_at=timezone.now(), claimed_by=None)
+        for event in events:
+            if event.pos_id in failed:
+                POSEvent.objects.filter(pk=event.pk).update(
+                    attempts=F('attempts') + 1,
+                    last_error=failed[event.pos_id],
+                    claimed_by=None,
+                )
+    return len(events)
+
+
+def finalize_pos(pos, items=None):
+    """
+    Project a POS bill onto the Customer, Lending, Sale and Invoice modules.
+
+    Everything runs in one ``transaction.atomic`` block and the POS items are
+    fetched exactly once, so the number of queries stays constant regardless
+    of cart size. The customer's balances are adjusted by the difference
+    between the bill's ledger entry and its current values, so running the
+    projection again changes nothing.
+
+    Args:
+        pos: The saved POS instance
+        items: The POS items, if already fetched
+
+    Returns:
+        The Customer the POS was attributed to
+    """
+    with transaction.atomic():
+        if items is None:
+            items = list(pos.items.all())
+        customer = _sync_customer(pos, items)
+        _sync_lending(pos, customer)
+        if pos.status == 'paid':
+            _sync_sale(pos, customer, items)
+        _sync_invoice(pos, customer, items)
+    return customer
+
+
+def _project_deleted_pos(event):
+    """
+    Undo the projections of a deleted POS bill.
+
+    Takes the bill off its customer's ledger and deletes the related invoice,
+    the customer's lending records, and the customer if they have no other
+    activity. Sales are removed with the POS itself by cascade.
+    """
+    # The ledger entry knows the customer even if the deleted instance was stale
+    customer_id = event.payload.get('customer_id')
+    entry = POSLedgerEntry.objects.filter(pos_id=event.pos_id).first()
+    if entry:
+        if entry.customer_id is not None:
+            customer_id = entry.customer_id
+            _apply_ledger_delta(entry.customer_id, -entry.purchases, -entry.outstanding)
+        _remove_from_rollup(entry)
+        _remove_from_hourly_rollup(entry)
+        _remove_product_sales(entry)
+        entry.delete()
+
+    pos_number = event.payload.get('pos_number')
+    if pos_number:
+        InvoiceItem.objects.filter(invoice__invoice_number=pos_number).delete()
+        Invoice.objects.filter(invoice_number=pos_number).delete()
+        logger.info(f"Deleted invoice {pos_number} and its items")
+
+    customer = Customer.objects.filter(pk=customer_id).first()
+    if customer:
+        Lending.objects.filter(customer=customer).delete()
+        logger.info(f"Deleted lending records for customer {customer.name}")
+
+        # Delete Customer if no remaining POS, sales, or manual invoices; the
+        # invoices protect the customer, like in customer_delete
+        has_pos = POS.objects.filter(customer=customer).exists()
+        has_sales = Sale.objects.filter(customer=customer).exists()
+        has_invoices = Invoice.objects.filter(customer=customer).exists()
+        if not (has_pos or has_sales or has_invoices):
+            logger.info(f"Deleting customer {customer.name} as they have no remaining activity.")
+            customer.delete()
+
+
+def _apply_ledger_delta(customer_id, purchases, outstanding, **fields):
+    """Shift a customer's balances by the given amounts with ``F()`` updates."""
+    Customer.objects.filter(pk=customer_id).update(
+        total_purchases=F('total_purchases') + purchases,
+        outstanding_balance=F('outstanding_balance') + outstanding,
+        **fields
+    )
+
+
+def _sync_customer(pos, items):
+    """
+    Resolve and link the customer, then apply this POS's deltas to the
+    customer ledger, the sales rollups and the product sales facts.
+    """
+    customer = Customer.objects.filter(
+        name=pos.customer_name,
+        phone=pos.contact_number,
+    ).first()
+    if customer is None:
+        customer = Customer.objects.create(
+            name=pos.customer_name,
+            phone=pos.contact_number,
+            email=pos.email or '',
+        )
+    if pos.customer_id != customer.pk:
+        pos.customer = customer
+        POS.objects.filter(pk=pos.pk).update(customer=customer)
+
+    purchases = pos.total
+    outstanding = pos.total if pos.status == 'unpaid' else Decimal('0')
+    day, hour = pos_day(pos), pos_hour(pos)
+    lines = _product_lines(items)
+    entry = POSLedgerEntry.objects.filter(pos_id=pos.pk).first()
+    _sync_daily_rollup(pos, day, entry)
+    _sync_hourly_rollup(pos, day, hour, entry)
+    _sync_product_sales(day, lines, entry)
+    if entry is None:
+        POSLedgerEntry.objects.create(
+            pos_id=pos.pk, customer=customer, purchases=purchases, outstanding=outstanding,
+            day=day, hour=hour, discount=pos.discount, lines=lines,
+        )
+        purchases_delta, outstanding_delta = purchases, outstanding
+    else:
+        if entry.customer_id != customer.pk:
+            # The bill moved to another customer, or its customer was
+            # deleted: take it off the old ledger, if any
+            if entry.customer_id is not None:
+                _apply_ledger_delta(entry.customer_id, -entry.purchases, -entry.outstanding)
+            purchases_delta, outstanding_delta = purchases, outstanding
+        else:
+            purchases_delta = purchases - entry.purchases
+            outstanding_delta = outstanding - entry.outstanding
+        if (entry.customer_id != customer.pk or purchases_delta or outstanding_delta
+                or entry.day != day or entry.hour != hour or entry.discount != pos.discount
+                or entry.lines != lines):
+            POSLedgerEntry.objects.filter(pos_id=pos.pk).update(
+                customer=customer, purchases=purchases, outstanding=outstanding,
+                day=day, hour=hour, discount=pos.discount, lines=lines,
+            )
+
+    customer.last_purchase = pos.date.date()
+    if pos.email:
+        customer.email = pos.email
+    _apply_ledger_delta(
+        customer.pk, purchases_delta, outstanding_delta,
+        email=customer.email,
+        last_purchase=customer.last_purchase,
+    )
+    customer.refresh_from_db(fields=['total_purchases', 'outstanding_balance'])
+    logger.info(f"Customer {customer.name} updated for POS {pos.pos_number}")
+    return customer
+
+
+def _sync_daily_rollup(pos, day, entry):
+    """Move this POS's contribution in the daily sales rollup to its current values."""
+    paid = pos.total if pos.status == 'paid' else Decimal('0')
+    unpaid = pos.total if pos.status == 'unpaid' else Decimal('0')
+    if entry is None or entry.day is None:
+        apply_rollup_delta(day, 1, paid, unpaid, pos.discount)
+    elif entry.day == day:
+        apply_rollup_delta(
+            day, 0,
+            paid - (entry.purchases - entry.outstanding),
+            unpaid - entry.outstanding,
+            pos.discount - entry.discount,
+        )
+    else:
+        # The bill's date moved to another day
+        _remove_from_rollup(entry)
+        apply_rollup_delta(day, 1, paid, unpaid, pos.discount)
+
+
+def _remove_from_rollup(entry):
+    if entry.day is not None:
+        apply_rollup_delta(
+            entry.day, -1, -(entry.purchases - entry.outstanding), -entry.outstanding, -entry.discount
+        )
+
+
+def _sync_hourly_rollup(pos, day, hour, entry):
+    """Move this POS's contribution in the hourly sales rollup to its current values."""
+    if entry is None or entry.hour is None:
+        apply_hourly_delta(day, hour, 1, pos.total)
+    elif entry.day == day and entry.hour == hour:
+        apply_hourly_delta(day, hour, 0, pos.total - entry.purchases)
+    else:
+        _remove_from_hourly_rollup(entry)
+        apply_hourly_delta(day, hour, 1, pos.total)
+
+
+def _remove_from_hourly_rollup(entry):
+    if entry.day is not None and entry.hour is not None:
+        apply_hourly_delta(entry.day, entry.hour, -1, -entry.purchases)
+
+
+def _product_lines(items):
+    """
+    Units, revenue and cost per product for a POS, in the JSON form stored
+    on its ledger entry: ``{"<product id>": [units, "revenue", "cost"]}``.
+    """
+    totals = {}
+    for item in items:
+        if item.product_id is None:
+            continue
+        units, revenue, cost = totals.get(item.product_id, (0, Decimal('0'), Decimal('0')))
+        totals[item.product_id] = (
+            units + item.quantity,
+            revenue + item.total,
+            cost + (item.unit_cost or 0) * item.quantity,
+        )
+    return {
+        str(product_id): [units, str(revenue), str(cost)]
+        for product_id, (units, revenue, cost) in totals.items()
+    }
+
+
+def _line_deltas(lines, sign):
+    return {
+        int(product_id): (sign * units, sign * Decimal(revenue), sign * Decimal(cost))
+        for product_id, (units, revenue, cost) in lines.items()
+    }
+
+
+def _sync_product_sales(day, lines, entry):
+    """Move this POS's per-product contribution to its current items and day."""
+    if entry is None or entry.day is None:
+        apply_product_sales_deltas(day, _line_deltas(lines, 1))
+    elif entry.day == day:
+        deltas = _line_deltas(lines, 1)
+        for product_id, (units, revenue, cost) in _line_deltas(entry.lines, -1).items():
+            new_units, new_revenue, new_cost = deltas.get(product_id, (0, 0, 0))
+            deltas[product_id] = (new_units + units, new_revenue + revenue, new_cost + cost)
+        apply_product_sales_deltas(day, deltas)
+    else:
+        _remove_product_sales(entry)
+        apply_product_sales_deltas(day, _line_deltas(lines, 1))
+
+
+def _remove_product_sales(entry):
+    if entry.day is not None:
+        apply_product_sales_deltas(entry.day, _line_deltas(entry.lines, -1))
+
+
+def _sync_lending(pos, customer):
+    """Keep a single active lending record in step with unpaid bills."""
+    if pos.status == 'unpaid':
+        updated = Lending.objects.filter(customer=customer, status='active').update(
+            amount=customer.outstanding_balance
+        )
+        if not updated:
+            start_date = pos.date.date()
+            Lending.objects.create(
+                customer=customer,
+                status='active',
+                amount=customer.outstanding_balance,
+                interest_rate=Decimal('0.00'),
+                start_date=start_date,
+                due_date=start_date + timedelta(days=LENDING_GRACE_DAYS),
+                notes=f'POS {pos.pos_number} unpaid. Due in {LENDING_GRACE_DAYS} days.',
+            )
+        logger.info(f"Lending record {'updated' if updated else 'created'} for POS {pos.pos_number}")
+    elif POS.objects.filter(customer=customer, status='unpaid').exists():
+        # Still has unpaid bills, keep the lending amount in step
+        Lending.objects.filter(customer=customer).update(amount=customer.outstanding_balance)
+        logger.info(f"Updated lending record for {customer.name} - amount: {customer.outstanding_balance}")
+    else:
+        # No unpaid bills left, remove lending records
+        Lending.objects.filter(customer=customer).delete()
+        logger.info(f"Removed lending record for {customer.name} - all bills paid")
+
+
+def _sync_sale(pos, customer, items):
+    """Create or refresh the sale for a paid POS and reconcile its items."""
+    sale = Sale.objects.filter(pos=pos).only('id').first()
+    if sale:
+        Sale.objects.filter(pk=sale.pk).update(total_amount=pos.total, customer=customer)
+        existing = list(sale.items.all())
+    else:
+        sale = Sale.objects.create(
+            date=pos.date,
+            customer=customer,
+            pos=pos,
+            total_amount=pos.total,
+        )
+        existing = []
+
+    changes = reconcile_items(
+        SaleItem,
+        existing,
+        [
+            SaleItem(sale=sale, product_id=item.product_id, quantity=item.quantity, unit_price=item.unit_price)
+            for item in items
+        ],
+        ['quantity', 'unit_price'],
+    )
+    logger.info(f"Sale items synced for POS {pos.pos_number}: {changes}")
+    return changes
+
+
+def _sync_invoice(pos, customer, items):
+    """Mirror the POS onto its invoice and reconcile the invoice items."""
+    invoice = Invoice.objects.filter(invoice_number=pos.pos_number).first()
+    if invoice:
+        invoice.customer = customer
+        invoice.amount = pos.total
+        invoice.status = pos.status
+        invoice.date = pos.date.date()
+        invoice.save(update_fields=['customer', 'amount', 'status', 'date', 'updated_at'])
+        existing = list(invoice.items.all())
+    else:
+        invoice = Invoice.objects.create(
+            invoice_number=pos.pos_number,
+            customer=customer,
+            date=pos.date.date(),
+            amount=pos.total,
+            status=pos.status,
+        )
+        existing = []
+
+    changes = reconcile_items(
+        InvoiceItem,
+        existing,
+        [
+            InvoiceItem(
+                invoice=invoice,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                amount=item.total,
+            )
+            for item in items
+        ],
+        ['quantity', 'unit_price', 'amount'],
+    )
+    logger.info(f"Invoice items synced for invoice {invoice.invoice_number}: {changes}")
+    return changes
+
+
+class ItemChanges(namedtuple('ItemChanges', ['created', 'updated', 'deleted'])):
+    """Number of mirror rows inserted, updated and deleted by a reconciliation."""
+
+    def __str__(self):
+        return f"{self.created} created, {self.updated} updated, {self.deleted} deleted"
+
+
+def reconcile_items(model, existing, desired, fields):
+    """
+    Bring a set of mirror item rows in line with the POS items.
+
+    Rows are matched by product; when a product appears on several lines the
+    lines are paired in order. Matched rows whose ``fields`` differ are
+    updated, unmatched existing rows are deleted and unmatched desired rows
+    are inserted, each with a single bulk query. Rows that already match are
+    not written at all, so re-saving an unchanged bill costs no item writes.
+
+    Args:
+        model: The item model (InvoiceItem or SaleItem)
+        existing: The current rows, as fetched from the database
+        desired: Unsaved instances describing what the rows should be
+        fields: The fields compared and copied on update
+
+    Returns:
+        ItemChanges with the number of rows created, updated and deleted
+    """
+    unmatched = defaultdict(list)
+    for row in existing:
+        unmatched[row.product_id].append(row)
+
+    to_create, to_update = [], []
+    for wanted in desired:
+        candidates = unmatched.get(wanted.product_id)
+        if not candidates:
+            to_create.append(wanted)
+            continue
+        row = candidates.pop(0)
+        if any(getattr(row, field) != getattr(wanted, field) for field in fields):
+            for field in fields:
+                setattr(row, field, getattr(wanted, field))
+            to_update.append(row)
+    to_delete = [row.pk for rows in unmatched.values() for row in rows]
+
+    if to_delete:
+        model.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        model.objects.bulk_update(to_update, fields)
+    if to_create:
+        model.objects.bulk_create(to_create)
+    return ItemChanges(len(to_create), len(to_update), len(to_delete))
@@ -0,0 +1,782 @@
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .management.commands.export_invoice_pdfs import _bounded_map
+from .models import POS, POSItem, POSEvent, POSLedgerEntry, Invoice, InvoiceItem, DocumentSequence
+from .pdf import PDFRenderError, render_pdf
+from .views import INVOICE_LIST_PAGE_SIZE, POS_LIST_PAGE_SIZE
+from .services import (
+    MAX_EVENT_ATTEMPTS, ItemChanges, _sync_invoice, _sync_sale, finalize_pos, process_pos_outbox,
+    allocate_document_numbers, next_document_number,
+)
+from customers.models import Customer
+from inventory.models import Product
+from lending.models import Lending
+from sales.models import DailySalesRollup, HourlySalesRollup, Sale
+
+
+def make_pos(number='POS-001', subtotal=None, lines=(), days_ago=0, process=True, **fields):
+    """
+    Create a POS bill with its lines and, unless ``process`` is false, project it.
+
+    ``lines`` are ``(product, quantity, unit price)`` tuples; the subtotal
+    defaults to their sum, or 100.00 for a bill without lines. Other keyword
+    arguments are POS fields.
+    """
+    if subtotal is None:
+        subtotal = sum(Decimal(price) * quantity for _, quantity, price in lines) if lines else '100.00'
+    fields.setdefault('customer_name', "Test Customer")
+    fields.setdefault('contact_number', "01712345678")
+    fields.setdefault('date', timezone.now() - timedelta(days=days_ago))
+    pos = POS.objects.create(pos_number=number, subtotal=Decimal(subtotal), **fields)
+    for product, quantity, price in lines:
+        POSItem.objects.create(pos=pos, product=product, quantity=quantity, unit_price=Decimal(price))
+    if process:
+        process_pos_outbox()
+    return pos
+
+
+class FinalizePOSTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Test Product",
+            category="snacks",
+            quantity=10000,
+            unit_price=Decimal('10.00'),
+            buying_price=Decimal('8.00')
+        )
+
+    def count_finalize_queries(self, pos):
+        with CaptureQueriesContext(connection) as ctx:
+            finalize_pos(pos)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_independent_of_cart_size(self):
+        """A 200-item cart costs the same number of queries as a 1-item cart"""
+        # Both POS are projected, so their sale and invoice exist
+        small = make_pos('POS-001', lines=[(self.product, 1, '10.00')], status='paid')
+        large = make_pos('POS-002', lines=[(self.product, 1, '10.00')] * 200, status='paid')
+
+        small_queries = self.count_finalize_queries(small)
+        large_queries = self.count_finalize_queries(large)
+
+        # SQLite caps a statement at 999 parameters, so bulk_create may split
+        # the 200 invoice items into two INSERTs; nothing else may grow.
+        self.assertLessEqual(large_queries - small_queries, 1)
+        self.assertLessEqual(large_queries, 16)
+
+    def test_first_finalization_is_bounded(self):
+        """Creating the sale and invoice bulk-inserts their items"""
+        pos = make_pos('POS-001', lines=[(self.product, 1, '10.00')] * 200, status='paid', process=False)
+
+        # Includes creating the customer, ledger entry, the day's and the
+        # hour's rollup rows and the day's product sales rows
+        self.assertLessEqual(self.count_finalize_queries(pos), 32)
+        self.assertEqual(Sale.objects.get(pos=pos).items.count(), 200)
+        self.assertEqual(Invoice.objects.get(invoice_number='POS-001').items.count(), 200)
+
+    def test_unpaid_pos_updates_customer_and_lending(self):
+        pos = make_pos('POS-001', lines=[(self.product, 1, '10.00')] * 3)
+
+        customer = Customer.objects.get(phone="01712345678")
+        self.assertEqual(POS.objects.get(pk=pos.pk).customer, customer)
+        self.assertEqual(customer.total_purchases, Decimal('30.00'))
+        self.assertEqual(customer.outstanding_balance, Decimal('30.00'))
+        self.assertEqual(Lending.objects.get(customer=customer).amount, Decimal('30.00'))
+        self.assertFalse(Sale.objects.filter(pos=pos).exists())
+
+        pos.status = 'paid'
+        pos.save()
+        process_pos_outbox()
+
+        customer.refresh_from_db()
+        self.assertEqual(customer.outstanding_balance, Decimal('0.00'))
+        self.assertFalse(Lending.objects.filter(customer=customer).exists())
+        self.assertEqual(Sale.objects.get(pos=pos).total_amount, Decimal('30.00'))
+        self.assertEqual(Invoice.objects.get(invoice_number='POS-001').status, 'paid')
+
+
+class ItemReconciliationTestCase(TestCase):
+    def setUp(self):
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                category="snacks",
+                quantity=1000,
+                unit_price=Decimal('10.00'),
+            )
+            for i in range(3)
+        ]
+        self.pos = POS.objects.create(
+            pos_number='POS-001',
+            customer_name="Test Customer",
+            contact_number="01712345678",
+        )
+        self.items = [
+            POSItem.objects.create(pos=self.pos, product=product, quantity=1, unit_price=Decimal('10.00'))
+            for product in self.products
+        ]
+        self.pos.subtotal = Decimal('30.00')
+        self.pos.status = 'paid'
+        self.pos.save()
+        process_pos_outbox()
+
+    def mirror(self):
+        invoice_items = InvoiceItem.objects.filter(invoice__invoice_number='POS-001').order_by('product_id')
+        sale_items = Sale.objects.get(pos=self.pos).items.order_by('product_id')
+        return (
+            [(i.product_id, i.quantity, i.amount) for i in invoice_items],
+            [(i.product_id, i.quantity) for i in sale_items],
+        )
+
+    def test_discount_only_rewrites_no_items(self):
+        ids_before = set(InvoiceItem.objects.values_list('id', flat=True))
+        pos = POS.objects.get(pk=self.pos.pk)
+        pos.discount = Decimal('5.00')
+
+        invoice_changes = _sync_invoice(pos, pos.customer, list(pos.items.all()))
+        sale_changes = _sync_sale(pos, pos.customer, list(pos.items.all()))
+
+        self.assertEqual(invoice_changes, ItemChanges(0, 0, 0))
+        self.assertEqual(sale_changes, ItemChanges(0, 0, 0))
+        self.assertEqual(set(InvoiceItem.objects.values_list('id', flat=True)), ids_before)
+
+    def test_applies_inserts_updates_and_deletes(self):
+        pos = POS.objects.get(pk=self.pos.pk)
+        POSItem.objects.filter(pk=self.items[0].pk).update(quantity=3, total=Decimal('30.00'))
+        self.items[1].delete()
+        extra = POSItem.objects.create(pos=pos, product=self.products[1], quantity=2, unit_price=Decimal('10.00'))
+        POSItem.objects.create(pos=pos, product=self.products[1], quantity=1, unit_price=Decimal('10.00'))
+
+        items = list(pos.items.all())
+        self.assertEqual(_sync_invoice(pos, pos.customer, items), ItemChanges(1, 2, 0))
+        self.assertEqual(_sync_sale(pos, pos.customer, items), ItemChanges(1, 2, 0))
+
+        p0, p1, p2 = (product.pk for product in self.products)
+        invoice_rows, sale_rows = self.mirror()
+        self.assertEqual(sorted(invoice_rows), sorted([
+            (p0, 3, Decimal('30.00')), (p1, 2, Decimal('20.00')), (p1, 1, Decimal('10.00')), (p2, 1, Decimal('10.00')),
+        ]))
+        self.assertEqual(sorted(sale_rows), [(p0, 3), (p1, 1), (p1, 2), (p2, 1)])
+
+        extra.delete()
+        items = list(pos.items.all())
+        self.assertEqual(_sync_invoice(pos, pos.customer, items).deleted, 1)
+
+
+class CustomerLedgerTestCase(TestCase):
+    def setUp(self):
+        self.pos = POS.objects.create(
+            pos_number='POS-001',
+            customer_name="Test Customer",
+            contact_number="01712345678",
+            subtotal=Decimal('100.00'),
+        )
+        process_pos_outbox()
+        self.customer = Customer.objects.get(phone="01712345678")
+
+    def assertLedger(self, purchases, outstanding):
+        process_pos_outbox()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_purchases, Decimal(purchases))
+        self.assertEqual(self.customer.outstanding_balance, Decimal(outstanding))
+
+    def test_create_status_flip_and_total_change(self):
+        self.assertLedger('100.00', '100.00')
+
+        POS.objects.create(
+            pos_number='POS-002',
+            customer_name="Test Customer",
+            contact_number="01712345678",
+            subtotal=Decimal('50.00'),
+            status='paid',
+        )
+        self.assertLedger('150.00', '100.00')
+
+        pos = POS.objects.get(pk=self.pos.pk)
+        pos.discount = Decimal('20.00')
+        pos.save()
+        self.assertLedger('130.00', '80.00')
+
+        pos.status = 'paid'
+        pos.save()
+        self.assertLedger('130.00', '0.00')
+
+        # Saving again without changes must not double count
+        pos.save()
+        self.assertLedger('130.00', '0.00')
+
+    def test_delete_releases_ledger(self):
+        POS.objects.create(
+            pos_number='POS-002',
+            customer_name="Test Customer",
+            contact_number="01712345678",
+            subtotal=Decimal('50.00'),
+        )
+        POS.objects.get(pk=self.pos.pk).delete()
+        self.assertLedger('50.00', '50.00')
+
+    def test_deleting_customer_keeps_bill_counted_once(self):
+        # customer_delete refuses while invoices exist, so remove them first
+        Invoice.objects.filter(customer=self.customer).delete()
+        self.customer.delete()
+        self.assertIsNone(POSLedgerEntry.objects.get(pos_id=self.pos.pk).customer_id)
+
+        pos = POS.objects.get(pk=self.pos.pk)
+        pos.save()
+        process_pos_outbox()
+
+        rollup = DailySalesRollup.objects.get()
+        self.assertEqual(rollup.order_count, 1)
+        self.assertEqual(rollup.unpaid_total, Decimal('100.00'))
+        self.assertEqual(HourlySalesRollup.objects.get().order_count, 1)
+        customer = Customer.objects.get(phone="01712345678")
+        self.assertEqual(customer.total_purchases, Decimal('100.00'))
+        self.assertEqual(customer.outstanding_balance, Decimal('100.00'))
+
+    def test_rebuild_customer_ledgers_fixes_drift(self):
+        Customer.objects.filter(pk=self.customer.pk).update(total_purchases=0, outstanding_balance=7)
+
+        out = StringIO()
+        call_command('rebuild_customer_ledgers', '--dry-run', stdout=out)
+        self.assertIn('drifted', out.getvalue())
+        self.assertLedger('0.00', '7.00')
+
+        call_command('rebuild_customer_ledgers', stdout=StringIO())
+        self.assertLedger('100.00', '100.00')
+
+    def test_rebuild_customer_ledgers_keeps_entries_of_deleted_customers(self):
+        POS.objects.create(
+            pos_number='POS-002', customer_name="Other Customer", contact_number="01800000000",
+            subtotal=Decimal('50.00'), status='paid',
+        )
+        process_pos_outbox()
+        Invoice.objects.filter(customer=self.customer).delete()
+        self.customer.delete()
+        other = Customer.objects.get(phone="01800000000")
+        Customer.objects.filter(pk=other.pk).update(total_purchases=0)
+
+        call_command('rebuild_customer_ledgers', stdout=StringIO())
+        self.assertIsNone(POSLedgerEntry.objects.get(pos_id=self.pos.pk).customer_id)
+
+        POS.objects.get(pk=self.pos.pk).save()
+        process_pos_outbox()
+        rollup = DailySalesRollup.objects.get()
+        self.assertEqual(rollup.order_count, 2)
+        self.assertEqual(rollup.paid_total + rollup.unpaid_total, Decimal('150.00'))
+        self.assertEqual(HourlySalesRollup.objects.get().order_count, 2)
+
+
+class POSOutboxTestCase(TestCase):
+    def test_save_only_writes_outbox_event(self):
+        pos = make_pos(process=False)
+        self.assertEqual(POSEvent.objects.filter(pos_id=pos.pk, kind='saved').count(), 1)
+        self.assertFalse(Customer.objects.exists())
+        self.assertFalse(Invoice.objects.exists())
+
+        self.assertEqual(process_pos_outbox(), 1)
+        self.assertTrue(Invoice.objects.filter(invoice_number='POS-001').exists())
+        self.assertEqual(process_pos_outbox(), 0)
+
+    def test_reprocessing_events_is_idempotent(self):
+        pos = make_pos(process=False)
+        pos.save()
+        pos.save()
+        process_pos_outbox()
+
+        # Simulate a retry after a crash that lost the processed marks
+        POSEvent.objects.update(processed_at=None)
+        process_pos_outbox()
+
+        customer = Customer.objects.get(phone="01712345678")
+        self.assertEqual(customer.total_purchases, Decimal('100.00'))
+        self.assertEqual(customer.outstanding_balance, Decimal('100.00'))
+        self.assertEqual(Lending.objects.get(customer=customer).amount, Decimal('100.00'))
+
+    def test_batches_respect_batch_size(self):
+        for i in range(5):
+            make_pos(f'POS-00{i + 1}', process=False)
+        self.assertEqual(process_pos_outbox(batch_size=2), 2)
+        self.assertEqual(POSEvent.objects.filter(processed_at__isnull=True).count(), 3)
+
+        out = StringIO()
+        call_command('process_pos_outbox', '--batch-size', '2', stdout=out)
+        self.assertIn('3 POS event(s) processed', out.getvalue())
+        self.assertEqual(Invoice.objects.count(), 5)
+
+    def test_delete_keeps_customer_with_manual_invoice(self):
+        pos = make_pos()
+        customer = Customer.objects.get(phone="01712345678")
+        Invoice.objects.create(
+            invoice_number='INV-001', customer=customer, amount=Decimal('40.00'), due_date=date.today(),
+        )
+        pos.delete()
+        process_pos_outbox()
+
+        event = POSEvent.objects.get(kind='deleted')
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.attempts, 0)
+        customer.refresh_from_db()
+        self.assertEqual(customer.total_purchases, Decimal('0.00'))
+        self.assertEqual(DailySalesRollup.objects.get().order_count, 0)
+        self.assertEqual(list(Invoice.objects.values_list('invoice_number', flat=True)), ['INV-001'])
+
+    def test_failed_events_are_reported_and_can_be_retried(self):
+        make_pos(process=False)
+        POSEvent.objects.update(attempts=MAX_EVENT_ATTEMPTS, last_error='boom')
+
+        out = StringIO()
+        call_command('process_pos_outbox', stdout=out)
+        self.assertIn('✗ POS', out.getvalue())
+        self.assertIn('1 failed', out.getvalue())
+        self.assertNotIn('Outbox drained', out.getvalue())
+        # A dead event does not block the rebuild commands
+        out = StringIO()
+        call_command('rebuild_customer_ledgers', stdout=out)
+        self.assertNotIn('pending', out.getvalue())
+
+        out = StringIO()
+        call_command('process_pos_outbox', '--retry-failed', stdout=out)
+        self.assertIn('Outbox drained: 1 POS event(s) processed', out.getvalue())
+        self.assertTrue(Invoice.objects.filter(invoice_number='POS-001').exists())
+
+    def test_events_claimed_by_another_run_are_skipped(self):
+        make_pos(process=False)
+        POSEvent.objects.update(claimed_by='other-run')
+        self.assertEqual(process_pos_outbox(), 0)
+        self.assertFalse(Invoice.objects.exists())
+
+        POSEvent.objects.update(claimed_by=None)
+        self.assertEqual(process_pos_outbox(), 1)
+        self.assertIsNone(POSEvent.objects.get().claimed_by)
+
+    def test_delete_event_cleans_up_projections(self):
+        pos = make_pos()
+        pos.delete()
+        process_pos_outbox()
+
+        self.assertFalse(Invoice.objects.exists())
+        self.assertFalse(Lending.objects.exists())
+        self.assertFalse(Customer.objects.exists())
+        self.assertFalse(POSLedgerEntry.objects.exists())
+
+
+class CheckoutAPITestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='cashier', password='secret')
+        self.client.force_login(user)
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                category="snacks",
+                quantity=100,
+                unit_price=Decimal('5.00'),
+                barcode=f"BC{i:04d}"
+            )
+            for i in range(30)
+        ]
+
+    def checkout(self, items, **extra):
+        body = {
+            'customer_name': "Test Customer",
+            'contact_number': "01712345678",
+            'email': "test@gmail.com",
+            'items': items,
+            **extra,
+        }
+        return self.client.post(reverse('pos_checkout_api'), json.dumps(body), content_type='application/json')
+
+    def test_checkout_creates_pos_and_items(self):
+        response = self.checkout([
+            {'barcode': 'BC0000', 'quantity': 2},
+            {'product_id': self.products[1].pk, 'quantity': 3},
+            {'barcode': 'BC0000', 'quantity': 1},
+        ], discount='5.00', status='paid')
+
+        self.assertEqual(response.status_code, 201)
+        receipt = response.json()
+        self.assertEqual(receipt['subtotal'], '30.00')
+        self.assertEqual(receipt['total'], '25.00')
+        self.assertEqual([item['quantity'] for item in receipt['items']], [3, 3])
+
+        pos = POS.objects.get(pos_number=receipt['pos_number'])
+        self.assertEqual(pos.items.count(), 2)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 97)
+
+    def test_checkout_rejects_insufficient_stock(self):
+        response = self.checkout([
+            {'barcode': 'BC0000', 'quantity': 101},
+            {'barcode': 'MISSING', 'quantity': 1},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']['items']
+        self.assertIn('Insufficient stock for Product 0. Only 100 units available.', errors)
+        self.assertIn('Line 2: product MISSING not found.', errors)
+        self.assertFalse(POS.objects.exists())
+
+    def test_checkout_query_count_is_independent_of_cart_size(self):
+        def count_queries(products):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.checkout([{'barcode': p.barcode, 'quantity': 1} for p in products])
+            self.assertEqual(response.status_code, 201)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(self.products[:1]), count_queries(self.products))
+
+
+class InvoiceListTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='clerk', password='secret')
+        self.client.force_login(user)
+        self.customer = Customer.objects.create(name="Acme Traders", phone="01700000000")
+
+    def make_invoice(self, number, day, status='unpaid', amount='10.00'):
+        return Invoice.objects.create(
+            invoice_number=number,
+            customer=self.customer,
+            date=date(2025, 1, day),
+            amount=Decimal(amount),
+            status=status,
+        )
+
+    def test_merges_documents_and_counts_kpis(self):
+        self.make_invoice('INV-001', 1, status='paid')
+        self.make_invoice('INV-002', 2, status='overdue', amount='5.00')
+        POS.objects.create(
+            pos_number='POS-001',
+            customer_name="Walk-in",
+            contact_number="01712345678",
+            subtotal=Decimal('20.00'),
+            status='paid',
+            date=timezone.make_aware(datetime(2025, 1, 3, 12)),
+        )
+        process_pos_outbox()
+
+        with self.assertNumQueries(4):  # session, user, KPI aggregate, page
+            response = self.client.get(reverse('invoice_list'))
+        rows = response.context['invoices']
+        # The POS mirror invoice is shown once, as the POS row
+        self.assertEqual([(row['number'], row['kind']) for row in rows],
+                         [('POS-001', 'pos'), ('INV-002', 'invoice'), ('INV-001', 'invoice')])
+        self.assertEqual(response.context['total_invoices'], 3)
+        self.assertEqual(response.context['paid_invoices'], 2)
+        self.assertEqual(response.context['overdue_invoices'], 1)
+        self.assertEqual(response.context['total_amount'], Decimal('35.00'))
+        self.assertEqual(response.context['amount_received'], Decimal('30.00'))
+
+        response = self.client.get(reverse('invoice_list'), {'search': 'acme'})
+        self.assertEqual(response.context['total_invoices'], 2)
+
+    def test_keyset_pagination_walks_every_row_once(self):
+        for i in range(INVOICE_LIST_PAGE_SIZE + 10):
+            self.make_invoice(f'INV-{i:03d}', 1 + i % 5)
+
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get(reverse('invoice_list'), params)
+            seen.extend(row['number'] for row in response.context['invoices'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+            params = {'after': cursor}
+        self.assertEqual(len(seen), INVOICE_LIST_PAGE_SIZE + 10)
+        self.assertEqual(len(set(seen)), len(seen))
+
+
+class POSListTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='cashier', password='secret')
+        self.client.force_login(user)
+
+    def test_kpis_come_from_one_query(self):
+        make_pos('POS-001', '10.00', customer_name="Rahim", status='paid', process=False)
+        make_pos('POS-002', '10.00', customer_name="Karim", status='paid', days_ago=2, process=False)
+        make_pos('POS-003', '10.00', customer_name="Rahima", process=False)
+
+        with self.assertNumQueries(4):  # session, user, KPI aggregate, page
+            response = self.client.get(reverse('pos_list'), {'search': 'rah'})
+        self.assertEqual(response.context['total_pos'], 2)
+        self.assertEqual(response.context['paid_pos'], 1)
+        self.assertEqual(response.context['unpaid_pos'], 1)
+        # Today's revenue ignores the search and older sales
+        self.assertEqual(response.context['total_revenue'], Decimal('10.00'))
+
+        response = self.client.get(reverse('pos_list'), {'search': '002'})
+        self.assertEqual([pos.pos_number for pos in response.context['pos_list']], ['POS-002'])
+
+    def test_keyset_pagination_walks_every_row_once(self):
+        # Several rows share a timestamp, so the id tie-breaker matters
+        moment = timezone.now()
+        for i in range(POS_LIST_PAGE_SIZE + 10):
+            make_pos(f'POS-{i:03d}', '10.00', date=moment - timedelta(minutes=i // 4), process=False)
+
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get(reverse('pos_list'), params)
+            seen.extend(pos.pos_number for pos in response.context['pos_list'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+            params = {'after': cursor}
+        self.assertEqual(len(seen), POS_LIST_PAGE_SIZE + 10)
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_prefix_search_uses_index(self):
+        queryset = POS.objects.filter(customer_name__istartswith='rah')
+        self.assertIn('pos_customer_name_prefix_idx', queryset.explain())
+
+
+class DocumentPDFTestCase(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        settings_override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user(username='clerk', password='secret')
+        self.client.force_login(user)
+        self.customer = Customer.objects.create(name="Acme Traders", phone="01700000000")
+        self.product = Product.objects.create(
+            name="Test Product", category="snacks", quantity=100, unit_price=Decimal('10.00')
+        )
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-001', customer=self.customer, date=date(2025, 1, 15), amount=Decimal('20.00')
+        )
+        self.invoice.items.create(product=self.product, quantity=2, unit_price=Decimal('10.00'), amount=Decimal('20.00'))
+
+    def test_pdf_is_rendered_once_per_version(self):
+        with mock.patch('invoices.pdf.render_pdf', wraps=render_pdf) as render:
+            first = self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+            second = self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+            self.assertEqual(render.call_count, 1)
+
+            self.invoice.status = 'paid'
+            self.invoice.save()
+            self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+            self.assertEqual(render.call_count, 2)
+
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+        self.assertTrue(first.content.startswith(b'%PDF'))
+        self.assertEqual(first.content, second.content)
+        # Only the current version stays on disk
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, 'invoice'))), 1)
+
+    def test_renaming_customer_or_product_rerenders(self):
+        with mock.patch('invoices.pdf.render_pdf', wraps=render_pdf) as render:
+            self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+            self.customer.name = "Acme Traders Ltd"
+            self.customer.save()
+            self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+            self.assertEqual(render.call_count, 2)
+
+            self.product.name = "Renamed Product"
+            self.product.save()
+            self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+            self.assertEqual(render.call_count, 3)
+
+    def test_pdf_of_a_deleted_product(self):
+        self.product.delete()
+        response = self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_render_failure_redirects_with_message(self):
+        with mock.patch('invoices.pdf.render_pdf', side_effect=PDFRenderError('Could not render INV-001.pdf')):
+            response = self.client.get(reverse('invoice_pdf', args=[self.invoice.pk]), follow=True)
+        self.assertRedirects(response, reverse('invoice_detail', args=[self.invoice.pk]))
+        messages = [str(message) for message in response.context['messages']]
+        self.assertIn('Error creating PDF: Could not render INV-001.pdf', messages)
+
+    def test_pos_receipt_pdf(self):
+        pos = POS.objects.create(pos_number='POS-001', customer_name="Walk-in", contact_number="01712345678")
+        response = self.client.get(reverse('pos_pdf', args=[pos.pk]))
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_export_command_writes_zip(self):
+        output = os.path.join(self.cache_dir, 'export.zip')
+        call_command(
+            'export_invoice_pdfs', '--start', '2025-01-01', '--end', '2025-01-31',
+            '--output', output, '--workers', '1', stdout=StringIO(),
+        )
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), ['INV-001.pdf'])
+
+    def test_bounded_map_keeps_order_and_window(self):
+        with ThreadPoolExecutor(max_workers=2) as pool, mock.patch.object(pool, 'submit', wraps=pool.submit) as submit:
+            results = _bounded_map(pool, lambda n: n * n, range(10), 3)
+            self.assertEqual(next(results), 0)
+            # Only the window is submitted before the first result is used
+            self.assertEqual(submit.call_count, 3)
+            self.assertEqual(list(results), [n * n for n in range(1, 10)])
+
+
+class CSVExportTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='cashier', password='secret')
+        self.client.force_login(user)
+        self.product = Product.objects.create(
+            name="Rice", category="grocery", quantity=100,
+            unit_price=Decimal('60.00'), buying_price=Decimal('50.00'),
+        )
+        for number, days_ago, status in [('POS-001', 0, 'paid'), ('POS-002', 0, 'unpaid'), ('POS-003', 5, 'paid')]:
+            pos = POS.objects.create(
+                pos_number=number, customer_name="Test Customer", contact_number="01712345678",
+                subtotal=Decimal('120.00'), status=status, date=timezone.now() - timedelta(days=days_ago),
+            )
+            POSItem.objects.create(pos=pos, product=self.product, quantity=2, unit_price=Decimal('60.00'))
+
+    def export(self, name, **params):
+        response = self.client.get(reverse('export_csv', args=[name]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return [line.split(',') for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_filters_are_applied(self):
+        today = timezone.localdate().isoformat()
+        rows = self.export('pos', start=today, end=today, status='paid')
+        self.assertEqual(rows[0][0], 'POS Number')
+        self.assertEqual([row[0] for row in rows[1:]], ['POS-001'])
+
+        rows = self.export('pos-items', start=today)
+        self.assertEqual(
+            [row[:1] + row[3:] for row in rows[1:]],
+            [['POS-001', 'Rice', 'grocery', '2', '60.00', '120.00', '50.00'],
+             ['POS-002', 'Rice', 'grocery', '2', '60.00', '120.00', '50.00']],
+        )
+
+    def test_export_reads_rows_in_chunks(self):
+        with mock.patch('invoices.exports.EXPORT_CHUNK_SIZE', 1), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.export('pos-items')), 4)
+        # One query for all rows, with the product joined in
+        self.assertEqual(sum('invoices_positem' in query['sql'] for query in queries), 1)
+
+    def test_invalid_filters_are_rejected(self):
+        url = reverse('export_csv', args=['pos'])
+        self.assertEqual(self.client.get(url, {'status': 'lost'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'today'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_csv', args=['payroll'])).status_code, 404)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lending.csv')
+            Lending.objects.create(
+                customer=Customer.objects.create(name="Test Customer", phone="01712345678"),
+                amount=Decimal('500.00'), interest_rate=Decimal('0.00'),
+                start_date=date(2024, 1, 10), due_date=date(2024, 2, 10),
+            )
+            out = StringIO()
+            call_command('export_csv', 'lending', '--status', 'active', '--output', path, stdout=out)
+            self.assertIn('Exported', out.getvalue())
+            with open(path, encoding='utf-8') as file:
+                lines = file.read().splitlines()
+        self.assertEqual(len(lines), 1 + Lending.objects.filter(status='active').count())
+        self.assertIn('500.00', lines[-1])
+
+
+class DocumentNumberTestCase(TestCase):
+    def test_numbers_are_sequential_past_999(self):
+        DocumentSequence.objects.filter(prefix='POS').update(last_value=998)
+        self.assertEqual(next_document_number('POS'), 'POS-999')
+        self.assertEqual(next_document_number('POS'), 'POS-1000')
+        self.assertEqual(next_document_number('POS'), 'POS-1001')
+
+    def test_block_allocation_and_new_prefix(self):
+        self.assertEqual(allocate_document_numbers('RET', 3), ['RET-001', 'RET-002', 'RET-003'])
+        self.assertEqual(next_document_number('RET'), 'RET-004')
+
+    def test_rolled_back_allocation_is_not_lost(self):
+        first = next_document_number('INV')
+        try:
+            with transaction.atomic():
+                next_document_number('INV')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(int(next_document_number('INV')[4:]), int(first[4:]) + 1)
+
+
+class ConcurrentOutboxTestCase(TransactionTestCase):
+    THREADS = 4
+
+    def test_concurrent_runs_project_each_event_once(self):
+        for i in range(40):
+            POS.objects.create(
+                pos_number=f'POS-{i:03d}',
+                customer_name="Test Customer",
+                contact_number="01712345678",
+                subtotal=Decimal('10.00'),
+            )
+        start = threading.Barrier(self.THREADS)
+
+        def worker():
+            start.wait()
+            try:
+                while process_pos_outbox(batch_size=5):
+                    pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(POSEvent.objects.filter(processed_at__isnull=True).exists())
+        customer = Customer.objects.get(phone="01712345678")
+        self.assertEqual(customer.total_purchases, Decimal('400.00'))
+        self.assertEqual(DailySalesRollup.objects.get().order_count, 40)
+
+
+class ConcurrentDocumentNumberTestCase(TransactionTestCase):
+    THREADS = 8
+    NUMBERS_PER_THREAD = 25
+
+    def test_concurrent_allocation_has_no_duplicates(self):
+        allocated = []
+        start = threading.Barrier(self.THREADS)
+
+        def worker():
+            start.wait()
+            try:
+                for i in range(self.NUMBERS_PER_THREAD):
+                    # Mix single numbers and small blocks
+                    allocated.extend(allocate_document_numbers('POS', 1 + i % 3))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = self.THREADS * sum(1 + i % 3 for i in range(self.NUMBERS_PER_THREAD))
+        self.assertEqual(len(allocated), expected)
+        self.assertEqual(len(set(allocated)), expected)
+        self.assertEqual(
+            sorted(int(number[4:]) for number in allocated),
+            list(range(1, expected + 1)),
+        )
@@ -8,6 +8,8 @@ urlpatterns = [
     path('pos/<int:pos_id>/edit/', views.pos_edit, name='pos_edit'),
     path('pos/<int:pos_id>/', views.pos_detail, name='pos_detail'),
     path('pos/<int:pos_id>/delete/', views.pos_delete, name='pos_delete'),
+    path('pos/<int:pos_id>/pdf/', views.pos_pdf, name='pos_pdf'),
+    path('api/pos/checkout/', views.pos_checkout_api, name='pos_checkout_api'),
     
     # Invoice URLs
     path('', views.invoice_list, name='invoice_list'),
@@ -15,7 +17,10 @@ urlpatterns = [
     path('<int:invoice_id>/edit/', views.invoice_edit, name='invoice_edit'),
     path('<int:invoice_id>/', views.invoice_detail, name='invoice_detail'),
     path('<int:invoice_id>/delete/', views.invoice_delete, name='invoice_delete'),
+    path('<int:invoice_id>/pdf/', views.invoice_pdf, name='invoice_pdf'),
+    path('export/<slug:name>.csv', views.export_csv, name='export_csv'),
     path('test-delete/', views.test_invoice_delete, name='test_invoice_delete'),
     path('api/products/<int:product_id>/price/', views.get_product_price, name='get_product_price'),
+    path('api/products/search/', views.product_search, name='product_search'),
     path('api/products/barcode/<str:barcode>/', views.get_product_by_barcode, name='get_product_by_barcode'),
 ] 
\ No newline at end of file
@@ -2,88 +2,128 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Count, Q, F, Value
+from django.db.models.functions import TruncDate
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from .models import Invoice, InvoiceItem, POS, POSItem
 from .forms import InvoiceForm, InvoiceItemForm, POSForm, POSItemForm
-from datetime import timedelta
+from .services import checkout_cart, next_document_number
+from .pdf import PDFRenderError, cached_pdf, pdf_filename
+from .exports import ExportError, get_export, stream_csv
+from datetime import date, datetime, timedelta
+import json
 from django.urls import reverse
 from inventory.models import Product
+from inventory.cache import lookup_product, lookup_product_by_barcode
+from inventory.search import rank_order, search_product_ids
+from inventory.services import InsufficientStock
 from customers.models import Customer
-from django.views.decorators.http import require_GET
+from django.views.decorators.http import require_GET, require_POST
 from decimal import Decimal
 from decimal import InvalidOperation
 from django.core.exceptions import ValidationError
 
+INVOICE_LIST_PAGE_SIZE = 50
+
+
+def _document_register(search_query=''):
+    """
+    Manual invoices and paid POS sales as one ``UNION ALL`` queryset.
+
+    Both halves select the same aliased columns so the database can merge,
+    sort and aggregate them. Invoices that mirror a paid POS are left out in
+    favour of the POS row. The customer name comes from a join, not a
+    per-row lookup.
+    """
+    paid_pos = POS.objects.filter(status='paid')
+    invoices = (
+        Invoice.objects.order_by()
+        .exclude(invoice_number__in=paid_pos.values('pos_number'))
+        .values(
+            doc_id=F('id'),
+            doc_status=F('status'),
+            doc_date=F('date'),
+            doc_amount=F('amount'),
+            number=F('invoice_number'),
+            customer_label=F('customer__name'),
+            kind=Value('invoice'),
+        )
+    )
+    pos_sales = paid_pos.order_by().values(
+        doc_id=F('id'),
+        doc_status=F('status'),
+        doc_date=TruncDate('date'),
+        doc_amount=F('total'),
+        number=F('pos_number'),
+        customer_label=F('customer_name'),
+        kind=Value('pos'),
+    )
+    if search_query:
+        invoices = invoices.filter(
+            Q(customer__name__icontains=search_query) | Q(invoice_number__icontains=search_query)
+        )
+        pos_sales = pos_sales.filter(
+            Q(customer_name__icontains=search_query) | Q(pos_number__icontains=search_query)
+        )
+    return invoices, pos_sales
+
+
+def _parse_register_cursor(cursor):
+    """Decode an ``after`` cursor of the form ``<date>.<kind>.<id>``."""
+    try:
+        day, kind, doc_id = cursor.split('.')
+        return date.fromisoformat(day), kind, int(doc_id)
+    except ValueError:
+        return None
+
+
+def _register_cursor(row):
+    return f"{row['doc_date'].isoformat()}.{row['kind']}.{row['doc_id']}"
+
+
 @login_required
 def invoice_list(request):
     search_query = request.GET.get('search', '')
-    invoices = Invoice.objects.all()
-    paid_pos_sales = POS.objects.filter(status='paid')
-
-    # Build a set of POS invoice numbers to filter out duplicates
-    pos_invoice_numbers = set(pos.pos_number for pos in paid_pos_sales)
-
-    combined_list = []
-
-    # Only add manual invoices that are NOT POS-generated
-    for inv in invoices:
-        if inv.invoice_number not in pos_invoice_numbers:
-            combined_list.append({
-                'id': inv.id,
-                'number': inv.invoice_number,
-                'customer_name': inv.customer.name,
-                'amount': inv.amount,
-                'status': inv.status,
-                'date': inv.date,
-                'due_date': inv.due_date,
-                'type': 'invoice'
-            })
-
-    # Add POS-generated invoices
-    for pos in paid_pos_sales:
-        combined_list.append({
-            'id': pos.id,
-            'number': pos.pos_number,
-            'customer_name': pos.customer_name,
-            'amount': pos.total,
-            'status': 'paid',  # POS sales in this list are always paid
-            'date': pos.date.date(),
-            'due_date': pos.date.date(),
-            'type': 'pos'
-        })
-    
-    # Apply search filter if search query exists
-    if search_query:
-        filtered_list = []
-        for item in combined_list:
-            if (search_query.lower() in item['customer_name'].lower() or 
-                search_query.lower() in item['number'].lower()):
-                filtered_list.append(item)
-        combined_list = filtered_list
-    
-    # Sort the combined list by date, most recent first
-    combined_list.sort(key=lambda x: x['date'], reverse=True)
-
-    # Calculate statistics from the combined list
-    total_invoices = len(combined_list)
-    paid_invoices = sum(1 for item in combined_list if item['status'] == 'paid')
-    unpaid_invoices = sum(1 for item in combined_list if item['status'] == 'unpaid')
-    overdue_invoices = sum(1 for item in combined_list if item['status'] == 'overdue')
-    
-    total_amount = sum(item['amount'] for item in combined_list)
-    amount_received = sum(item['amount'] for item in combined_list if item['status'] == 'paid')
-    
+    invoices, pos_sales = _document_register(search_query)
+
+    # KPI counters over the whole (filtered) register in one query
+    stats = invoices.union(pos_sales, all=True).aggregate(
+        total_invoices=Count('doc_id'),
+        paid_invoices=Count('doc_id', filter=Q(doc_status='paid')),
+        unpaid_invoices=Count('doc_id', filter=Q(doc_status='unpaid')),
+        overdue_invoices=Count('doc_id', filter=Q(doc_status='overdue')),
+        total_amount=Sum('doc_amount'),
+        amount_received=Sum('doc_amount', filter=Q(doc_status='paid')),
+    )
+
+    # Keyset pagination on (date, kind, id), newest first. The predicate is
+    # applied to each half because a combined queryset cannot be filtered.
+    cursor = _parse_register_cursor(request.GET.get('after', ''))
+    if cursor:
+        day, kind, doc_id = cursor
+        older = (
+            Q(doc_date__lt=day)
+            | Q(doc_date=day, kind__lt=kind)
+            | Q(doc_date=day, kind=kind, doc_id__lt=doc_id)
+        )
+        invoices = invoices.filter(older)
+        pos_sales = pos_sales.filter(older)
+    rows = list(
+        invoices.union(pos_sales, all=True)
+        .order_by('-doc_date', '-kind', '-doc_id')[:INVOICE_LIST_PAGE_SIZE + 1]
+    )
+    has_next = len(rows) > INVOICE_LIST_PAGE_SIZE
+    rows = rows[:INVOICE_LIST_PAGE_SIZE]
+
     context = {
-        'invoices': combined_list,
-        'total_invoices': total_invoices,
-        'paid_invoices': paid_invoices,
-        'unpaid_invoices': unpaid_invoices,
-        'overdue_invoices': overdue_invoices,
-        'total_amount': total_amount,
-        'amount_received': amount_received,
+        'invoices': rows,
+        **stats,
+        'total_amount': stats['total_amount'] or 0,
+        'amount_received': stats['amount_received'] or 0,
         'search_query': search_query,
+        'is_first_page': cursor is None,
+        'next_cursor': _register_cursor(rows[-1]) if has_next else None,
     }
     return render(request, 'invoices/invoice_list.html', context)
 
@@ -94,13 +134,9 @@ def invoice_create(request):
         if form.is_valid():
             invoice = form.save(commit=False)
             # Generate invoice number (INV-001 format)
-            last_invoice = Invoice.objects.order_by('-invoice_number').first()
-            if last_invoice:
-                last_number = int(last_invoice.invoice_number.split('-')[1])
-                invoice.invoice_number = f'INV-{str(last_number + 1).zfill(3)}'
-            else:
-                invoice.invoice_number = 'INV-001'
-            invoice.save()
+            with transaction.atomic():
+                invoice.invoice_number = next_document_number('INV')
+                invoice.save()
             return redirect('invoice_edit', invoice_id=invoice.id)
     else:
         form = InvoiceForm()
@@ -162,6 +198,53 @@ def invoice_detail(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id)
     return render(request, 'invoices/invoice_detail.html', {'invoice': invoice})
 
+def _pdf_response(request, kind, document, detail_url):
+    try:
+        content = cached_pdf(kind, document)
+    except PDFRenderError as e:
+        messages.error(request, f'Error creating PDF: {e}')
+        return redirect(detail_url)
+    response = HttpResponse(content, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{pdf_filename(kind, document)}"'
+    return response
+
+@login_required
+def invoice_pdf(request, invoice_id):
+    invoice = get_object_or_404(Invoice.objects.select_related('customer'), id=invoice_id)
+    return _pdf_response(request, 'invoice', invoice, reverse('invoice_detail', args=[invoice.pk]))
+
+@login_required
+def pos_pdf(request, pos_id):
+    pos = get_object_or_404(POS, id=pos_id)
+    return _pdf_response(request, 'pos', pos, reverse('pos_detail', args=[pos.pk]))
+
+@login_required
+@require_GET
+def export_csv(request, name):
+    """
+    Stream an export as CSV
+
+    ``name`` is one of ``pos``, ``pos-items``, ``invoices`` or ``lending``.
+    Optional ``start`` and ``end`` (YYYY-MM-DD, inclusive) and ``status``
+    filter the rows.
+    """
+    try:
+        export = get_export(name)
+    except ExportError:
+        raise Http404('Unknown export')
+    try:
+        start, end = (
+            date.fromisoformat(request.GET[key]) if request.GET.get(key) else None
+            for key in ('start', 'end')
+        )
+        rows = export.rows(start, end, request.GET.get('status') or None)
+    except (ExportError, ValueError) as e:
+        return JsonResponse({'errors': {'__all__': [str(e)]}}, status=400)
+
+    response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y%m%d}.csv"'
+    return response
+
 @login_required
 def invoice_delete(request, invoice_id):
     invoice = get_object_or_404(Invoice, id=invoice_id)
@@ -178,32 +261,59 @@ def invoice_delete(request, invoice_id):
             return redirect('invoice_detail', invoice_id=invoice_id)
     return redirect('invoice_detail', invoice_id=invoice_id)
 
+POS_LIST_PAGE_SIZE = 50
+
+
+def _parse_pos_cursor(cursor):
+    """Decode an ``after`` cursor of the form ``<iso datetime>.<id>``."""
+    try:
+        moment, pos_id = cursor.rsplit('.', 1)
+        return datetime.fromisoformat(moment), int(pos_id)
+    except ValueError:
+        return None
+
+
 @login_required
 def pos_list(request):
-    search_query = request.GET.get('search', '')
+    search_query = request.GET.get('search', '').strip()
     pos_list = POS.objects.all()
-    
-    # Apply search filter if search query exists
+
+    # Prefix search, so the NOCASE indexes on customer_name and pos_number
+    # can serve it; a bare number also matches its POS-<n> document
+    search = Q()
     if search_query:
-        pos_list = pos_list.filter(
-            Q(customer_name__icontains=search_query) |
-            Q(pos_number__icontains=search_query)
-        )
-    
-    today = timezone.now().date()
-    total_pos = pos_list.count()
-    paid_pos = pos_list.filter(status='paid').count()
-    unpaid_pos = pos_list.filter(status='unpaid').count()
-    # Only paid POS for today
-    total_revenue = POS.objects.filter(status='paid', date__date=today).aggregate(Sum('total'))['total__sum'] or 0
+        search = Q(customer_name__istartswith=search_query) | Q(pos_number__istartswith=search_query)
+        if search_query.isdigit():
+            search |= Q(pos_number__istartswith=f'POS-{search_query}')
+        pos_list = pos_list.filter(search)
+
+    # Only paid POS for today count towards revenue, whatever the search
+    today_start = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+    stats = POS.objects.aggregate(
+        total_pos=Count('id', filter=search),
+        paid_pos=Count('id', filter=search & Q(status='paid')),
+        unpaid_pos=Count('id', filter=search & Q(status='unpaid')),
+        total_revenue=Sum('total', filter=Q(
+            status='paid', date__gte=today_start, date__lt=today_start + timedelta(days=1)
+        )),
+    )
+
+    # Keyset pagination on (date, id), newest first
+    cursor = _parse_pos_cursor(request.GET.get('after', ''))
+    if cursor:
+        moment, pos_id = cursor
+        pos_list = pos_list.filter(Q(date__lt=moment) | Q(date=moment, id__lt=pos_id))
+    page = list(pos_list.order_by('-date', '-id')[:POS_LIST_PAGE_SIZE + 1])
+    has_next = len(page) > POS_LIST_PAGE_SIZE
+    page = page[:POS_LIST_PAGE_SIZE]
 
     context = {
-        'pos_list': pos_list,
-        'total_pos': total_pos,
-        'paid_pos': paid_pos,
-        'unpaid_pos': unpaid_pos,
-        'total_revenue': total_revenue,
+        'pos_list': page,
+        **stats,
+        'total_revenue': stats['total_revenue'] or 0,
         'search_query': search_query,
+        'is_first_page': cursor is None,
+        'next_cursor': f'{page[-1].date.isoformat()}.{page[-1].id}' if has_next else None,
     }
     return render(request, 'invoices/pos_list.html', context)
 
@@ -214,13 +324,9 @@ def pos_create(request):
         if form.is_valid():
             pos = form.save(commit=False)
             # Generate POS number (POS-001 format)
-            last_pos = POS.objects.order_by('-pos_number').first()
-            if last_pos:
-                last_number = int(last_pos.pos_number.split('-')[1])
-                pos.pos_number = f'POS-{str(last_number + 1).zfill(3)}'
-            else:
-                pos.pos_number = 'POS-001'
-            pos.save()
+            with transaction.atomic():
+                pos.pos_number = next_document_number('POS')
+                pos.save()
             return redirect('pos_edit', pos_id=pos.id)
     else:
         form = POSForm()
@@ -239,14 +345,19 @@ def pos_edit(request, pos_id):
             if item_form.is_valid():
                 item = item_form.save(commit=False)
                 item.pos = pos
-                item.save()
-                
-                # Update POS subtotal
-                pos.subtotal = pos.items.aggregate(Sum('total'))['total__sum'] or 0
-                pos.save()
-                
-                # messages.success(request, 'Item added successfully.')
-                return redirect('pos_edit', pos_id=pos.id)
+                try:
+                    # Stock is reserved as the item is saved; roll back if it ran out meanwhile
+                    with transaction.atomic():
+                        item.save()
+                except InsufficientStock as e:
+                    item_form.add_error('quantity', e)
+                else:
+                    # Update POS subtotal
+                    pos.subtotal = pos.items.aggregate(Sum('total'))['total__sum'] or 0
+                    pos.save()
+                    
+                    # messages.success(request, 'Item added successfully.')
+                    return redirect('pos_edit', pos_id=pos.id)
         elif 'delete_item' in request.POST:
             item_id = request.POST.get('item_id')
             POSItem.objects.filter(id=item_id).delete()
@@ -369,22 +480,106 @@ def pos_delete(request, pos_id):
         return redirect('pos_list')
     return redirect('pos_list')
 
+@login_required
+@require_POST
+def pos_checkout_api(request):
+    """
+    Check out a whole cart in one request
+
+    Expects a JSON body with the customer fields of ``POSForm``, an ``items``
+    list of ``{"product_id" | "barcode", "quantity"}`` lines, an optional
+    ``discount`` and a ``status`` of 'paid' or 'unpaid'. Returns the receipt.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'errors': {'__all__': ['Request body must be valid JSON.']}}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'errors': {'__all__': ['Request body must be a JSON object.']}}, status=400)
+
+    form = POSForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    items = data.get('items')
+    if not isinstance(items, list):
+        return JsonResponse({'errors': {'items': ['A list of cart items is required.']}}, status=400)
+
+    try:
+        pos, pos_items = checkout_cart(
+            form.save(commit=False),
+            items,
+            discount=data.get('discount', 0),
+            status=data.get('status', 'unpaid'),
+        )
+    except ValidationError as e:
+        return JsonResponse({'errors': {'items': e.messages}}, status=400)
+
+    return JsonResponse({
+        'id': pos.id,
+        'pos_number': pos.pos_number,
+        'date': pos.date.isoformat(),
+        'customer_name': pos.customer_name,
+        'contact_number': pos.contact_number,
+        'email': pos.email,
+        'items': [
+            {
+                'product_id': item.product.id,
+                'name': item.product.name,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'total': str(item.total),
+            }
+            for item in pos_items
+        ],
+        'subtotal': str(pos.subtotal),
+        'discount': str(pos.discount),
+        'total': str(pos.total),
+        'status': pos.status,
+    }, status=201)
+
 @require_GET
 def get_product_price(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    # Use unit_price if selling_price is None, otherwise use selling_price
-    price = product.unit_price
-    return JsonResponse({'price': price}) 
+    product = lookup_product(product_id)
+    if product is None:
+        raise Http404('Product not found')
+    return JsonResponse({'price': product['price']})
 
 @require_GET
 def get_product_by_barcode(request, barcode):
-    from inventory.models import Product
-    product = Product.objects.filter(barcode=barcode).first()
+    product = lookup_product_by_barcode(barcode)
     if product:
-        return JsonResponse({'product_id': product.id, 'name': product.name, 'price': str(product.unit_price)})
+        return JsonResponse(product)
     else:
         return JsonResponse({'error': 'Not found'}, status=404)
 
+PRODUCT_SEARCH_LIMIT = 10
+
+
+@login_required
+@require_GET
+def product_search(request):
+    """Autocomplete for the POS product picker, best full-text matches first."""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+    ranked_ids = search_product_ids(query, PRODUCT_SEARCH_LIMIT)
+    if ranked_ids is None:
+        products = Product.objects.filter(name__icontains=query).order_by('name')
+    else:
+        products = Product.objects.filter(pk__in=ranked_ids).order_by(rank_order(ranked_ids))
+    return JsonResponse({'results': [
+        {
+            'product_id': pk,
+            'name': name,
+            'price': str(price),
+            'barcode': barcode,
+            'quantity': quantity,
+        }
+        for pk, name, price, barcode, quantity in products.values_list(
+            'pk', 'name', 'unit_price', 'barcode', 'quantity'
+        )[:PRODUCT_SEARCH_LIMIT]
+    ]})
+
 @login_required
 def test_invoice_delete(request):
     """Test view to verify invoice delete functionality"""
@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 from lending.models import Lending
 from invoices.models import POS
-from customers.models import Customer
 from django.db.models import Sum
 
 class Command(BaseCommand):
@@ -19,11 +18,7 @@ class Command(BaseCommand):
             customer = lending.customer
             
             # Check if this customer has any unpaid POS bills
-            unpaid_pos_bills = POS.objects.filter(
-                customer_name=customer.name,
-                contact_number=customer.phone,
-                status='unpaid'
-            )
+            unpaid_pos_bills = POS.objects.filter(customer=customer, status='unpaid')
             
             if unpaid_pos_bills.exists():
                 # Customer has unpaid bills, keep the lending record
@@ -40,20 +35,19 @@ class Command(BaseCommand):
         self.stdout.write(f'Deleted: {deleted_count} lending records')
         
         # Show summary of current state
+        unpaid_customers = POS.objects.filter(status='unpaid', customer__isnull=False) \
+            .values('customer', 'customer__name', 'customer__phone') \
+            .annotate(unpaid_total=Sum('total')) \
+            .order_by('customer__name')
         self.stdout.write(f'\nCurrent state:')
         self.stdout.write(f'Total lending records: {Lending.objects.count()}')
-        self.stdout.write(f'Total customers with unpaid bills: {POS.objects.filter(status="unpaid").values("customer_name", "contact_number").distinct().count()}')
+        self.stdout.write(f'Total customers with unpaid bills: {unpaid_customers.count()}')
         
         # Show customers who should be in lending module
-        unpaid_customers = POS.objects.filter(status='unpaid').values('customer_name', 'contact_number').distinct()
         self.stdout.write(f'\nCustomers with unpaid bills:')
         for customer_data in unpaid_customers:
-            customer_name = customer_data['customer_name']
-            contact_number = customer_data['contact_number']
-            unpaid_total = POS.objects.filter(
-                customer_name=customer_name,
-                contact_number=contact_number,
-                status='unpaid'
-            ).aggregate(total=Sum('total'))['total'] or 0
+            customer_name = customer_data['customer__name']
+            contact_number = customer_data['customer__phone']
+            unpaid_total = customer_data['unpaid_total'] or 0
             
-            self.stdout.write(f'  - {customer_name} ({contact_number}): ৳{unpaid_total}') 
\ No newline at end of file
+            self.stdout.write(f'  - {customer_name} ({contact_number}): ৳{unpaid_total}')
@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 from lending.models import Lending
 from invoices.models import POS
-from customers.models import Customer
 from django.db.models import Sum
 
 class Command(BaseCommand):
@@ -11,25 +10,22 @@ class Command(BaseCommand):
         self.stdout.write('Verifying lending records...')
         
         # Get all customers with unpaid POS bills
-        unpaid_customers = POS.objects.filter(status='unpaid').values('customer_name', 'contact_number').distinct()
+        unpaid_customers = POS.objects.filter(status='unpaid', customer__isnull=False) \
+            .values('customer', 'customer__name', 'customer__phone') \
+            .annotate(unpaid_total=Sum('total')) \
+            .order_by('customer__name')
+        customers_with_lending_ids = set(Lending.objects.values_list('customer_id', flat=True))
         
         self.stdout.write(f'\nCustomers with unpaid POS bills (should be in lending module):')
         self.stdout.write('=' * 60)
         
         for customer_data in unpaid_customers:
-            customer_name = customer_data['customer_name']
-            contact_number = customer_data['contact_number']
-            
-            # Get total unpaid amount
-            unpaid_total = POS.objects.filter(
-                customer_name=customer_name,
-                contact_number=contact_number,
-                status='unpaid'
-            ).aggregate(total=Sum('total'))['total'] or 0
+            customer_name = customer_data['customer__name']
+            contact_number = customer_data['customer__phone']
+            unpaid_total = customer_data['unpaid_total'] or 0
             
             # Check if they have a lending record
-            customer = Customer.objects.filter(name=customer_name, phone=contact_number).first()
-            has_lending = Lending.objects.filter(customer=customer).exists() if customer else False
+            has_lending = customer_data['customer'] in customers_with_lending_ids
             
             status_icon = "✓" if has_lending else "✗"
             status_text = "HAS LENDING RECORD" if has_lending else "MISSING LENDING RECORD"
@@ -40,7 +36,8 @@ class Command(BaseCommand):
             self.stdout.write('')
         
         # Get all lending records
-        lending_records = Lending.objects.all()
+        lending_records = Lending.objects.select_related('customer')
+        customers_with_unpaid_ids = {customer_data['customer'] for customer_data in unpaid_customers}
         
         self.stdout.write(f'\nCurrent lending records:')
         self.stdout.write('=' * 60)
@@ -49,13 +46,7 @@ class Command(BaseCommand):
             customer = lending.customer
             
             # Check if customer has unpaid bills
-            unpaid_pos_bills = POS.objects.filter(
-                customer_name=customer.name,
-                contact_number=customer.phone,
-                status='unpaid'
-            )
-            
-            has_unpaid = unpaid_pos_bills.exists()
+            has_unpaid = customer.pk in customers_with_unpaid_ids
             status_icon = "✓" if has_unpaid else "✗"
             status_text = "VALID" if has_unpaid else "INVALID (no unpaid bills)"
             
@@ -65,7 +56,7 @@ class Command(BaseCommand):
             self.stdout.write('')
         
         # Summary
-        total_unpaid_customers = unpaid_customers.count()
+        total_unpaid_customers = len(customers_with_unpaid_ids)
         total_lending_records = lending_records.count()
         
         self.stdout.write(f'\nSummary:')
@@ -80,7 +71,7 @@ class Command(BaseCommand):
         
         customers_with_unpaid = set()
         for customer_data in unpaid_customers:
-            customers_with_unpaid.add((customer_data['customer_name'], customer_data['contact_number']))
+            customers_with_unpaid.add((customer_data['customer__name'], customer_data['customer__phone']))
         
         missing_lending = customers_with_unpaid - customers_with_lending
         invalid_lending = customers_with_lending - customers_with_unpaid
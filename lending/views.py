@@ -66,14 +66,10 @@ def lending_delete(request, pk):
     if request.method == 'POST':
         customer = lending.customer
         customer_name = customer.name
-        customer_phone = customer.phone
         
         try:
             # Find related POS bills for this customer
-            related_pos_bills = POS.objects.filter(
-                customer_name=customer_name,
-                contact_number=customer_phone
-            )
+            related_pos_bills = POS.objects.filter(customer=customer)
             
             # Find related sales for this customer
             related_sales = Sale.objects.filter(customer=customer)
@@ -109,10 +105,7 @@ def lending_delete(request, pk):
     
     # For GET request, show confirmation with related data info
     customer = lending.customer
-    related_pos_bills = POS.objects.filter(
-        customer_name=customer.name,
-        contact_number=customer.phone
-    )
+    related_pos_bills = POS.objects.filter(customer=customer)
     related_sales = Sale.objects.filter(customer=customer)
     
     context = {
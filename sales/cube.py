@@ -0,0 +1,300 @@
+"""
+In-memory sales cube for ARSAFA ERP System
+
+Every POS item is held as one row of NumPy column arrays (day, product,
+category, customer, paid status, quantity, price, cost), so the reports page
+can slice revenue by any combination of dimensions with vectorised group-bys
+instead of a new ORM aggregate per combination.
+
+Each worker process keeps one cube and refreshes it incrementally before
+answering: items with an id above the high-water mark are appended, and
+bills whose outbox events were projected since the last refresh are reloaded
+(which picks up edits, deletions, status changes and the resolved customer).
+The cube therefore follows the POS projection, like the daily rollups.
+"""
+
+from datetime import date, timedelta
+import threading
+
+import numpy as np
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from customers.models import Customer
+from inventory.models import Product
+from invoices.models import POSEvent, POSItem
+
+DIMENSIONS = ['day', 'week', 'month', 'category', 'product', 'customer', 'status']
+MEASURES = ['revenue', 'units', 'cost', 'profit']
+STATUSES = ['paid', 'unpaid']
+
+# Rows fetched per chunk while loading, and bills reloaded per query
+LOAD_CHUNK_SIZE = 5000
+RELOAD_BATCH_SIZE = 500
+
+PROCESSED_MARGIN = timedelta(minutes=1)
+
+COLUMNS = {
+    'item_id': np.int64,
+    'pos_id': np.int64,
+    'day': np.int32,       # date.toordinal() of the local day
+    'month': np.int32,     # year * 12 + month - 1
+    'product': np.int64,   # -1 when the product was deleted
+    'category': np.int16,  # index into SalesCube.categories, -1 when unknown
+    'customer': np.int64,  # -1 until the bill is projected
+    'status': np.int8,     # index into STATUSES
+    'quantity': np.int64,
+    'unit_price': np.float64,
+    'unit_cost': np.float64,
+}
+
+
+class CubeQueryError(ValueError):
+    """Raised for unknown dimensions, measures or filter values."""
+
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+class SalesCube:
+    """Columnar POS item facts with an incremental refresh and group-by queries."""
+
+    def __init__(self):
+        self.columns = _empty_columns()
+        self.categories = []
+        self._category_codes = {}
+        self.item_mark = None
+        self.processed_mark = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.columns['item_id'])
+
+    def clear(self):
+        """Drop everything; the next refresh reloads the whole cube."""
+        with self._lock:
+            self.columns = _empty_columns()
+            self.item_mark = None
+            self.processed_mark = None
+
+    def refresh(self):
+        """Bring the cube up to date with the database; returns rows loaded."""
+        with self._lock:
+            # Bills projected in a transaction that commits after this refresh
+            # may carry an earlier processed_at; the margin picks them up next time
+            started = timezone.now() - PROCESSED_MARGIN
+            if self.item_mark is None:
+                columns = self._load(POSItem.objects.all())
+                loaded = len(columns['item_id'])
+            else:
+                changed = sorted(set(
+                    POSEvent.objects.filter(processed_at__gte=self.processed_mark)
+                    .values_list('pos_id', flat=True)
+                ))
+                kept = self.columns
+                if changed:
+                    kept = _take(kept, ~np.isin(kept['pos_id'], np.array(changed, dtype=np.int64)))
+                parts = [self._load(POSItem.objects.filter(id__gt=self.item_mark).exclude(pos_id__in=changed))]
+                parts += [
+                    self._load(POSItem.objects.filter(pos_id__in=batch))
+                    for batch in _batches(changed, RELOAD_BATCH_SIZE)
+                ]
+                loaded = sum(len(part['item_id']) for part in parts)
+                columns = _concat([kept] + parts) if changed or loaded else kept
+
+            self.columns = columns
+            if len(columns['item_id']):
+                self.item_mark = max(self.item_mark or 0, int(columns['item_id'].max()))
+            elif self.item_mark is None:
+                self.item_mark = 0
+            self.processed_mark = started
+            return loaded
+
+    def _load(self, items):
+        rows = (
+            items.order_by('id')
+            .annotate(
+                day=TruncDate('pos__date'),
+                cost=Coalesce('unit_cost', 'product__buying_price'),
+            )
+            .values_list(
+                'id', 'pos_id', 'day', 'product_id', 'product__category', 'pos__customer_id',
+                'pos__status', 'quantity', 'unit_price', 'cost',
+            )
+        )
+        parts = []
+        chunk = []
+        for row in rows.iterator(chunk_size=LOAD_CHUNK_SIZE):
+            chunk.append(row)
+            if len(chunk) == LOAD_CHUNK_SIZE:
+                parts.append(self._to_columns(chunk))
+                chunk = []
+        if chunk:
+            parts.append(self._to_columns(chunk))
+        return _concat(parts) if parts else _empty_columns()
+
+    def _to_columns(self, rows):
+        (item_ids, pos_ids, days, products, categories, customers,
+         statuses, quantities, prices, costs) = zip(*rows)
+        return {
+            'item_id': np.array(item_ids, dtype=np.int64),
+            'pos_id': np.array(pos_ids, dtype=np.int64),
+            'day': np.array([day.toordinal() for day in days], dtype=np.int32),
+            'month': np.array([day.year * 12 + day.month - 1 for day in days], dtype=np.int32),
+            'product': np.array([-1 if pk is None else pk for pk in products], dtype=np.int64),
+            'category': np.array([self._category_code(category) for category in categories], dtype=np.int16),
+            'customer': np.array([-1 if pk is None else pk for pk in customers], dtype=np.int64),
+            'status': np.array([STATUSES.index(status) for status in statuses], dtype=np.int8),
+            'quantity': np.array(quantities, dtype=np.int64),
+            'unit_price': np.array([float(price) for price in prices], dtype=np.float64),
+            'unit_cost': np.array([0.0 if cost is None else float(cost) for cost in costs], dtype=np.float64),
+        }
+
+    def _category_code(self, category):
+        if category is None:
+            return -1
+        if category not in self._category_codes:
+            self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return self._category_codes[category]
+
+    def query(self, group_by, start=None, end=None, status=None, category=None, customer=None,
+              sort='revenue', limit=100):
+        """
+        Group the cube by one or more dimensions and sum every measure.
+
+        Args:
+            group_by: List of names from ``DIMENSIONS``
+            start, end: Optional inclusive day range
+            status: Optional ``'paid'`` or ``'unpaid'``
+            category: Optional product category code
+            customer: Optional customer id
+            sort: Measure to order the groups by, largest first
+            limit: Maximum number of groups returned
+
+        Returns:
+            Dict with the ``rows`` (one dict per group with each dimension's
+            key and label plus the measures), the number of ``groups`` and
+            the number of ``items`` that matched the filters
+        """
+        unknown = [name for name in group_by if name not in DIMENSIONS]
+        if unknown or not group_by:
+            raise CubeQueryError(f'Group by one or more of {", ".join(DIMENSIONS)}.')
+        if sort not in MEASURES:
+            raise CubeQueryError(f'Sort by one of {", ".join(MEASURES)}.')
+        if status is not None and status not in STATUSES:
+            raise CubeQueryError(f'Status must be one of {", ".join(STATUSES)}.')
+        if limit < 1:
+            raise CubeQueryError('Limit must be at least 1.')
+
+        with self._lock:
+            columns = self.columns
+            categories = list(self.categories)
+
+        mask = np.ones(len(columns['item_id']), dtype=bool)
+        if start is not None:
+            mask &= columns['day'] >= start.toordinal()
+        if end is not None:
+            mask &= columns['day'] <= end.toordinal()
+        if status is not None:
+            mask &= columns['status'] == STATUSES.index(status)
+        if category is not None:
+            mask &= columns['category'] == (categories.index(category) if category in categories else -2)
+        if customer is not None:
+            mask &= columns['customer'] == customer
+        selected = _take(columns, mask)
+
+        quantity = selected['quantity']
+        revenue = quantity * selected['unit_price']
+        cost = quantity * selected['unit_cost']
+        keys = np.stack([_dimension(selected, name) for name in group_by], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        sums = {
+            'revenue': np.bincount(inverse, weights=revenue, minlength=len(groups)),
+            'units': np.bincount(inverse, weights=quantity, minlength=len(groups)),
+            'cost': np.bincount(inverse, weights=cost, minlength=len(groups)),
+        }
+        sums['profit'] = sums['revenue'] - sums['cost']
+        order = np.argsort(-sums[sort], kind='stable')[:limit]
+
+        labels = _labels(group_by, groups[order], categories)
+        rows = []
+        for position, index in enumerate(order):
+            row = {}
+            for column, name in enumerate(group_by):
+                key = int(groups[index][column])
+                row[name] = _key_value(name, key, categories)
+                row[f'{name}_label'] = labels[name].get(key, str(key))
+            row['revenue'] = round(float(sums['revenue'][index]), 2)
+            row['units'] = int(sums['units'][index])
+            row['cost'] = round(float(sums['cost'][index]), 2)
+            row['profit'] = round(float(sums['profit'][index]), 2)
+            rows.append(row)
+        return {'rows': rows, 'groups': len(groups), 'items': int(mask.sum())}
+
+
+def _dimension(columns, name):
+    if name == 'week':
+        # Ordinal 1 (0001-01-01) is a Monday, so this is the week's Monday
+        return columns['day'] - (columns['day'] - 1) % 7
+    return columns[name]
+
+
+def _key_value(name, key, categories):
+    """JSON value of a group key: ISO dates for periods, codes or ids otherwise."""
+    if name in ('day', 'week'):
+        return date.fromordinal(key).isoformat()
+    if name == 'month':
+        return date(key // 12, key % 12 + 1, 1).isoformat()
+    if name == 'status':
+        return STATUSES[key]
+    if key == -1:
+        return None
+    if name == 'category':
+        return categories[key]
+    return key
+
+
+def _labels(group_by, groups, categories):
+    """Readable label per key for every grouped dimension, one query per lookup."""
+    labels = {}
+    for column, name in enumerate(group_by):
+        keys = {int(key) for key in groups[:, column]} if len(groups) else set()
+        if name == 'day':
+            labels[name] = {key: date.fromordinal(key).strftime('%d %b %Y') for key in keys}
+        elif name == 'week':
+            labels[name] = {
+                key: f'{date.fromordinal(key):%d %b} – {date.fromordinal(key) + timedelta(days=6):%d %b %Y}'
+                for key in keys
+            }
+        elif name == 'month':
+            labels[name] = {key: date(key // 12, key % 12 + 1, 1).strftime('%b %Y') for key in keys}
+        elif name == 'category':
+            names = dict(Product.CATEGORY_CHOICES)
+            labels[name] = {key: names.get(categories[key], categories[key]) for key in keys if key >= 0}
+        elif name == 'product':
+            labels[name] = dict(Product.objects.filter(pk__in=keys).values_list('pk', 'name'))
+        elif name == 'customer':
+            labels[name] = dict(Customer.objects.filter(pk__in=keys).values_list('pk', 'name'))
+        else:
+            labels[name] = {index: status.title() for index, status in enumerate(STATUSES)}
+        labels[name].setdefault(-1, 'Unknown')
+    return labels
+
+
+def _take(columns, mask):
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def _concat(parts):
+    return {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+
+
+def _batches(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+sales_cube = SalesCube()
@@ -0,0 +1,112 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from invoices.models import POS
+from invoices.services import pending_pos_events
+from sales.models import HourlySalesRollup, ProductDailySales
+from sales.services import (
+    compute_hourly_rollups, compute_product_sales, compute_rollups, daily_sales, rebuild_rollups, ROLLUP_FIELDS,
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily and hourly sales rollups and product sales for a date range from POS bills and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='start',
+            type=date.fromisoformat,
+            help='First day to rebuild (YYYY-MM-DD, default: the first POS day)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='end',
+            type=date.fromisoformat,
+            help='Last day to rebuild (YYYY-MM-DD, default: today)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drift, do not write the corrected rollups',
+        )
+
+    def handle(self, *args, **options):
+        pending = pending_pos_events().count()
+        if pending and not options['dry_run']:
+            self.stdout.write(self.style.ERROR(
+                f'{pending} POS event(s) are still pending. Run process_pos_outbox first.'
+            ))
+            return
+
+        end = options['end'] or timezone.localdate()
+        start = options['start']
+        if start is None:
+            first = POS.objects.aggregate(first=Min('date'))['first']
+            start = timezone.localdate(first) if first else end
+        if start > end:
+            raise CommandError('--from must not be after --to.')
+
+        stored = daily_sales(start, end)
+        computed = {rollup.day: rollup for rollup in compute_rollups(start, end)}
+        drifted = 0
+        for day in sorted(stored.keys() | computed.keys()):
+            old, new = stored.get(day), computed.get(day)
+            old_values = [getattr(old, field) for field in ROLLUP_FIELDS] if old else [0] * len(ROLLUP_FIELDS)
+            new_values = [getattr(new, field) for field in ROLLUP_FIELDS] if new else [0] * len(ROLLUP_FIELDS)
+            if old_values != new_values:
+                drifted += 1
+                self.stdout.write(f'✗ {day}: orders {old_values[0]} -> {new_values[0]}, '
+                                  f'paid ৳{old_values[1]} -> ৳{new_values[1]}, '
+                                  f'unpaid ৳{old_values[2]} -> ৳{new_values[2]}')
+
+        # Product facts feed the top products and profitability reports
+        stored_facts = {
+            (day, product_id): (units, revenue, cost)
+            for day, product_id, units, revenue, cost in ProductDailySales.objects
+            .filter(day__range=(start, end)).exclude(units=0, revenue=0, cost=0)
+            .values_list('day', 'product_id', 'units', 'revenue', 'cost')
+        }
+        computed_facts = {
+            (fact.day, fact.product_id): (fact.units, fact.revenue, fact.cost)
+            for fact in compute_product_sales(start, end)
+        }
+        drifted_facts = sum(
+            stored_facts.get(key) != computed_facts.get(key)
+            for key in stored_facts.keys() | computed_facts.keys()
+        )
+        # Hourly rollups feed the heatmap
+        stored_hours = {
+            (day, hour): (order_count, revenue)
+            for day, hour, order_count, revenue in HourlySalesRollup.objects
+            .filter(day__range=(start, end)).exclude(order_count=0, revenue=0)
+            .values_list('day', 'hour', 'order_count', 'revenue')
+        }
+        computed_hours = {
+            (rollup.day, rollup.hour): (rollup.order_count, rollup.revenue)
+            for rollup in compute_hourly_rollups(start, end)
+        }
+        drifted_hours = sum(
+            stored_hours.get(key) != computed_hours.get(key)
+            for key in stored_hours.keys() | computed_hours.keys()
+        )
+
+        summary = f'{drifted} day(s) drifted'
+        if drifted_hours:
+            summary += f', {drifted_hours} hour(s) drifted'
+        if drifted_facts:
+            summary += f', {drifted_facts} product sales row(s) drifted'
+
+        if options['dry_run']:
+            if drifted or drifted_hours or drifted_facts:
+                self.stdout.write(self.style.WARNING(f'{summary}. Run without --dry-run to fix.'))
+            else:
+                self.stdout.write(self.style.SUCCESS('✅ All daily sales rollups are correct!'))
+            return
+
+        rollups = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(rollups)} daily rollup(s) and their product sales from {start} to {end} ({summary}).'
+        ))
@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def seed_daily_sales_rollups(apps, schema_editor):
+    """
+    Build the initial rollups in one grouped query.
+
+    Only bills the projection has already counted are included; bills still
+    waiting in the outbox are added when they are projected.
+    """
+    POS = apps.get_model('invoices', 'POS')
+    POSLedgerEntry = apps.get_model('invoices', 'POSLedgerEntry')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+    rows = (
+        POS.objects.filter(id__in=POSLedgerEntry.objects.values('pos_id')).annotate(day=TruncDate('date')).order_by().values('day').annotate(
+            order_count=Count('id'),
+            paid_total=Sum('total', filter=Q(status='paid')),
+            unpaid_total=Sum('total', filter=Q(status='unpaid')),
+            discount_total=Sum('discount'),
+        )
+    )
+    DailySalesRollup.objects.bulk_create(
+        [
+            DailySalesRollup(
+                day=row['day'],
+                order_count=row['order_count'],
+                paid_total=row['paid_total'] or 0,
+                unpaid_total=row['unpaid_total'] or 0,
+                discount_total=row['discount_total'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_dailysalesrollup'),
+        ('invoices', '0009_backfill_posledgerentry_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_daily_sales_rollups, migrations.RunPython.noop),
+    ]
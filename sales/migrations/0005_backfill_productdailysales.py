@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+
+def seed_product_daily_sales(apps, schema_editor):
+    """
+    Build the initial product facts from POS items in one grouped query.
+
+    Only bills the projection has already counted are included; bills still
+    waiting in the outbox are added when they are projected.
+    """
+    POSItem = apps.get_model('invoices', 'POSItem')
+    POSLedgerEntry = apps.get_model('invoices', 'POSLedgerEntry')
+    ProductDailySales = apps.get_model('sales', 'ProductDailySales')
+    rows = (
+        POSItem.objects.filter(pos_id__in=POSLedgerEntry.objects.values('pos_id'), product__isnull=False)
+        .annotate(day=TruncDate('pos__date')).order_by().values('day', 'product_id').annotate(
+            units=Sum('quantity'),
+            revenue=Sum('total'),
+            cost=Sum(F('unit_cost') * F('quantity')),
+        )
+    )
+    ProductDailySales.objects.bulk_create(
+        [
+            ProductDailySales(
+                day=row['day'],
+                product_id=row['product_id'],
+                units=row['units'],
+                revenue=row['revenue'],
+                cost=row['cost'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_productdailysales'),
+        ('invoices', '0011_backfill_positem_unit_cost'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_product_daily_sales, migrations.RunPython.noop),
+    ]
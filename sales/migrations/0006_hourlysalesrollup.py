@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_backfill_productdailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('weekday', models.PositiveSmallIntegerField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['day', 'hour'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysalesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'hour'), name='hourlysalesrollup_day_hour_uniq'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+
+
+def seed_hourly_sales_rollups(apps, schema_editor):
+    """
+    Build the initial hourly rollups in one grouped query.
+
+    Only bills the projection has already counted are included; bills still
+    waiting in the outbox are added when they are projected.
+    """
+    POS = apps.get_model('invoices', 'POS')
+    POSLedgerEntry = apps.get_model('invoices', 'POSLedgerEntry')
+    HourlySalesRollup = apps.get_model('sales', 'HourlySalesRollup')
+    rows = (
+        POS.objects.filter(id__in=POSLedgerEntry.objects.values('pos_id'))
+        .annotate(day=TruncDate('date'), hour=ExtractHour('date')).order_by().values('day', 'hour')
+        .annotate(order_count=Count('id'), revenue=Sum('total'))
+    )
+    HourlySalesRollup.objects.bulk_create(
+        [
+            HourlySalesRollup(
+                day=row['day'],
+                hour=row['hour'],
+                weekday=row['day'].weekday(),
+                order_count=row['order_count'],
+                revenue=row['revenue'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_hourlysalesrollup'),
+        ('invoices', '0014_backfill_posledgerentry_hour'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_hourly_sales_rollups, migrations.RunPython.noop),
+    ]
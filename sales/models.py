@@ -24,4 +24,77 @@ class SaleItem(models.Model):
         return self.quantity * self.unit_price
 
     def __str__(self):
-        return f"{self.quantity} of {self.product.name}" 
\ No newline at end of file
+        return f"{self.quantity} of {self.product.name}" 
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-aggregated POS totals for one calendar day
+
+    Kept up to date incrementally by the POS projection (see
+    ``invoices.services``), so dashboards read one row per day instead of
+    scanning POS. ``rebuild_sales_rollups`` recomputes a date range from the
+    POS table if it ever drifts.
+    """
+    day = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    paid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    unpaid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['day']
+
+    @property
+    def total_sales(self):
+        return self.paid_total + self.unpaid_total
+
+    def __str__(self):
+        return f"Sales on {self.day}: {self.total_sales}"
+
+
+class HourlySalesRollup(models.Model):
+    """
+    POS order count and revenue for one local hour of one day
+
+    Maintained by the POS projection alongside ``DailySalesRollup``. The
+    weekday is stored so the day-of-week by hour heatmap groups plain
+    columns; a year of history is under 9,000 rows.
+    """
+    day = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    # Monday is 0, as in date.weekday()
+    weekday = models.PositiveSmallIntegerField()
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['day', 'hour']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'hour'], name='hourlysalesrollup_day_hour_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Sales on {self.day} {self.hour:02d}:00: {self.revenue}"
+
+
+class ProductDailySales(models.Model):
+    """
+    Units, revenue and cost sold per product per calendar day
+
+    Maintained incrementally by the POS projection alongside
+    ``DailySalesRollup``, so product rankings read a few compact rows instead
+    of every POS item in the window.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='productdailysales_day_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.units} of product {self.product_id} on {self.day}"
@@ -0,0 +1,433 @@
+"""
+Daily sales rollups for ARSAFA ERP System
+
+``DailySalesRollup`` holds one row of POS totals per calendar day,
+``HourlySalesRollup`` one per hour of each day and ``ProductDailySales`` one
+row per product per day. The POS projection shifts the affected rows by a
+delta whenever a bill is created, changed or deleted; dashboards and reports
+read the rows instead of summing POS and POS items.
+Days are local calendar days (``settings.TIME_ZONE``), the same as
+``date__date`` lookups.
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import ExtractHour, Trunc, TruncDate
+from django.utils import timezone
+
+from inventory.models import Product
+from invoices.models import POS, POSItem, POSLedgerEntry
+from .models import DailySalesRollup, HourlySalesRollup, ProductDailySales
+
+ROLLUP_FIELDS = ['order_count', 'paid_total', 'unpaid_total', 'discount_total']
+
+PRODUCT_SALES_FIELDS = ['units', 'revenue', 'cost']
+
+# Products per UPDATE when applying product sales deltas
+PRODUCT_DELTA_CHUNK = 200
+
+SERIES_BUCKETS = ['hour', 'day', 'week', 'month']
+
+# Most buckets a single chart series may span
+MAX_SERIES_BUCKETS = 1000
+
+
+def pos_day(pos):
+    """The local calendar day a POS bill is counted under."""
+    return timezone.localdate(pos.date)
+
+
+def pos_hour(pos):
+    """The local hour of the day (0-23) a POS bill is counted under."""
+    return timezone.localtime(pos.date).hour
+
+
+def apply_rollup_delta(day, order_count=0, paid=0, unpaid=0, discount=0):
+    """Shift one day's rollup by the given amounts with ``F()`` updates."""
+    if not (order_count or paid or unpaid or discount):
+        return
+    changes = {
+        'order_count': F('order_count') + order_count,
+        'paid_total': F('paid_total') + paid,
+        'unpaid_total': F('unpaid_total') + unpaid,
+        'discount_total': F('discount_total') + discount,
+    }
+    rollups = DailySalesRollup.objects.filter(day=day)
+    if rollups.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailySalesRollup.objects.create(
+                day=day, order_count=order_count, paid_total=paid, unpaid_total=unpaid, discount_total=discount
+            )
+    except IntegrityError:
+        # Another projection created the day first
+        rollups.update(**changes)
+
+
+def apply_hourly_delta(day, hour, order_count=0, revenue=0):
+    """Shift one hour's rollup by the given amounts with ``F()`` updates."""
+    if not (order_count or revenue):
+        return
+    changes = {
+        'order_count': F('order_count') + order_count,
+        'revenue': F('revenue') + revenue,
+    }
+    rollups = HourlySalesRollup.objects.filter(day=day, hour=hour)
+    if rollups.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            HourlySalesRollup.objects.create(
+                day=day, hour=hour, weekday=day.weekday(), order_count=order_count, revenue=revenue
+            )
+    except IntegrityError:
+        # Another projection created the hour first
+        rollups.update(**changes)
+
+
+def apply_product_sales_deltas(day, deltas):
+    """
+    Shift the product sales facts of one day by the given amounts.
+
+    Existing rows are updated with one ``CASE`` UPDATE per chunk of products,
+    relative to their stored values, so concurrent projections cannot lose an
+    update. Missing rows are then created in bulk.
+
+    Args:
+        day: The calendar day the deltas belong to
+        deltas: Mapping of product id to a ``(units, revenue, cost)`` delta
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if any(delta)}
+    product_ids = list(deltas)
+    for start in range(0, len(product_ids), PRODUCT_DELTA_CHUNK):
+        chunk = {product_id: deltas[product_id] for product_id in product_ids[start:start + PRODUCT_DELTA_CHUNK]}
+        rows = ProductDailySales.objects.filter(day=day, product_id__in=chunk)
+        changes = {
+            field: F(field) + Case(
+                *[When(product_id=product_id, then=Value(delta[position])) for product_id, delta in chunk.items()],
+                default=Value(0),
+                output_field=IntegerField() if field == 'units' else DecimalField(max_digits=14, decimal_places=2),
+            )
+            for position, field in enumerate(PRODUCT_SALES_FIELDS)
+        }
+        if rows.update(**changes) == len(chunk):
+            continue
+
+        existing = set(rows.values_list('product_id', flat=True))
+        # Rows are only created for sales; taking a line off a product whose
+        # facts were removed with the product itself has nothing to undo
+        missing = [
+            ProductDailySales(day=day, product_id=product_id, units=units, revenue=revenue, cost=cost)
+            for product_id, (units, revenue, cost) in chunk.items()
+            if product_id not in existing and units > 0
+        ]
+        try:
+            with transaction.atomic():
+                ProductDailySales.objects.bulk_create(missing)
+        except IntegrityError:
+            # Another projection created some of the rows first
+            for row in missing:
+                apply_product_sales_deltas(day, {row.product_id: (row.units, row.revenue, row.cost)})
+
+
+def top_products(start_day, end_day, limit=10):
+    """
+    Best-selling products of a period with growth against the period before.
+
+    The previous period has the same length and ends the day before
+    ``start_day``. Both windows come from one grouped query over
+    ``ProductDailySales``. ``growth`` is the revenue change in percent, or
+    None when the product had no revenue in the previous period.
+    """
+    previous_start = start_day - (end_day - start_day) - timedelta(days=1)
+    current = Q(day__gte=start_day)
+    previous = Q(day__lt=start_day)
+    rows = (
+        ProductDailySales.objects.filter(day__range=(previous_start, end_day))
+        .values('product_id', 'product__name')
+        .annotate(
+            previous_units=Sum('units', filter=previous),
+            previous_revenue=Sum('revenue', filter=previous),
+            units_sold=Sum('units', filter=current),
+            revenue=Sum('revenue', filter=current),
+        )
+        .filter(units_sold__gt=0)
+        .order_by('-units_sold', '-revenue', 'product__name')[:limit]
+    )
+    results = []
+    for row in rows:
+        previous_revenue = row['previous_revenue'] or 0
+        row['growth'] = (
+            round(float((row['revenue'] - previous_revenue) / previous_revenue * 100), 1)
+            if previous_revenue else None
+        )
+        results.append(row)
+    return results
+
+
+def _margin(profit, revenue):
+    """Profit as a percentage of revenue, or None without revenue."""
+    if not revenue:
+        return None
+    return (Decimal(profit) / Decimal(revenue) * 100).quantize(Decimal('0.1'))
+
+
+def profitability(start_day, end_day, product_limit=20):
+    """
+    Gross margin per product, category and day, and discount leakage.
+
+    Everything is summed in the database from the stored product sales facts
+    and daily rollups, in Decimal, so no POS item is read. ``net_sales`` is
+    the POS ledger total for the period (bills after discount). Revenue of
+    items whose product was deleted has no cost and is reported as
+    ``unattributed`` so the summary still adds up to the ledger.
+
+    Returns:
+        Dict with ``summary``, ``categories``, ``products`` (the most
+        profitable first) and ``days``
+    """
+    facts = ProductDailySales.objects.filter(day__range=(start_day, end_day))
+    totals = facts.aggregate(units=Sum('units'), revenue=Sum('revenue'), cost=Sum('cost'))
+    revenue, cost = totals['revenue'] or Decimal('0'), totals['cost'] or Decimal('0')
+    ledger = sales_totals(start_day, end_day)
+    discount = ledger['discount_total']
+    net_sales = ledger['paid_total'] + ledger['unpaid_total']
+    gross_profit = revenue - cost
+    summary = {
+        'units': totals['units'] or 0,
+        'revenue': revenue,
+        'cost': cost,
+        'gross_profit': gross_profit,
+        'gross_margin': _margin(gross_profit, revenue),
+        'discount': discount,
+        'discount_share': _margin(discount, revenue),
+        'net_sales': net_sales,
+        'net_profit': gross_profit - discount,
+        'net_margin': _margin(gross_profit - discount, net_sales),
+        'unattributed': net_sales + discount - revenue,
+    }
+
+    grouped = {'units': Sum('units'), 'revenue': Sum('revenue'), 'cost': Sum('cost')}
+    profit = F('revenue') - F('cost')
+    categories = list(
+        facts.values('product__category').annotate(**grouped).annotate(profit=profit).order_by('-profit')
+    )
+    products = list(
+        facts.values('product_id', 'product__name', 'product__category')
+        .annotate(**grouped).annotate(profit=profit)
+        .order_by('-profit', 'product__name')[:product_limit]
+    )
+    category_names = dict(Product.CATEGORY_CHOICES)
+    for row in categories + products:
+        row['category'] = category_names.get(row['product__category'], row['product__category'])
+        row['margin'] = _margin(row['profit'], row['revenue'])
+        # Revenue without cost means the product had no buying price
+        row['cost_missing'] = not row['cost'] and bool(row['revenue'])
+
+    day_rollups = daily_sales(start_day, end_day)
+    days = []
+    for row in facts.values('day').annotate(**grouped).annotate(profit=profit).order_by('day'):
+        rollup = day_rollups.get(row['day'])
+        row['discount'] = rollup.discount_total if rollup else Decimal('0')
+        row['net_profit'] = row['profit'] - row['discount']
+        row['margin'] = _margin(row['profit'], row['revenue'])
+        days.append(row)
+
+    return {'summary': summary, 'categories': categories, 'products': products, 'days': days}
+
+
+def sales_totals(start_day, end_day):
+    """Summed rollups for the days from ``start_day`` to ``end_day`` inclusive."""
+    totals = DailySalesRollup.objects.filter(day__range=(start_day, end_day)).aggregate(
+        **{field: Sum(field) for field in ROLLUP_FIELDS}
+    )
+    return {field: value or 0 for field, value in totals.items()}
+
+
+def daily_sales(start_day, end_day):
+    """Map each day in the range to its rollup; days without sales are missing."""
+    return {
+        rollup.day: rollup
+        for rollup in DailySalesRollup.objects.filter(day__range=(start_day, end_day))
+    }
+
+
+def series_periods(bucket, start_day, end_day):
+    """
+    Start of every bucket from ``start_day`` to ``end_day``: aware datetimes
+    for hours, dates (weeks start on Monday) otherwise.
+    """
+    if bucket == 'hour':
+        start, end = _day_bounds(start_day, end_day)
+        hours = int((end - start).total_seconds() // 3600)
+        return [timezone.localtime(start + timedelta(hours=i)) for i in range(hours)]
+    if bucket == 'day':
+        return [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    if bucket == 'week':
+        first = start_day - timedelta(days=start_day.weekday())
+        return [first + timedelta(weeks=i) for i in range((end_day - first).days // 7 + 1)]
+    periods = []
+    current = start_day.replace(day=1)
+    while current <= end_day:
+        periods.append(current)
+        current = (current + timedelta(days=32)).replace(day=1)
+    return periods
+
+
+def sales_series(bucket, start_day, end_day):
+    """
+    Sales total and order count per bucket for a chart, zero-filled.
+
+    One query over pre-aggregated data: hours read the hourly rollups,
+    days, weeks and months group the daily rollups with ``Trunc``.
+
+    Returns:
+        List of ``(period start, total, orders)`` for every bucket in the range
+    """
+    if bucket == 'hour':
+        found = {
+            (day, hour): (revenue, orders)
+            for day, hour, revenue, orders in HourlySalesRollup.objects
+            .filter(day__range=(start_day, end_day), order_count__gt=0)
+            .values_list('day', 'hour', 'revenue', 'order_count')
+        }
+        series = []
+        for period in series_periods(bucket, start_day, end_day):
+            total, orders = found.get((period.date(), period.hour), (Decimal('0'), 0))
+            series.append((period, total, orders))
+        return series
+    rows = (
+        DailySalesRollup.objects.filter(day__range=(start_day, end_day))
+        .annotate(period=Trunc('day', bucket)).order_by().values('period')
+        .annotate(total=Sum(F('paid_total') + F('unpaid_total')), orders=Sum('order_count'))
+    )
+    found = {row['period']: row for row in rows}
+    return [
+        (period, found[period]['total'], found[period]['orders']) if period in found else (period, Decimal('0'), 0)
+        for period in series_periods(bucket, start_day, end_day)
+    ]
+
+
+def sales_heatmap(start_day, end_day):
+    """
+    Orders and revenue per weekday and hour of day, for a staffing heatmap.
+
+    One grouped query over the hourly rollups, at most 168 result rows.
+
+    Returns:
+        7 x 24 nested lists (Monday first) of ``(orders, revenue)``
+    """
+    cells = [[(0, Decimal('0')) for _ in range(24)] for _ in range(7)]
+    rows = (
+        HourlySalesRollup.objects.filter(day__range=(start_day, end_day))
+        .order_by().values('weekday', 'hour')
+        .annotate(orders=Sum('order_count'), total=Sum('revenue'))
+    )
+    for row in rows:
+        cells[row['weekday']][row['hour']] = (row['orders'], row['total'])
+    return cells
+
+
+def credit_balance():
+    """Total of all unpaid POS bills."""
+    return DailySalesRollup.objects.aggregate(total=Sum('unpaid_total'))['total'] or 0
+
+
+def _day_bounds(start_day, end_day):
+    """Aware datetimes bounding the local days from ``start_day`` to ``end_day``."""
+    start = timezone.make_aware(datetime.combine(start_day, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+    return start, end
+
+
+def _counted_bills(column='day'):
+    """
+    Ids of the POS bills the projection has counted in the rollups.
+
+    A bill is counted once its ledger entry records the day (or hour) it was
+    counted under. Legacy bills without an entry are left out, as the seeding
+    migrations left them out, so a rebuild agrees with the next projection.
+    """
+    return POSLedgerEntry.objects.filter(**{f'{column}__isnull': False}).values('pos_id')
+
+
+def compute_rollups(start_day, end_day):
+    """Recompute the rollups for a day range from the POS table in one grouped query."""
+    start, end = _day_bounds(start_day, end_day)
+    return [
+        DailySalesRollup(
+            day=row['day'],
+            order_count=row['order_count'],
+            paid_total=row['paid_total'] or Decimal('0'),
+            unpaid_total=row['unpaid_total'] or Decimal('0'),
+            discount_total=row['discount_total'] or Decimal('0'),
+        )
+        for row in POS.objects.filter(date__gte=start, date__lt=end, id__in=_counted_bills())
+        .annotate(day=TruncDate('date')).order_by().values('day').annotate(
+            order_count=Count('id'),
+            paid_total=Sum('total', filter=Q(status='paid')),
+            unpaid_total=Sum('total', filter=Q(status='unpaid')),
+            discount_total=Sum('discount'),
+        )
+    ]
+
+
+def compute_product_sales(start_day, end_day):
+    """Recompute the product sales facts for a day range from POS items."""
+    start, end = _day_bounds(start_day, end_day)
+    return [
+        ProductDailySales(
+            day=row['day'],
+            product_id=row['product_id'],
+            units=row['units'],
+            revenue=row['revenue'],
+            cost=row['cost'] or Decimal('0'),
+        )
+        for row in POSItem.objects.filter(
+            pos__date__gte=start, pos__date__lt=end, product__isnull=False, pos_id__in=_counted_bills(),
+        )
+        .annotate(day=TruncDate('pos__date')).order_by().values('day', 'product_id').annotate(
+            units=Sum('quantity'),
+            revenue=Sum('total'),
+            cost=Sum(F('unit_cost') * F('quantity')),
+        )
+    ]
+
+
+def compute_hourly_rollups(start_day, end_day):
+    """Recompute the hourly rollups for a day range from the POS table."""
+    start, end = _day_bounds(start_day, end_day)
+    return [
+        HourlySalesRollup(
+            day=row['day'],
+            hour=row['hour'],
+            weekday=row['day'].weekday(),
+            order_count=row['order_count'],
+            revenue=row['revenue'],
+        )
+        for row in POS.objects.filter(date__gte=start, date__lt=end, id__in=_counted_bills('hour'))
+        .annotate(day=TruncDate('date'), hour=ExtractHour('date')).order_by().values('day', 'hour')
+        .annotate(order_count=Count('id'), revenue=Sum('total'))
+    ]
+
+
+def rebuild_rollups(start_day, end_day):
+    """
+    Replace the stored daily and hourly rollups and product sales facts for a
+    day range with freshly computed ones.
+    """
+    rollups = compute_rollups(start_day, end_day)
+    hourly = compute_hourly_rollups(start_day, end_day)
+    product_sales = compute_product_sales(start_day, end_day)
+    with transaction.atomic():
+        DailySalesRollup.objects.filter(day__range=(start_day, end_day)).delete()
+        DailySalesRollup.objects.bulk_create(rollups)
+        HourlySalesRollup.objects.filter(day__range=(start_day, end_day)).delete()
+        HourlySalesRollup.objects.bulk_create(hourly, batch_size=500)
+        ProductDailySales.objects.filter(day__range=(start_day, end_day)).delete()
+        ProductDailySales.objects.bulk_create(product_sales, batch_size=500)
+    return rollups
@@ -1,8 +1,18 @@
+from django.contrib.auth.models import User
 from django.test import TestCase, Client
+from django.core.management import call_command
 from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
-from .models import Sale, SaleItem
+from datetime import datetime, timedelta
+from django.db.models import Sum
+from decimal import Decimal
+from io import StringIO
+from .cube import SalesCube, sales_cube
+from .models import Sale, SaleItem, DailySalesRollup, HourlySalesRollup, ProductDailySales
+from .services import profitability, sales_heatmap, sales_series, sales_totals, top_products
+from invoices.models import POS, POSItem, POSLedgerEntry
+from invoices.services import process_pos_outbox
+from invoices.tests import make_pos
 from inventory.models import Product
 from customers.models import Customer
 
@@ -34,8 +44,7 @@ class SalesReportTestCase(TestCase):
         )
         
         # Create test sales for different days
-        today = timezone.now().date()
-        
+
         # Sale for today
         sale1 = Sale.objects.create(
             customer=self.customer,
@@ -68,6 +77,17 @@ class SalesReportTestCase(TestCase):
             unit_price=100.00
         )
 
+        # The report ranks products from POS bills
+        pos = POS.objects.create(
+            pos_number="POS-001",
+            customer_name="Test Customer",
+            contact_number="1234567890",
+            subtotal=Decimal('300.00'),
+        )
+        POSItem.objects.create(pos=pos, product=self.product1, quantity=2, unit_price=Decimal('100.00'))
+        POSItem.objects.create(pos=pos, product=self.product2, quantity=1, unit_price=Decimal('100.00'))
+        process_pos_outbox()
+
     def test_sales_report_view(self):
         """Test that the sales report view loads correctly"""
         response = self.client.get(reverse('sales_report'))
@@ -130,4 +150,363 @@ class SalesReportTestCase(TestCase):
         
         # Should have at least our test products
         self.assertIn('Test Product 1', names)
-        self.assertIn('Test Product 2', names) 
\ No newline at end of file
+        self.assertIn('Test Product 2', names) 
+
+class DailySalesRollupTestCase(TestCase):
+    def assertToday(self, order_count, paid, unpaid, discount='0.00'):
+        process_pos_outbox()
+        rollup = DailySalesRollup.objects.get(day=timezone.localdate())
+        self.assertEqual(
+            (rollup.order_count, rollup.paid_total, rollup.unpaid_total, rollup.discount_total),
+            (order_count, Decimal(paid), Decimal(unpaid), Decimal(discount)),
+        )
+
+    def test_rollup_follows_create_update_and_delete(self):
+        first = make_pos('POS-001', '100.00')
+        make_pos('POS-002', '50.00', status='paid')
+        self.assertToday(2, '50.00', '100.00')
+
+        first.discount = Decimal('10.00')
+        first.status = 'paid'
+        first.save()
+        self.assertToday(2, '140.00', '0.00', '10.00')
+
+        # Moving a bill to another day moves its contribution
+        first.date = timezone.now() - timedelta(days=3)
+        first.save()
+        self.assertToday(1, '50.00', '0.00')
+        self.assertEqual(
+            DailySalesRollup.objects.get(day=timezone.localdate(first.date)).paid_total, Decimal('90.00')
+        )
+
+        POS.objects.get(pos_number='POS-002').delete()
+        self.assertToday(0, '0.00', '0.00')
+
+    def test_dashboard_cards_read_rollups(self):
+        make_pos('POS-001', '100.00')
+        make_pos('POS-002', '50.00', status='paid')
+
+        # Only the rollup aggregates are needed for the summary cards
+        self.assertEqual(sales_totals(timezone.localdate(), timezone.localdate())['order_count'], 2)
+        response = self.client.get(reverse('sales_report'))
+        self.assertEqual(response.context['total_sales'], Decimal('150.00'))
+        self.assertEqual(response.context['total_orders'], 2)
+        self.assertEqual(response.context['unpaid_pos_total'], Decimal('100.00'))
+
+    def test_rebuild_fixes_drift(self):
+        make_pos('POS-001', '100.00')
+        DailySalesRollup.objects.update(order_count=7, unpaid_total=0)
+
+        out = StringIO()
+        call_command('rebuild_sales_rollups', '--dry-run', stdout=out)
+        self.assertIn('1 day(s) drifted', out.getvalue())
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertToday(1, '0.00', '100.00')
+
+    def test_rebuild_skips_bills_the_projection_has_not_counted(self):
+        make_pos('POS-001', '100.00')
+        make_pos('POS-002', '50.00', status='paid')
+        legacy = make_pos('POS-003', '20.00')
+        # A legacy bill the customer backfill could not link has no entry
+        POSLedgerEntry.objects.filter(pos_id=legacy.pk).delete()
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertToday(2, '50.00', '100.00')
+
+        # Its next edit counts it, once
+        legacy.save()
+        self.assertToday(3, '50.00', '120.00')
+        self.assertEqual(HourlySalesRollup.objects.aggregate(orders=Sum('order_count'))['orders'], 3)
+
+
+class ProductDailySalesTestCase(TestCase):
+    def setUp(self):
+        self.tea = Product.objects.create(
+            name="Tea", category="beverages", quantity=500,
+            unit_price=Decimal('10.00'), buying_price=Decimal('6.00'),
+        )
+        self.biscuit = Product.objects.create(
+            name="Biscuit", category="snacks", quantity=500,
+            unit_price=Decimal('20.00'), buying_price=Decimal('15.00'),
+        )
+
+    def facts(self, product, days_ago=0):
+        row = ProductDailySales.objects.filter(
+            product=product, day=timezone.localdate() - timedelta(days=days_ago)
+        ).first()
+        return (row.units, row.revenue, row.cost) if row else None
+
+    def test_facts_follow_item_changes(self):
+        pos = make_pos('POS-001', lines=[(self.tea, 3, '10.00'), (self.biscuit, 1, '20.00')])
+        make_pos('POS-002', lines=[(self.tea, 2, '10.00')])
+        self.assertEqual(self.facts(self.tea), (5, Decimal('50.00'), Decimal('30.00')))
+        self.assertEqual(self.facts(self.biscuit), (1, Decimal('20.00'), Decimal('15.00')))
+
+        # Cost is the buying price when sold, not the current one
+        Product.objects.filter(pk=self.tea.pk).update(buying_price=Decimal('9.00'))
+        item = pos.items.get(product=self.tea)
+        item.quantity = 1
+        item.save()
+        pos.save()
+        process_pos_outbox()
+        self.assertEqual(self.facts(self.tea), (3, Decimal('30.00'), Decimal('18.00')))
+
+        pos.delete()
+        process_pos_outbox()
+        self.assertEqual(self.facts(self.tea), (2, Decimal('20.00'), Decimal('12.00')))
+        self.assertEqual(self.facts(self.biscuit), (0, Decimal('0.00'), Decimal('0.00')))
+
+    def test_top_products_growth(self):
+        make_pos('POS-001', lines=[(self.tea, 4, '10.00'), (self.biscuit, 1, '20.00')])
+        make_pos('POS-002', lines=[(self.tea, 2, '10.00')], days_ago=7)
+
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            rows = top_products(today - timedelta(days=6), today)
+        self.assertEqual(
+            [(row['product__name'], row['units_sold'], row['revenue'], row['growth']) for row in rows],
+            [('Tea', 4, Decimal('40.00'), 100.0), ('Biscuit', 1, Decimal('20.00'), None)],
+        )
+
+        response = self.client.get(reverse('sales_report'), {'period': 7})
+        self.assertEqual(response.context['top_products'][0]['growth'], 100.0)
+
+    def test_rebuild_restores_product_facts(self):
+        make_pos('POS-001', lines=[(self.tea, 3, '10.00')])
+        ProductDailySales.objects.update(units=99)
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.facts(self.tea), (3, Decimal('30.00'), Decimal('18.00')))
+
+
+class SalesChartSeriesTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='manager', password='secret')
+        self.client.force_login(user)
+        self.today = timezone.localdate()
+        for days_ago, subtotal in [(0, '100.00'), (0, '50.00'), (2, '30.00')]:
+            POS.objects.create(
+                pos_number=f'POS-{days_ago}-{subtotal}',
+                customer_name="Test Customer",
+                contact_number="01712345678",
+                subtotal=Decimal(subtotal),
+                date=timezone.now() - timedelta(days=days_ago),
+            )
+        process_pos_outbox()
+
+    def series(self, **params):
+        return self.client.get(reverse('sales_chart_series'), params)
+
+    def test_daily_series_is_zero_filled(self):
+        start = self.today - timedelta(days=3)
+        with self.assertNumQueries(1):
+            series = sales_series('day', start, self.today)
+        self.assertEqual(
+            series,
+            [
+                (start, Decimal('0'), 0),
+                (start + timedelta(days=1), Decimal('30.00'), 1),
+                (start + timedelta(days=2), Decimal('0'), 0),
+                (self.today, Decimal('150.00'), 2),
+            ],
+        )
+
+    def test_hour_week_and_month_buckets(self):
+        hourly = self.series(bucket='hour').json()
+        self.assertEqual(len(hourly['totals']), 24)
+        self.assertEqual(sum(hourly['totals']), 150.0)
+        self.assertEqual(sum(hourly['orders']), 2)
+
+        data = self.series(bucket='month', start=self.today.isoformat(), end=self.today.isoformat()).json()
+        self.assertEqual((data['periods'], data['totals']), ([self.today.replace(day=1).isoformat()], [150.0]))
+
+        weekly = self.series(bucket='week').json()
+        self.assertEqual(len(weekly['totals']), 12)
+        self.assertEqual(sum(weekly['totals']), 180.0)
+
+    def test_hourly_series_reads_hourly_rollups(self):
+        hour = timezone.localtime(POS.objects.filter(date__date=self.today).first().date).hour
+        HourlySalesRollup.objects.filter(day=self.today, hour=hour).update(revenue=Decimal('999.00'))
+        with self.assertNumQueries(1):
+            series = sales_series('hour', self.today, self.today)
+        self.assertEqual(len(series), 24)
+        self.assertEqual(series[hour][1:], (Decimal('999.00'), 2))
+        self.assertEqual(sum(orders for _, _, orders in series), 2)
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.series(bucket='year').status_code, 400)
+        self.assertEqual(self.series(start='yesterday').status_code, 400)
+        self.assertEqual(self.series(start='2024-02-01', end='2024-01-01').status_code, 400)
+        self.assertEqual(self.series(bucket='hour', start='2000-01-01').status_code, 400)
+
+
+class SalesCubeTestCase(TestCase):
+    def setUp(self):
+        self.tea = Product.objects.create(
+            name="Tea", category="beverages", quantity=500,
+            unit_price=Decimal('10.00'), buying_price=Decimal('6.00'),
+        )
+        self.biscuit = Product.objects.create(
+            name="Biscuit", category="snacks", quantity=500,
+            unit_price=Decimal('20.00'), buying_price=Decimal('15.00'),
+        )
+        self.cube = SalesCube()
+
+    def by_category(self, **filters):
+        self.cube.refresh()
+        return {
+            row['category']: (row['units'], row['revenue'], row['profit'])
+            for row in self.cube.query(['category'], **filters)['rows']
+        }
+
+    def test_group_by_and_filters(self):
+        make_pos('POS-001', lines=[(self.tea, 3, '10.00'), (self.biscuit, 2, '20.00')], status='paid')
+        make_pos('POS-002', lines=[(self.tea, 1, '10.00')], status='unpaid')
+
+        self.assertEqual(self.by_category(), {'beverages': (4, 40.0, 16.0), 'snacks': (2, 40.0, 10.0)})
+        self.assertEqual(self.by_category(status='unpaid'), {'beverages': (1, 10.0, 4.0)})
+
+        rows = self.cube.query(['week', 'customer', 'status'], sort='units')['rows']
+        self.assertEqual(rows[0]['week'], (timezone.localdate() - timedelta(days=timezone.localdate().weekday())).isoformat())
+        self.assertEqual(rows[0]['customer_label'], 'Test Customer')
+        self.assertEqual((rows[0]['status'], rows[0]['units']), ('paid', 5))
+
+    def test_refresh_is_incremental(self):
+        pos = make_pos('POS-001', lines=[(self.tea, 3, '10.00')], status='paid')
+        self.assertEqual(self.cube.refresh(), 1)
+
+        make_pos('POS-002', lines=[(self.biscuit, 1, '20.00')], status='paid')
+        self.assertEqual(self.by_category()['snacks'], (1, 20.0, 5.0))
+
+        # Edited and deleted bills are reloaded once their events are projected
+        item = pos.items.get()
+        item.quantity = 5
+        item.save()
+        pos.save()
+        process_pos_outbox()
+        self.assertEqual(self.by_category()['beverages'], (5, 50.0, 20.0))
+
+        pos.delete()
+        process_pos_outbox()
+        self.assertEqual(self.by_category(), {'snacks': (1, 20.0, 5.0)})
+        self.assertEqual(len(self.cube), 1)
+
+    def test_endpoint(self):
+        self.client.force_login(User.objects.create_user(username='manager', password='secret'))
+        make_pos('POS-001', lines=[(self.tea, 3, '10.00'), (self.biscuit, 2, '20.00')], status='paid')
+        sales_cube.clear()
+
+        response = self.client.get(reverse('sales_cube'), {'group_by': 'category,month', 'sort': 'profit'})
+        data = response.json()
+        self.assertEqual(data['items'], 2)
+        self.assertEqual([row['category_label'] for row in data['rows']], ['Beverages', 'Snacks'])
+        self.assertEqual(self.client.get(reverse('sales_cube'), {'group_by': 'colour'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('sales_cube'), {'limit': '-1'}).status_code, 400)
+        self.assertEqual(len(self.client.get(reverse('sales_cube'), {'limit': '1'}).json()['rows']), 1)
+
+
+class ProfitabilityTestCase(TestCase):
+    def setUp(self):
+        self.tea = Product.objects.create(
+            name="Tea", category="beverages", quantity=500,
+            unit_price=Decimal('10.00'), buying_price=Decimal('6.00'),
+        )
+        self.biscuit = Product.objects.create(
+            name="Biscuit", category="snacks", quantity=500,
+            unit_price=Decimal('20.00'), buying_price=Decimal('15.00'),
+        )
+        self.today = timezone.localdate()
+
+    def test_margins_match_the_ledger(self):
+        make_pos(
+            'POS-001', lines=[(self.tea, 10, '10.00'), (self.biscuit, 2, '20.00')],
+            discount=Decimal('5.00'), status='paid',
+        )
+        make_pos('POS-002', lines=[(self.biscuit, 1, '20.00')], days_ago=1, status='paid')
+
+        with self.assertNumQueries(6):
+            report = profitability(self.today - timedelta(days=1), self.today)
+        summary = report['summary']
+        self.assertEqual(summary['revenue'], Decimal('160.00'))
+        self.assertEqual(summary['cost'], Decimal('105.00'))
+        self.assertEqual(summary['gross_profit'], Decimal('55.00'))
+        self.assertEqual(summary['discount'], Decimal('5.00'))
+        self.assertEqual(summary['net_profit'], Decimal('50.00'))
+        self.assertEqual(summary['net_sales'], POS.objects.aggregate(total=Sum('total'))['total'])
+        self.assertEqual(summary['unattributed'], Decimal('0.00'))
+
+        self.assertEqual(
+            [(row['category'], row['profit'], row['margin']) for row in report['categories']],
+            [('Beverages', Decimal('40.00'), Decimal('40.0')), ('Snacks', Decimal('15.00'), Decimal('25.0'))],
+        )
+        self.assertEqual(
+            [(row['day'], row['profit'], row['discount'], row['net_profit']) for row in report['days']],
+            [(self.today - timedelta(days=1), Decimal('5.00'), Decimal('0'), Decimal('5.00')),
+             (self.today, Decimal('50.00'), Decimal('5.00'), Decimal('45.00'))],
+        )
+
+    def test_missing_buying_price_is_flagged(self):
+        self.tea.buying_price = None
+        self.tea.save()
+        make_pos('POS-001', lines=[(self.tea, 2, '10.00')], status='paid')
+        self.assertTrue(profitability(self.today, self.today)['products'][0]['cost_missing'])
+
+    def test_report_page(self):
+        self.client.force_login(User.objects.create_user(username='manager', password='secret'))
+        make_pos('POS-001', lines=[(self.tea, 10, '10.00')], discount=Decimal('5.00'), status='paid')
+        response = self.client.get(reverse('profitability_report'), {'period': '7'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summary']['net_profit'], Decimal('35.00'))
+        self.assertContains(response, 'Discount Leakage')
+
+
+class SalesHeatmapTestCase(TestCase):
+    def at(self, days_ago, hour):
+        day = timezone.localdate() - timedelta(days=days_ago)
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=15))
+
+    def test_hourly_rollups_follow_bills(self):
+        pos = make_pos('POS-001', '100.00', date=self.at(0, 9))
+        make_pos('POS-002', '50.00', date=self.at(0, 9))
+        rollup = HourlySalesRollup.objects.get(day=timezone.localdate(), hour=9)
+        self.assertEqual((rollup.order_count, rollup.revenue), (2, Decimal('150.00')))
+
+        # Moving a bill to another hour moves its contribution
+        pos.date = self.at(0, 17)
+        pos.save()
+        process_pos_outbox()
+        self.assertEqual(
+            list(HourlySalesRollup.objects.filter(order_count__gt=0).values_list('hour', 'order_count', 'revenue')),
+            [(9, 1, Decimal('50.00')), (17, 1, Decimal('100.00'))],
+        )
+
+        pos.delete()
+        process_pos_outbox()
+        self.assertFalse(HourlySalesRollup.objects.filter(hour=17, order_count__gt=0).exists())
+
+    def test_heatmap_is_one_grouped_query(self):
+        make_pos('POS-001', '100.00', date=self.at(0, 9))
+        make_pos('POS-002', '40.00', date=self.at(7, 9))
+        make_pos('POS-003', '30.00', date=self.at(1, 20))
+
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            cells = sales_heatmap(today - timedelta(weeks=52), today)
+        self.assertEqual(cells[today.weekday()][9], (2, Decimal('140.00')))
+        self.assertEqual(cells[(today - timedelta(days=1)).weekday()][20], (1, Decimal('30.00')))
+        self.assertEqual(sum(orders for row in cells for orders, _ in row), 3)
+
+        response = self.client.get(reverse('sales_report'), {'heatmap_weeks': '52'})
+        self.assertEqual(response.context['heatmap'][today.weekday()]['cells'][9]['orders_level'], 100)
+        self.assertContains(response, 'Busiest Hours')
+
+    def test_rebuild_restores_hourly_rollups(self):
+        make_pos('POS-001', '100.00', date=self.at(0, 9))
+        HourlySalesRollup.objects.update(order_count=5)
+
+        out = StringIO()
+        call_command('rebuild_sales_rollups', '--dry-run', stdout=out)
+        self.assertIn('1 hour(s) drifted', out.getvalue())
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(HourlySalesRollup.objects.get(hour=9).order_count, 1)
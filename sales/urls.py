@@ -3,4 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.sales_report, name='sales_report'),
-] 
\ No newline at end of file
+    path('api/chart-series/', views.sales_chart_series, name='sales_chart_series'),
+    path('profitability/', views.profitability_report, name='profitability_report'),
+    path('api/cube/', views.sales_cube_query, name='sales_cube'),
+] 
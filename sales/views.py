@@ -1,14 +1,19 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render
-from django.db.models import Sum, Count, Avg, F
+from django.views.decorators.http import require_GET
+from django.db.models import Count, Avg
 from django.db.models.functions import TruncMonth, TruncDay
 from .models import Sale, SaleItem
+from .cube import DIMENSIONS, CubeQueryError, sales_cube
+from .services import (
+    MAX_SERIES_BUCKETS, SERIES_BUCKETS, profitability, sales_heatmap, sales_series, sales_totals, top_products,
+)
 from customers.models import Customer
 from inventory.models import Product
-from datetime import timedelta, datetime
+from datetime import date, timedelta, datetime
 from django.utils import timezone
 import json
-from invoices.models import POS
-from invoices.models import POSItem
 
 def sales_report(request):
     period = request.GET.get('period', '1')  # Default to 1 day (today)
@@ -17,110 +22,44 @@ def sales_report(request):
     # --- Date Ranges ---
     end_date = timezone.now()
     start_date = end_date - timedelta(days=days)
-    prev_end_date = start_date
-    prev_start_date = prev_end_date - timedelta(days=days)
 
     # --- Summary Cards ---
-    # Count POS orders (these are the actual orders)
-    pos_orders = POS.objects.filter(date__range=[start_date, end_date]).count()
-    
-    # Include both paid and unpaid POS amounts in total sales
-    paid_pos_total = POS.objects.filter(status='paid', date__range=[start_date, end_date]).aggregate(total=Sum('total'))['total'] or 0
-    unpaid_pos_total = POS.objects.filter(status='unpaid', date__range=[start_date, end_date]).aggregate(total=Sum('total'))['total'] or 0
+    # Read from the daily rollups; the period covers whole calendar days
+    # ending today (1 = today only)
+    today = timezone.localdate()
+    totals = sales_totals(today - timedelta(days=days - 1), today)
+    paid_pos_total = totals['paid_total']
+    unpaid_pos_total = totals['unpaid_total']
     
     # Total sales including both paid and unpaid amounts
     total_sales_with_unpaid = paid_pos_total + unpaid_pos_total
     
     # Total orders (only POS transactions count as orders)
-    total_orders = pos_orders
+    total_orders = totals['order_count']
     
     new_customers = Customer.objects.filter(created_at__range=[start_date, end_date]).count()
 
-    # --- Daily Sales Chart (Whole Week - Last 7 Days) ---
-    # Get the start of the current week (Monday)
-    today = timezone.now().date()
-    days_since_monday = today.weekday()
-    week_start = today - timedelta(days=days_since_monday)
-    
-    # Generate all 7 days of the week
-    week_days = []
-    daily_sales_data = []
-    
-    for i in range(7):
-        current_day = week_start + timedelta(days=i)
-        week_days.append(current_day)
-        
-        # Get POS sales for this specific day (both paid and unpaid)
-        day_pos_paid = POS.objects.filter(
-            date__date=current_day,
-            status='paid'
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        day_pos_unpaid = POS.objects.filter(
-            date__date=current_day,
-            status='unpaid'
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        # Total daily sales (only from POS transactions)
-        day_total = day_pos_paid + day_pos_unpaid
-        
-        daily_sales_data.append({
-            'day': current_day,
-            'total': day_total
-        })
-    
-    daily_labels = [day.strftime('%a') for day in week_days]
-    daily_totals = [float(data['total']) for data in daily_sales_data]
+    # --- Daily Sales Chart (Whole Week) ---
+    # Initial data for the chart; other bucketings come from sales_chart_series
+    week_start = today - timedelta(days=today.weekday())
+    week = _chart_series('day', week_start, week_start + timedelta(days=6))
+    daily_labels = week['labels']
+    daily_totals = week['totals']
 
     # --- Top Selling Products Chart ---
-    # Only include products from POS items (the source of truth)
-    pos_items = POSItem.objects.filter(pos__date__range=[start_date, end_date]) \
-        .values('product__name', 'product__id') \
-        .annotate(
-            units_sold=Sum('quantity'),
-            revenue=Sum(F('quantity') * F('unit_price'))
-        )
-    
-    # Aggregate the data
-    product_data = {}
-    
-    # Add POS data only
-    for item in pos_items:
-        product_id = item['product__id']
-        if product_id not in product_data:
-            product_data[product_id] = {
-                'product__name': item['product__name'],
-                'units_sold': item['units_sold'],
-                'revenue': item['revenue']
-            }
-        else:
-            product_data[product_id]['units_sold'] += item['units_sold']
-            product_data[product_id]['revenue'] += item['revenue']
-    
-    # Sort by units sold and get top 10
-    top_products_data = []
-    product_names = []
-    product_units = []
-    product_revenues = []
-    
-    sorted_products = sorted(product_data.values(), key=lambda x: x['units_sold'], reverse=True)[:10]
-    
-    for p in sorted_products:
-        # Calculate growth (simplified for now)
-        growth = 0  # You can implement growth calculation if needed
-        
-        top_products_data.append({
-            'product__name': p['product__name'],
-            'units_sold': p['units_sold'],
-            'revenue': p['revenue'],
-            'growth': growth,
-        })
-        
-        # Data for the chart
-        product_names.append(p['product__name'])
-        product_units.append(p['units_sold'])
-        product_revenues.append(float(p['revenue']))
-        
+    # One grouped query over the product facts for this period and the one
+    # before it, which gives the growth column
+    top_products_data = top_products(today - timedelta(days=days - 1), today)
+    product_names = [p['product__name'] for p in top_products_data]
+    product_units = [p['units_sold'] for p in top_products_data]
+    product_revenues = [float(p['revenue']) for p in top_products_data]
+
+    # --- Weekday x Hour Heatmap ---
+    heatmap_weeks = request.GET.get('heatmap_weeks', '12')
+    if heatmap_weeks not in HEATMAP_WEEKS:
+        heatmap_weeks = '12'
+    heatmap = _heatmap_rows(sales_heatmap(today - timedelta(weeks=int(heatmap_weeks)) + timedelta(days=1), today))
+
     context = {
         'total_sales': total_sales_with_unpaid,  # Updated to include unpaid amounts
         'total_orders': total_orders,
@@ -132,7 +71,182 @@ def sales_report(request):
         'product_names': json.dumps(product_names),
         'product_units': json.dumps(product_units),
         'product_revenues': json.dumps(product_revenues),
+        'chart_buckets': SERIES_BUCKETS,
+        'heatmap': heatmap,
+        'heatmap_hours': range(24),
+        'heatmap_weeks': heatmap_weeks,
+        'heatmap_week_choices': HEATMAP_WEEKS,
+        'cube_dimensions': DIMENSIONS,
+        'period_start': (today - timedelta(days=days - 1)).isoformat(),
         'section': 'sales_report',
         'selected_period': period,
     }
-    return render(request, 'sales/sales_report.html', context) 
\ No newline at end of file
+    return render(request, 'sales/sales_report.html', context) 
+
+
+HEATMAP_WEEKS = ['4', '12', '26', '52']
+WEEKDAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _heatmap_rows(cells):
+    """Weekday rows of heatmap cells, each with its shade relative to the busiest cell."""
+    max_orders = max(orders for row in cells for orders, _ in row) or 1
+    max_revenue = max(revenue for row in cells for _, revenue in row) or 1
+    return [
+        {
+            'label': WEEKDAY_LABELS[weekday],
+            'cells': [
+                {
+                    'orders': orders,
+                    'revenue': revenue,
+                    'orders_level': round(orders / max_orders * 100),
+                    'revenue_level': round(revenue / max_revenue * 100),
+                }
+                for orders, revenue in row
+            ],
+        }
+        for weekday, row in enumerate(cells)
+    ]
+
+
+# Label format per chart bucket
+SERIES_LABELS = {
+    'hour': '%H:00',
+    'day': '%a',
+    'week': '%d %b',
+    'month': '%b %Y',
+}
+
+
+def _default_series_range(bucket, today):
+    """Range a chart shows when none is given: today, this week, 12 weeks or 12 months."""
+    if bucket == 'hour':
+        return today, today
+    if bucket == 'day':
+        week_start = today - timedelta(days=today.weekday())
+        return week_start, week_start + timedelta(days=6)
+    if bucket == 'week':
+        return today - timedelta(weeks=11, days=today.weekday()), today
+    return (today.replace(day=1) - timedelta(days=335)).replace(day=1), today
+
+
+def _chart_series(bucket, start_day, end_day):
+    series = sales_series(bucket, start_day, end_day)
+    label_format = SERIES_LABELS[bucket]
+    if bucket == 'day' and len(series) > 7:
+        label_format = '%d %b'
+    return {
+        'bucket': bucket,
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'periods': [period.isoformat() for period, _, _ in series],
+        'labels': [period.strftime(label_format) for period, _, _ in series],
+        'totals': [float(total) for _, total, _ in series],
+        'orders': [orders for _, _, orders in series],
+    }
+
+
+@login_required
+@require_GET
+def sales_chart_series(request):
+    """
+    Sales totals and order counts for a chart
+
+    ``?bucket=hour|day|week|month`` with optional ``start`` and ``end``
+    (YYYY-MM-DD, inclusive). Buckets without sales are returned as zero so
+    the series has no gaps.
+    """
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in SERIES_BUCKETS:
+        return JsonResponse({'errors': {'bucket': [f'Must be one of {", ".join(SERIES_BUCKETS)}.']}}, status=400)
+
+    start_day, end_day = _default_series_range(bucket, timezone.localdate())
+    errors = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        if not value:
+            continue
+        try:
+            parsed = date.fromisoformat(value)
+        except ValueError:
+            errors[name] = ['Must be a date (YYYY-MM-DD).']
+            continue
+        if name == 'start':
+            start_day = parsed
+        else:
+            end_day = parsed
+    if not errors and start_day > end_day:
+        errors['start'] = ['Must not be after end.']
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    # Guard the zero-filled series against absurd ranges
+    span_days = (end_day - start_day).days + 1
+    per_bucket = {'hour': 1 / 24, 'day': 1, 'week': 7, 'month': 28}[bucket]
+    if span_days / per_bucket > MAX_SERIES_BUCKETS:
+        return JsonResponse({'errors': {'end': [f'Range is too long for {bucket} buckets.']}}, status=400)
+
+    return JsonResponse(_chart_series(bucket, start_day, end_day))
+
+
+@login_required
+@require_GET
+def sales_cube_query(request):
+    """
+    Slice POS item revenue by any combination of dimensions
+
+    ``?group_by=category,week`` (any of ``DIMENSIONS``) with optional
+    ``start``/``end`` (YYYY-MM-DD), ``status``, ``category``, ``customer``,
+    ``sort`` (a measure) and ``limit``. Answered from the in-memory sales
+    cube, which is refreshed incrementally first.
+    """
+    params = request.GET
+    try:
+        start, end = (
+            date.fromisoformat(params[key]) if params.get(key) else None
+            for key in ('start', 'end')
+        )
+        customer = int(params['customer']) if params.get('customer') else None
+        limit = min(int(params.get('limit') or 100), 1000)
+    except ValueError:
+        return JsonResponse({'errors': {'__all__': ['Dates must be YYYY-MM-DD; customer and limit must be numbers.']}}, status=400)
+
+    sales_cube.refresh()
+    try:
+        result = sales_cube.query(
+            [name for name in params.get('group_by', 'category').split(',') if name],
+            start=start,
+            end=end,
+            status=params.get('status') or None,
+            category=params.get('category') or None,
+            customer=customer,
+            sort=params.get('sort') or 'revenue',
+            limit=limit,
+        )
+    except CubeQueryError as e:
+        return JsonResponse({'errors': {'__all__': [str(e)]}}, status=400)
+    return JsonResponse(result)
+
+
+@login_required
+def profitability_report(request):
+    """Gross margin by product, category and day, with discount leakage"""
+    today = timezone.localdate()
+    period = request.GET.get('period', '30')
+    try:
+        start_day = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end_day = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+    except ValueError:
+        start_day, end_day = None, today
+    if start_day is None or start_day > end_day:
+        days = int(period) if period.isdigit() and int(period) > 0 else 30
+        start_day = end_day - timedelta(days=days - 1)
+
+    context = profitability(start_day, end_day)
+    context.update({
+        'start_day': start_day,
+        'end_day': end_day,
+        'selected_period': period,
+        'section': 'sales_report',
+    })
+    return render(request, 'sales/profitability_report.html', context)